@@ -1,6 +1,9 @@
 """
 API clients for external services
 """
-from .ai_client import AIServiceClient
+from .ai_client import AIServiceClient, PushUnavailable
+from .device_cache import DeviceCache
+from .recommendations import RecommendationFeed
+from .prefetch import ClickPrefetcher
 
-__all__ = ['AIServiceClient']
+__all__ = ['AIServiceClient', 'PushUnavailable', 'DeviceCache', 'RecommendationFeed', 'ClickPrefetcher']
@@ -4,80 +4,184 @@ Handles communication with AI server for recommendations and intent processing
 """
 import aiohttp
 import asyncio
+import json
 import logging
-from typing import Dict, Optional, Any, List
+from typing import AsyncIterator, Dict, Optional, Any, List
 from datetime import datetime
 
+from .transport import DEFAULT_TRANSPORT, CircuitBreaker, backoff_delay
+
 logger = logging.getLogger(__name__)
 
+# Methods whose requests can be sent again when the first attempt may have been processed
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+
+class PushUnavailable(Exception):
+    """The AI Service doesn't offer the recommendation stream"""
+
 
 class AIServiceClient:
     """Client for AI Service API"""
     
-    def __init__(self, base_url: str, user_uuid: str):
+    def __init__(self, base_url: str, user_uuid: str, transport: Optional[Dict] = None):
         self.base_url = base_url.rstrip('/')
         self.user_uuid = user_uuid
         self.session: Optional[aiohttp.ClientSession] = None
         self.current_recommendation: Optional[Dict] = None
         
+        # Pool, timeouts, retries and circuit breaker settings
+        self.transport = {**DEFAULT_TRANSPORT, **(transport or {})}
+        self.transport['endpoint_timeouts'] = {
+            **DEFAULT_TRANSPORT['endpoint_timeouts'],
+            **(transport or {}).get('endpoint_timeouts', {})
+        }
+        self.breaker = CircuitBreaker(self.transport['failure_threshold'])
+        self._probe_task: Optional[asyncio.Task] = None
+        
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+        
         logger.info(f"AIServiceClient initialized: {base_url}")
     
     async def __aenter__(self):
         """Async context manager entry"""
-        self.session = aiohttp.ClientSession()
+        self._get_session()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Async context manager exit"""
+        await self.close()
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Get the session, created with a pooled keep-alive connector on first use"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.transport['connection_limit'],
+                limit_per_host=self.transport['limit_per_host'],
+                keepalive_timeout=self.transport['keepalive_timeout'],
+                ttl_dns_cache=self.transport['dns_cache_ttl'],
+                use_dns_cache=True
+            )
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+    
+    def _timeout(self, endpoint: str) -> aiohttp.ClientTimeout:
+        """Get the timeout of an endpoint"""
+        total = self.transport['endpoint_timeouts'].get(endpoint, self.transport['timeout'])
+        return aiohttp.ClientTimeout(total=total, connect=min(total, self.transport['connect_timeout']))
+    
+    async def close(self):
+        """Stop the health probe and close the connections"""
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            self._probe_task = None
         if self.session:
             await self.session.close()
     
     async def _request(self, method: str, endpoint: str, 
                       json_data: Optional[Dict] = None,
                       params: Optional[Dict] = None,
-                      retries: int = 3) -> Optional[Dict]:
+                      retries: Optional[int] = None) -> Optional[Dict]:
         """
         Make HTTP request with retries
         
+        Failed attempts are retried after an exponential backoff with jitter.
+        A request that may have reached the service, after a timeout, a read
+        error or a 5xx answer, is only retried if its method is idempotent:
+        a POST is only sent again when the connection couldn't be opened.
+        While the circuit breaker is open the request fails immediately.
+        
         Args:
             method: HTTP method (GET, POST, etc.)
             endpoint: API endpoint
             json_data: JSON payload
             params: Query parameters
-            retries: Number of retries
+            retries: Number of attempts, defaults to the transport setting
             
         Returns:
             Response data or None on error
         """
-        if not self.session:
-            self.session = aiohttp.ClientSession()
+        if not self.breaker.allow():
+            logger.debug(f"AI Service unavailable, skipping {method} {endpoint}")
+            return None
         
+        session = self._get_session()
         url = f"{self.base_url}{endpoint}"
+        timeout = self._timeout(endpoint)
+        attempts = retries if retries is not None else self.transport['retries']
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        self.requests += 1
         
-        for attempt in range(retries):
+        for attempt in range(attempts):
+            if attempt > 0:
+                self.retries += 1
+                await asyncio.sleep(backoff_delay(attempt - 1, self.transport['backoff_base'],
+                                                  self.transport['backoff_max']))
+            
             try:
-                async with self.session.request(
-                    method, url, json=json_data, params=params, 
-                    timeout=aiohttp.ClientTimeout(total=30)  # Longer timeout for LLM
+                async with session.request(
+                    method, url, json=json_data, params=params, timeout=timeout
                 ) as response:
                     if response.status == 200:
+                        self.breaker.record_success()
                         return await response.json()
-                    else:
-                        logger.warning(f"Request failed: {response.status} - {await response.text()}")
+                    
+                    logger.warning(f"Request failed: {response.status} - {await response.text()}")
+                    if response.status < 500:
+                        # The service is up, retrying the same request won't help
+                        self.breaker.record_success()
+                        return None
+                    retryable = idempotent
                         
-                        if attempt < retries - 1:
-                            await asyncio.sleep(1)
-                        
-            except aiohttp.ClientError as e:
-                logger.error(f"Request error (attempt {attempt + 1}/{retries}): {e}")
-                if attempt < retries - 1:
-                    await asyncio.sleep(1)
+            except aiohttp.ClientConnectorError as e:
+                # Not sent: safe to send again whatever the method
+                logger.error(f"Connection error (attempt {attempt + 1}/{attempts}): {e!r}")
+                retryable = True
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error(f"Request error (attempt {attempt + 1}/{attempts}): {e!r}")
+                # The service may have processed it, sending a POST again could repeat it
+                retryable = idempotent
             except Exception as e:
                 logger.error(f"Unexpected error: {e}")
                 return None
+            
+            self.failures += 1
+            if self.breaker.record_failure():
+                self._start_probe()
+            if self.breaker.is_open or not retryable:
+                break
         
         return None
     
+    def _start_probe(self):
+        """Probe the service in the background until it answers again"""
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = asyncio.create_task(self._probe())
+    
+    async def _probe(self):
+        """Health probe loop, closes the circuit on the first answer"""
+        while self.breaker.is_open:
+            await asyncio.sleep(self.transport['probe_interval'])
+            try:
+                async with self._get_session().get(
+                    f"{self.base_url}/api/gaze/status", timeout=self._timeout('/api/gaze/status')
+                ) as response:
+                    if response.status == 200:
+                        self.breaker.record_success()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.debug(f"AI Service probe failed: {e!r}")
+    
+    def get_stats(self) -> Dict:
+        """Get request counters and circuit breaker state"""
+        return {
+            'requests': self.requests,
+            'failures': self.failures,
+            'retries': self.retries,
+            'circuit': self.breaker.get_stats()
+        }
+    
     async def send_device_click(self, device_info: Dict, context: Optional[Dict] = None) -> Optional[Dict]:
         """
         Send device click event to AI service for recommendation
@@ -128,6 +232,62 @@ class AIServiceClient:
         
         return None
     
+    async def stream_recommendations(self, read_timeout: float = 45.0) -> AsyncIterator[Dict]:
+        """
+        Receive the recommendations pushed by the AI Service as server-sent events
+        
+        Args:
+            read_timeout: Longest silence before the stream is considered dead,
+                the service sends a keep-alive comment more often than that
+            
+        Yields:
+            Each recommendation as soon as it is sent
+            
+        Raises:
+            PushUnavailable: The service has no stream endpoint
+            aiohttp.ClientError, asyncio.TimeoutError: The stream failed or ended
+        """
+        if self.breaker.is_open:
+            raise aiohttp.ClientConnectionError("AI Service unavailable")
+        
+        url = f"{self.base_url}/v1/intent/stream"
+        timeout = aiohttp.ClientTimeout(total=None, connect=self.transport['connect_timeout'],
+                                        sock_read=read_timeout)
+        
+        async with self._get_session().get(
+            url, params={'user_uuid': self.user_uuid}, timeout=timeout,
+            headers={'Accept': 'text/event-stream'}
+        ) as response:
+            if response.status in (404, 405):
+                raise PushUnavailable(f"No recommendation stream ({response.status})")
+            response.raise_for_status()
+            self.breaker.record_success()
+            
+            event, data = 'message', []
+            async for raw_line in response.content:
+                line = raw_line.decode('utf-8').rstrip('\r\n')
+                if line.startswith(':'):
+                    # Keep-alive comment
+                    continue
+                if line:
+                    field, _, value = line.partition(':')
+                    value = value[1:] if value.startswith(' ') else value
+                    if field == 'event':
+                        event = value
+                    elif field == 'data':
+                        data.append(value)
+                    continue
+                
+                # A blank line ends the event
+                if event == 'recommendation' and data:
+                    recommendation = json.loads('\n'.join(data))
+                    self.current_recommendation = recommendation
+                    logger.info(f"Pushed recommendation: {recommendation.get('message', '')[:50]}...")
+                    yield recommendation
+                event, data = 'message', []
+        
+        raise aiohttp.ServerDisconnectedError("Recommendation stream closed")
+    
     async def respond_to_recommendation(self, recommendation_id: str, answer: str, 
                                        device_id: Optional[str] = None) -> Optional[Dict]:
         """
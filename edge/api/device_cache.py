@@ -0,0 +1,257 @@
+"""
+Device Cache
+Stale-while-revalidate cache of the device list of the AI Service, with
+concurrent refreshes coalesced into a single request and optimistic device
+state updates
+"""
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def predict_state(state: Dict, action: str, parameters: Optional[Dict] = None) -> Dict:
+    """
+    Get the state a device should have after a control command, applied
+    like the gateway does
+
+    Args:
+        state: Current state of the device
+        action: 'toggle', 'turn_on', 'turn_off' or another command
+        parameters: State values set by the command
+
+    Returns:
+        A new state dict
+    """
+    state = dict(state)
+    if action == 'toggle':
+        state['is_on'] = not state.get('is_on', False)
+    elif action == 'turn_on':
+        state['is_on'] = True
+    elif action == 'turn_off':
+        state['is_on'] = False
+
+    if parameters:
+        state.update(parameters)
+    return state
+
+
+class DeviceCache:
+    """
+    Caches AIServiceClient.get_devices. A list younger than ttl is returned
+    as is; an older one, up to ttl + stale_ttl, is returned immediately while
+    a refresh runs in the background. Past that, or when forced, callers wait
+    for the refresh. At most one request is in flight at a time, callers
+    arriving meanwhile share its result.
+    
+    Controlled devices show their expected state right away. The state is
+    kept over fetched lists until the gateway confirms it, then a new list
+    is fetched to check it.
+    """
+
+    def __init__(self, client, ttl: float = 4.0, stale_ttl: float = 30.0,
+                 on_update: Optional[Callable[[List[Dict]], None]] = None):
+        self.client = client
+        self.ttl = ttl              # Age under which the list is fresh (seconds)
+        self.stale_ttl = stale_ttl  # Extra age during which the stale list is still served (seconds)
+        self.on_update = on_update  # Called with each newly fetched list
+
+        self.devices: Optional[List[Dict]] = None
+        self.fetched_at = 0.0
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0  # Refreshes that joined the request in flight
+        self.fetches = 0
+        self.errors = 0
+        self.optimistic_updates = 0
+        self.rollbacks = 0   # Failed commands whose optimistic state was undone
+        self.mismatches = 0  # Confirmed states the next fetched list disagreed with
+
+        # device_id -> {'state', 'previous', 'confirmed', 'since'} of the controlled devices
+        self._overrides: Dict[str, Dict] = {}
+        self._inflight: Optional[asyncio.Task] = None
+        self._reconcile_task: Optional[asyncio.Task] = None
+
+    @property
+    def age(self) -> float:
+        """Seconds since the list was fetched"""
+        return time.time() - self.fetched_at if self.devices is not None else float('inf')
+
+    async def get(self, force: bool = False) -> Optional[List[Dict]]:
+        """
+        Get the device list
+
+        Args:
+            force: Wait for a new list from the AI Service, e.g. after a
+                device was controlled
+
+        Returns:
+            The device list, or the last known one if the refresh failed
+        """
+        age = self.age
+        if not force and age < self.ttl:
+            self.hits += 1
+            return self.devices
+
+        if not force and age < self.ttl + self.stale_ttl:
+            # Serve the stale list, the refresh runs in the background
+            self.stale_hits += 1
+            self._refresh()
+            return self.devices
+
+        if force and self._inflight is not None and not self._inflight.done():
+            # The request in flight may predate the change, wait for it and fetch again
+            await asyncio.shield(self._inflight)
+        if self._inflight is None or self._inflight.done():
+            # Joining the request in flight is counted by _refresh as coalesced
+            self.misses += 1
+        return await asyncio.shield(self._refresh())
+
+    def invalidate(self):
+        """Make the next get() revalidate the list"""
+        self.fetched_at = 0.0
+
+    def _refresh(self) -> asyncio.Task:
+        """Get the refresh in flight, starting one if there is none"""
+        if self._inflight is not None and not self._inflight.done():
+            self.coalesced += 1
+            return self._inflight
+
+        self._inflight = asyncio.create_task(self._fetch())
+        return self._inflight
+
+    async def _fetch(self) -> Optional[List[Dict]]:
+        """Fetch the list from the AI Service"""
+        self.fetches += 1
+        started = time.time()
+        try:
+            devices = await self.client.get_devices()
+        except Exception as e:
+            logger.error(f"Error fetching devices: {e}")
+            devices = None
+
+        if not devices:
+            # Keep serving the last known list
+            self.errors += 1
+            return self.devices
+
+        if self._overrides:
+            devices = self._merge_overrides(devices, started)
+        self.devices = devices
+        self.fetched_at = time.time()
+        if self.on_update:
+            self.on_update(devices)
+        return devices
+
+    def _merge_overrides(self, devices: List[Dict], started: float) -> List[Dict]:
+        """Keep the expected states over a fetched list, unless it was fetched after the confirmation"""
+        merged = []
+        for device in devices:
+            device_id = device.get('device_id')
+            override = self._overrides.get(device_id)
+            if override is None:
+                merged.append(device)
+            elif override['confirmed'] and started >= override['since']:
+                # Reconciliation: the gateway has the last word
+                del self._overrides[device_id]
+                if device.get('current_state') != override['state']:
+                    self.mismatches += 1
+                    logger.warning(f"Gateway state of {device_id} differs from the confirmed one, using it")
+                merged.append(device)
+            else:
+                merged.append({**device, 'current_state': override['state']})
+        return merged
+
+    def _find(self, device_id: str) -> Optional[Dict]:
+        """Get a cached device"""
+        for device in self.devices or []:
+            if device.get('device_id') == device_id:
+                return device
+        return None
+
+    def _set_state(self, device_id: str, state: Dict):
+        """Replace the state of a device in a new list and publish it"""
+        self.devices = [
+            {**device, 'current_state': state} if device.get('device_id') == device_id else device
+            for device in self.devices
+        ]
+        if self.on_update:
+            self.on_update(self.devices)
+
+    def apply_optimistic(self, device_id: str, action: str, parameters: Optional[Dict] = None) -> bool:
+        """
+        Show the expected result of a control command before it is executed
+
+        Returns:
+            False if the device is unknown
+        """
+        device = self._find(device_id)
+        if device is None:
+            return False
+
+        previous = self._overrides.get(device_id, {}).get('previous', device.get('current_state') or {})
+        state = predict_state(device.get('current_state') or {}, action, parameters)
+        self._overrides[device_id] = {'state': state, 'previous': previous, 'confirmed': False, 'since': 0.0}
+        self.optimistic_updates += 1
+        self._set_state(device_id, state)
+        return True
+
+    def confirm(self, device_id: str, state: Optional[Dict] = None):
+        """
+        The command was executed: use the state it returned and check it with a new list
+
+        Args:
+            device_id: Controlled device
+            state: State returned by the gateway, None keeps the expected one
+        """
+        override = self._overrides.get(device_id)
+        if override is None:
+            return
+
+        state = dict(state) if state is not None else None
+        if state is not None and state != override['state']:
+            self._set_state(device_id, state)
+        override.update(state=state if state is not None else override['state'],
+                        confirmed=True, since=time.time())
+        self._reconcile()
+
+    def rollback(self, device_id: str):
+        """The command failed: restore the state the device had before it"""
+        override = self._overrides.pop(device_id, None)
+        if override is None:
+            return
+
+        self.rollbacks += 1
+        logger.warning(f"Control of {device_id} failed, restoring its state")
+        self._set_state(device_id, override['previous'])
+        self._reconcile()
+
+    def _reconcile(self):
+        """Fetch a new list in the background"""
+        self.invalidate()
+        if self._reconcile_task is None or self._reconcile_task.done():
+            self._reconcile_task = asyncio.create_task(self.get(force=True))
+
+    def get_stats(self) -> Dict:
+        """Get hit, miss and coalesce counters"""
+        return {
+            'devices': len(self.devices) if self.devices is not None else None,
+            'age': self.age if self.devices is not None else None,
+            'ttl': self.ttl,
+            'stale_ttl': self.stale_ttl,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'fetches': self.fetches,
+            'errors': self.errors,
+            'optimistic_updates': self.optimistic_updates,
+            'rollbacks': self.rollbacks,
+            'mismatches': self.mismatches,
+            'pending_confirmations': len(self._overrides),
+            'inflight': self._inflight is not None and not self._inflight.done()
+        }
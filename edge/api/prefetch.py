@@ -0,0 +1,111 @@
+"""
+Click Prefetch
+Sends the device click request speculatively while the dwell on a device
+progresses, so that the recommendation is ready sooner when the click fires
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ClickPrefetcher:
+    """
+    Starts the click request of a device once the dwell progress on it
+    passes threshold, and cancels it when the gaze leaves the device before
+    the click. A click on the device then takes over the request, in flight
+    or finished, instead of sending a new one.
+    """
+
+    def __init__(self, send_click: Callable[[str, Optional[Tuple[int, int]]], Awaitable[Optional[Dict]]],
+                 threshold: float = 0.5):
+        self.send_click = send_click  # Coroutine function sending the click request of (device_id, position)
+        self.threshold = threshold    # Dwell progress (0-1) starting the request, 1 or more disables
+
+        self.device_id: Optional[str] = None  # Device of the speculative request
+        self.started_at = 0.0
+
+        self.prefetches = 0
+        self.hits = 0       # Clicks served by a speculative request
+        self.misses = 0     # Clicks that had to send their own request
+        self.cancelled = 0  # Speculative requests cancelled, the gaze left
+        self.saved_time = 0.0  # Total request time already elapsed at the hits (seconds)
+
+        self._task: Optional[asyncio.Task] = None
+        self._finished_at: Optional[float] = None
+
+    def observe(self, device_id: Optional[str], progress: float,
+                position: Optional[Tuple[int, int]] = None):
+        """
+        Follow the dwell, to be called with each gaze result
+
+        Args:
+            device_id: Device the dwell would click, None outside of the AOIs
+            progress: Dwell progress (0-1)
+            position: Gaze position, where the click would land
+        """
+        if self._task is not None and device_id != self.device_id:
+            # The gaze left the device before the click
+            self._cancel()
+
+        if (self._task is None and device_id is not None
+                and self.threshold < 1.0 and progress >= self.threshold):
+            self.device_id = device_id
+            self.started_at = time.time()
+            self._finished_at = None
+            self._task = asyncio.create_task(self.send_click(device_id, position))
+            self._task.add_done_callback(self._on_done)
+            self.prefetches += 1
+            logger.debug(f"Prefetching click of {device_id} at {progress:.0%} dwell")
+
+    def take(self, device_id: str) -> Optional[asyncio.Task]:
+        """
+        Get the speculative request of a clicked device
+
+        Returns:
+            The request task, None if there is none for this device
+        """
+        if self._task is None or device_id != self.device_id:
+            self.misses += 1
+            return None
+
+        task = self._task
+        now = time.time()
+        self.hits += 1
+        self.saved_time += (self._finished_at or now) - self.started_at
+        self._task = None
+        self.device_id = None
+        return task
+
+    def _cancel(self):
+        """Drop the speculative request"""
+        if not self._task.done():
+            self._task.cancel()
+        self.cancelled += 1
+        self._task = None
+        self.device_id = None
+
+    def _on_done(self, task: asyncio.Task):
+        """Record when the request finished"""
+        if not task.cancelled():
+            # Mark a failure as retrieved, the click that takes the task sees it again
+            task.exception()
+        if task is self._task:
+            self._finished_at = time.time()
+
+    def get_stats(self) -> Dict:
+        """Get hit rate and latency saved by the prefetches"""
+        clicks = self.hits + self.misses
+        return {
+            'threshold': self.threshold,
+            'prefetches': self.prefetches,
+            'hits': self.hits,
+            'misses': self.misses,
+            'cancelled': self.cancelled,
+            'hit_rate': self.hits / clicks if clicks else 0.0,
+            'saved_ms_total': self.saved_time * 1000,
+            'saved_ms_per_hit': self.saved_time / self.hits * 1000 if self.hits else 0.0,
+            'in_flight': self.device_id
+        }
@@ -0,0 +1,138 @@
+"""
+Recommendation Feed
+Receives the recommendations pushed by the AI Service, and polls for them
+with an adaptive interval while the push stream is unavailable
+"""
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Optional
+
+from .ai_client import PushUnavailable
+
+logger = logging.getLogger(__name__)
+
+
+class RecommendationFeed:
+    """
+    Delivers recommendations to a callback. The push stream is used when
+    the service offers it; otherwise, or after it failed, the service is
+    polled until the stream is tried again. The polling interval grows while
+    nothing is pending and drops to min_interval right after a click, when a
+    recommendation is most likely.
+    """
+
+    def __init__(self, client, on_recommendation: Callable[[Dict], None],
+                 push: bool = True, interval: float = 3.0,
+                 min_interval: float = 1.0, max_interval: float = 15.0,
+                 retry_interval: float = 60.0):
+        self.client = client
+        self.on_recommendation = on_recommendation
+        self.push = push                      # Use the push stream when available
+        self.base_interval = interval         # Polling interval after a recommendation (seconds)
+        self.min_interval = min_interval      # Polling interval right after a click (seconds)
+        self.max_interval = max_interval      # Longest polling interval while idle (seconds)
+        self.retry_interval = retry_interval  # Delay before trying the push stream again (seconds)
+
+        self.interval = interval
+        self.mode = 'push' if push else 'polling'  # How recommendations are received now
+
+        self.pushed = 0    # Recommendations received from the stream
+        self.polled = 0    # Recommendations received by polling
+        self.polls = 0
+        self.empty_polls = 0
+        self.push_failures = 0
+
+        self._next_push_attempt = 0.0
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start receiving recommendations, to be called from the event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        """Stop receiving recommendations"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def notify_click(self):
+        """Poll right away and often: a click usually leads to a recommendation"""
+        self.interval = self.min_interval
+        self._wake.set()
+
+    async def _run(self):
+        """Push stream when possible, adaptive polling in between"""
+        while True:
+            try:
+                if self.push and time.time() >= self._next_push_attempt:
+                    await self._listen()
+                else:
+                    await self._poll()
+                    await self._sleep(self.interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in recommendation feed: {e}")
+                await self._sleep(self.interval)
+
+    async def _listen(self):
+        """Deliver the pushed recommendations until the stream ends"""
+        self.mode = 'push'
+        connected_at = time.time()
+        try:
+            async for recommendation in self.client.stream_recommendations():
+                self.pushed += 1
+                self._deliver(recommendation)
+        except PushUnavailable as e:
+            logger.info(f"{e}, polling for recommendations")
+        except Exception as e:
+            logger.warning(f"Recommendation stream failed: {e!r}")
+
+        self.push_failures += 1
+        if time.time() - connected_at < self.retry_interval:
+            # Didn't hold: poll for a while before trying again
+            self.mode = 'polling'
+            self._next_push_attempt = time.time() + self.retry_interval
+        # A long-lived stream that dropped is reopened right away
+
+    async def _poll(self):
+        """Poll once, then adapt the interval"""
+        self.polls += 1
+        recommendation = await self.client.poll_recommendation()
+        if recommendation:
+            self.polled += 1
+            self.interval = self.base_interval
+            self._deliver(recommendation)
+        else:
+            self.empty_polls += 1
+            self.interval = min(self.max_interval, self.interval * 1.5)
+
+    async def _sleep(self, timeout: float):
+        """Sleep until the timeout or a click"""
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wake.clear()
+
+    def _deliver(self, recommendation: Dict):
+        """Hand a recommendation to the callback"""
+        try:
+            self.on_recommendation(recommendation)
+        except Exception as e:
+            logger.error(f"Error handling recommendation: {e}")
+
+    def get_stats(self) -> Dict:
+        """Get delivery mode, polling interval and counters"""
+        return {
+            'mode': self.mode,
+            'interval': self.interval,
+            'pushed': self.pushed,
+            'polled': self.polled,
+            'polls': self.polls,
+            'empty_polls': self.empty_polls,
+            'push_failures': self.push_failures
+        }
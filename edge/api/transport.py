@@ -0,0 +1,111 @@
+"""
+HTTP Transport
+Retry backoff and circuit breaker used by the AI Service client
+"""
+import logging
+import random
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Transport settings, overridden by the "ai_transport" section of config.json
+DEFAULT_TRANSPORT = {
+    'connection_limit': 20,      # Open connections in the pool
+    'limit_per_host': 8,         # Open connections to the AI Service
+    'keepalive_timeout': 30.0,   # Idle time before a pooled connection is closed (seconds)
+    'dns_cache_ttl': 300,        # DNS resolution cache (seconds)
+    'connect_timeout': 3.0,      # Connection establishment timeout (seconds)
+    'timeout': 5.0,              # Default request timeout (seconds)
+    'endpoint_timeouts': {       # Request timeout by endpoint (seconds)
+        '/api/gaze/click': 20.0,   # Waits for the LLM recommendation
+        '/v1/intent': 10.0,
+        '/api/gaze/status': 2.0
+    },
+    'retries': 3,                # Attempts per request
+    'backoff_base': 0.25,        # First retry delay (seconds), doubled on each attempt
+    'backoff_max': 4.0,          # Longest retry delay (seconds)
+    'failure_threshold': 5,      # Consecutive failures opening the circuit
+    'probe_interval': 5.0        # Health probe period while the circuit is open (seconds)
+}
+
+
+def backoff_delay(attempt: int, base: float, maximum: float) -> float:
+    """
+    Get the delay before a retry: exponential backoff with full jitter
+
+    Args:
+        attempt: Number of the failed attempt, from 0
+        base: Delay ceiling of the first retry (seconds)
+        maximum: Largest delay ceiling (seconds)
+
+    Returns:
+        Random delay between 0 and min(maximum, base * 2 ** attempt)
+    """
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Counts consecutive failures of a service. Past the threshold the circuit
+    opens and requests fail immediately, until a health probe succeeds and
+    closes it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+
+    def __init__(self, failure_threshold: int = 5):
+        self.failure_threshold = failure_threshold
+        self.state = self.CLOSED
+        self.failures = 0  # Consecutive failures
+
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self.rejected = 0  # Requests failed fast while open
+
+    @property
+    def is_open(self) -> bool:
+        """True while requests should not be sent"""
+        return self.state == self.OPEN
+
+    def allow(self) -> bool:
+        """Check if a request can be sent, counts it as rejected otherwise"""
+        if self.state == self.OPEN:
+            self.rejected += 1
+            return False
+        return True
+
+    def record_success(self):
+        """Record a successful request or probe, closes the circuit"""
+        if self.state == self.OPEN:
+            logger.info(f"Circuit closed after {time.time() - self.opened_at:.1f}s")
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> bool:
+        """
+        Record a failed request
+
+        Returns:
+            True if this failure opened the circuit
+        """
+        self.failures += 1
+        if self.state == self.CLOSED and self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.time()
+            self.times_opened += 1
+            logger.warning(f"Circuit opened after {self.failures} consecutive failures")
+            return True
+        return False
+
+    def get_stats(self) -> Dict:
+        """Get state and counters"""
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'open_for': time.time() - self.opened_at if self.opened_at else 0.0,
+            'times_opened': self.times_opened,
+            'rejected': self.rejected
+        }
@@ -16,8 +16,19 @@ from fastapi.templating import Jinja2Templates
 import numpy as np
 
 from core.config import config
+from core.camera import CameraProducer
+from core.vision import VisionWorker
+from core.vision_process import VisionProcess
+from core.preview import PreviewEncoder
+from core.state import StateStore, StateSubscription
+from core.protocol import GAZE_SUBPROTOCOL
+from core.hub import BroadcastHub, HubSubscriber
 from gaze.tracker import GazeTracker
+from gaze_tracking.models import registry as model_registry
 from api.ai_client import AIServiceClient
+from api.device_cache import DeviceCache
+from api.recommendations import RecommendationFeed
+from api.prefetch import ClickPrefetcher
 from mock_data import MockAIClient
 
 # Configure logging
@@ -30,9 +41,18 @@ logger = logging.getLogger(__name__)
 # Global state
 gaze_tracker: Optional[GazeTracker] = None
 ai_client: Optional[AIServiceClient] = None
+device_cache: Optional[DeviceCache] = None
+recommendation_feed: Optional[RecommendationFeed] = None
+click_prefetcher: Optional[ClickPrefetcher] = None
 camera = None
+camera_producer: Optional[CameraProducer] = None
+vision_worker: Optional[VisionWorker] = None
+preview_encoder: Optional[PreviewEncoder] = None
 devices_cache: List[Dict] = []
+aoi_device_ids: List[str] = []
 current_recommendation: Optional[Dict] = None
+state_store = StateStore()
+broadcast_hub: Optional[BroadcastHub] = None
 
 # Background tasks
 background_tasks = set()
@@ -46,10 +66,10 @@ async def lifespan(app: FastAPI):
     
     # Start background tasks
     task1 = asyncio.create_task(device_polling_task())
-    task2 = asyncio.create_task(recommendation_polling_task())
-    
     background_tasks.add(task1)
-    background_tasks.add(task2)
+    
+    # Recommendations are pushed by the AI Service, or polled while it can't push
+    recommendation_feed.start()
     
     # Refresh devices immediately
     await refresh_devices()
@@ -64,14 +84,25 @@ async def lifespan(app: FastAPI):
     # Cancel background tasks
     for task in background_tasks:
         task.cancel()
+    if recommendation_feed:
+        recommendation_feed.stop()
+    
+    # Keep the pupil thresholds for the next start
+    if gaze_tracker:
+        await run_blocking(gaze_tracker.save_pupil_thresholds, config.pupil_threshold_file, config.user_uuid)
     
-    # Close camera
-    if camera:
+    if broadcast_hub:
+        broadcast_hub.stop()
+    
+    # Stop vision thread or process and close camera
+    if vision_worker:
+        vision_worker.stop()
+    elif camera:
         camera.release()
     
     # Close AI Service client
-    if ai_client and ai_client.session:
-        await ai_client.session.close()
+    if ai_client:
+        await ai_client.close()
     
     logger.info("👋 Shutdown complete")
 
@@ -88,7 +119,7 @@ app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
 
 async def initialize_services():
     """Initialize all required services"""
-    global ai_client, gaze_tracker, devices_cache, camera
+    global ai_client, device_cache, recommendation_feed, click_prefetcher, gaze_tracker, devices_cache, camera, camera_producer, vision_worker, preview_encoder, broadcast_hub
     
     logger.info("Initializing GazeHome Edge Device...")
     
@@ -97,7 +128,23 @@ async def initialize_services():
         logger.info("🎭 Running in MOCK MODE - using dummy data")
         ai_client = MockAIClient(config.ai_service_url, config.user_uuid)
     else:
-        ai_client = AIServiceClient(config.ai_service_url, config.user_uuid)
+        ai_client = AIServiceClient(config.ai_service_url, config.user_uuid, config.ai_transport)
+    
+    recommendation_feed = RecommendationFeed(
+        ai_client, on_recommendation,
+        push=config.recommendation_push and not config.mock_mode,
+        interval=config.recommendation_interval,
+        min_interval=config.recommendation_min_interval,
+        max_interval=config.recommendation_max_interval,
+        retry_interval=config.recommendation_push_retry
+    )
+    
+    # Click requests start while the dwell progresses, a click reuses them
+    click_prefetcher = ClickPrefetcher(send_click_request, config.click_prefetch_threshold)
+    
+    # Device list reads are served from a cache, refreshed in the background
+    device_cache = DeviceCache(ai_client, config.device_cache_ttl, config.device_cache_stale_ttl,
+                               on_update=apply_devices)
     
     # Verify AI service is available (skip health check in mock mode)
     if not config.mock_mode:
@@ -106,44 +153,111 @@ async def initialize_services():
             logger.error("AI Service is not available")
             raise Exception("AI Service connection failed")
     
-    # Initialize camera
-    logger.info(f"Opening camera at index {config.camera_index}...")
-    camera = cv2.VideoCapture(config.camera_index)
-    
-    if not camera.isOpened():
-        logger.error(f"❌ Failed to open camera at index {config.camera_index}")
-        logger.info("Try changing camera_index in config.json (0, 1, or 2)")
-        # Don't raise exception - allow server to start for debugging
-    else:
-        logger.info(f"✅ Camera opened successfully at index {config.camera_index}")
-    
     # Initialize gaze tracker with proper parameters
     # click_mode='both' enables both dwell-time and blink detection
-    gaze_tracker = GazeTracker(
+    tracker_options = dict(
         screen_width=config.screen_width,
         screen_height=config.screen_height,
         dwell_time=config.dwell_time,
         camera_index=config.camera_index,
-        click_mode='both'  # Always enable both click methods
+        click_mode='both',  # Always enable both click methods
+        tracking_mode=config.tracking_mode,
+        detect_interval=config.detect_interval,
+        face_tracker=config.face_tracker,
+        max_lost_frames=config.max_lost_frames,
+        min_tracker_confidence=config.min_tracker_confidence,
+        min_landmark_fill=config.min_landmark_fill,
+        detection_scale=config.detection_scale,
+        iris_locator=config.iris_locator,
+        preprocessing=config.preprocessing_backend,
+        preprocessing_downscale=config.preprocessing_downscale,
+        filter_min_cutoff=config.filter_min_cutoff,
+        filter_beta=config.filter_beta,
+        max_frame_interval=config.max_frame_interval,
+        saccade_speed=config.saccade_speed,
+        frame_budget=config.frame_budget
     )
     
+    if config.vision_mode == 'process':
+        # Camera and gaze tracking run in a child process, restarted if it fails
+        logger.info(f"Starting vision process for camera {config.camera_index}...")
+        vision_worker = VisionProcess(config.camera_index, tracker_options, config.frame_buffer_size,
+                                      config.vision_heartbeat_timeout)
+        gaze_tracker = vision_worker.gaze_tracker
+    else:
+        # Initialize camera
+        logger.info(f"Opening camera at index {config.camera_index}...")
+        camera = cv2.VideoCapture(config.camera_index)
+        
+        if not camera.isOpened():
+            logger.error(f"❌ Failed to open camera at index {config.camera_index}")
+            logger.info("Try changing camera_index in config.json (0, 1, or 2)")
+            # Don't raise exception - allow server to start for debugging
+        else:
+            logger.info(f"✅ Camera opened successfully at index {config.camera_index}")
+        
+        # One thread reads the camera into a frame buffer
+        camera_producer = CameraProducer(camera, config.frame_buffer_size)
+        
+        gaze_tracker = GazeTracker(**tracker_options)
+        
+        # Load dlib models now rather than on the first frame, without blocking the event loop
+        await run_blocking(model_registry.preload)
+        
+        # Camera and gaze tracking run on the vision thread, the event loop only awaits results
+        vision_worker = VisionWorker(camera_producer, gaze_tracker)
+    
+    # Start from the pupil thresholds learned in the previous run
+    gaze_tracker.load_pupil_thresholds(config.pupil_threshold_file, config.user_uuid)
+    
+    vision_worker.start(asyncio.get_running_loop())
+    
+    # The preview is encoded once per frame for every viewer, only while someone watches
+    preview_encoder = PreviewEncoder(vision_worker, config.preview_quality,
+                                     config.preview_width, config.preview_max_fps)
+    
     # Load initial devices
     await refresh_devices()
+    publish_state()
+    
+    # One producer fans the gaze results and state changes out to every WebSocket client
+    broadcast_hub = BroadcastHub(vision_worker, state_store, sync_calibration,
+                                 queue_size=config.websocket_queue_size,
+                                 on_result=on_gaze_result)
+    broadcast_hub.start()
     
     logger.info(f"✅ Services initialized successfully ({len(devices_cache)} devices loaded)")
     logger.info(f"UUID: {config.user_uuid}")
     logger.info(f"AI Service: {config.ai_service_url}")
     logger.info(f"Mock Mode: {config.mock_mode}")
     logger.info(f"Click Mode: both (dwell + blink)")
-    logger.info(f"Camera Status: {'OPEN' if camera and camera.isOpened() else 'CLOSED'}")
+    logger.info(f"Vision Mode: {config.vision_mode}")
 
 
-async def on_device_click(device_id: str, action: str, position: tuple):
-    """Handle device click event"""
-    global current_recommendation
-    
-    logger.info(f"Device clicked: {device_id} - {action} at {position}")
-    
+def publish_state():
+    """Record devices, recommendation and calibration status in the state store synced to the clients"""
+    state_store.update(
+        devices=devices_cache,
+        recommendation=current_recommendation,
+        calibrated=gaze_tracker.is_calibrated() if gaze_tracker else False,
+        user_uuid=config.user_uuid
+    )
+
+
+async def run_blocking(function, *args):
+    """Run a blocking call, like a GazeTracker call answered by the vision process, off the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, function, *args)
+
+
+def sync_calibration():
+    """Record the calibration status, it changes inside the gaze tracker"""
+    if gaze_tracker:
+        state_store.update(calibrated=gaze_tracker.is_calibrated())
+
+
+async def send_click_request(device_id: str, position: Optional[tuple]) -> Optional[Dict]:
+    """Send a device click to the AI Service, which answers with a recommendation"""
     # Find device info from cache
     device_info = None
     for device in devices_cache:
@@ -153,63 +267,145 @@ async def on_device_click(device_id: str, action: str, position: tuple):
     
     if not device_info:
         logger.warning(f"Device {device_id} not found in cache")
-        return
+        return None
+    
+    return await ai_client.send_device_click(
+        device_info=device_info,
+        context={'click_position': position}
+    )
+
+
+async def on_device_click(device_id: str, action: str, position: tuple,
+                          prefetched: Optional[asyncio.Task] = None):
+    """
+    Handle device click event
+    
+    Args:
+        device_id: Clicked device
+        action: Action of its AOI
+        position: Click position
+        prefetched: Click request already sent while the dwell progressed
+    """
+    global current_recommendation
+    
+    logger.info(f"Device clicked: {device_id} - {action} at {position}{' (prefetched)' if prefetched else ''}")
+    
+    # A recommendation may follow the click even if this request doesn't return one
+    recommendation_feed.notify_click()
     
     # Send to AI service for recommendation
     try:
-        result = await ai_client.send_device_click(
-            device_info=device_info,
-            context={'click_position': position}
-        )
+        if prefetched is not None:
+            result = await prefetched
+        else:
+            result = await send_click_request(device_id, position)
         
         if result and 'recommendation' in result:
             current_recommendation = result['recommendation']
             current_recommendation['device_id'] = device_id
-            current_recommendation['action'] = action
+            # 'action' holds the command of the recommendation, executed on YES
+            current_recommendation['clicked_action'] = action
+            publish_state()
             logger.info(f"Recommendation received: {current_recommendation.get('prompt_text', '')}")
     
     except Exception as e:
         logger.error(f"Error sending click to AI service: {e}")
 
 
-async def refresh_devices():
-    """Refresh device list and update AOIs via AI Service"""
-    global devices_cache
+def on_gaze_result(result: Dict):
+    """Follow the dwell to prefetch clicks, and send the gaze clicks on devices to the AI Service"""
+    if not result.get('click_detected'):
+        click_prefetcher.observe(result.get('dwell_target'), result.get('dwell_progress', 0.0),
+                                 result.get('gaze_position'))
+        return
+    
+    clicked = result.get('clicked_device')
+    if not clicked:
+        recommendation_feed.notify_click()
+        return
+    
+    # Take the prefetched request now, later results would cancel it
+    prefetched = click_prefetcher.take(clicked['device_id'])
+    task = asyncio.create_task(on_device_click(clicked['device_id'], clicked['action'],
+                                               clicked['position'], prefetched))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+def apply_devices(devices: List[Dict]):
+    """Use a newly fetched or updated device list: publish it and update the AOIs"""
+    global devices_cache, aoi_device_ids
     
     try:
-        # Get devices from AI Service (which communicates with Gateway)
-        devices = await ai_client.get_devices()
+        devices_cache = devices
+        publish_state()
         
-        if devices:
-            devices_cache = devices
-            
-            # Update AOIs in gaze tracker
-            gaze_tracker.clear_aois()
-            
-            # Create grid layout for devices (example: 3 columns)
-            cols = 3
-            card_width = config.screen_width // cols
-            card_height = 200
+        # The AOIs only depend on the devices and their order, not on their state
+        device_ids = [device.get('device_id', f'device_{i}') for i, device in enumerate(devices)]
+        if device_ids == aoi_device_ids:
+            return
+        aoi_device_ids = device_ids
+        
+        # Update AOIs in gaze tracker
+        gaze_tracker.clear_aois()
+        
+        # Create grid layout for devices (example: 3 columns)
+        cols = 3
+        card_width = config.screen_width // cols
+        card_height = 200
+        
+        for i, device in enumerate(devices):
+            row = i // cols
+            col = i % cols
             
-            for i, device in enumerate(devices):
-                row = i // cols
-                col = i % cols
-                
-                x = col * card_width
-                y = row * card_height
-                
-                gaze_tracker.add_aoi(
-                    x, y, card_width, card_height,
-                    device.get('device_id', f'device_{i}'),
-                    'toggle'
-                )
+            x = col * card_width
+            y = row * card_height
             
-            logger.info(f"Refreshed {len(devices)} devices")
+            gaze_tracker.add_aoi(
+                x, y, card_width, card_height,
+                device.get('device_id', f'device_{i}'),
+                'toggle'
+            )
+        
+        logger.info(f"Refreshed {len(devices)} devices")
     
     except Exception as e:
         logger.error(f"Error refreshing devices: {e}")
 
 
+async def execute_control(device_id: str, action: str, parameters: Optional[Dict] = None) -> Optional[Dict]:
+    """
+    Control a device via AI Service (which forwards to Gateway)
+    
+    The expected state is pushed to the clients before the command is sent.
+    It is replaced by the state returned by the gateway, or rolled back if the
+    command failed, and checked against a new device list in the background.
+    """
+    device_cache.apply_optimistic(device_id, action, parameters)
+    
+    try:
+        result = await ai_client.control_device(device_id, action, parameters)
+    except Exception as e:
+        logger.error(f"Error controlling device {device_id}: {e}")
+        result = None
+    
+    if not result or result.get('result') == 'error' or 'error' in result:
+        device_cache.rollback(device_id)
+    else:
+        device_cache.confirm(device_id, result.get('updated_state'))
+    return result
+
+
+async def refresh_devices(force: bool = False):
+    """
+    Refresh device list via AI Service (which communicates with Gateway)
+    
+    Args:
+        force: Wait for a new list instead of serving the cached one, after a device changed
+    """
+    await device_cache.get(force)
+
+
 async def device_polling_task():
     """Background task to poll device status"""
     while True:
@@ -221,56 +417,13 @@ async def device_polling_task():
             await asyncio.sleep(config.device_status_interval)
 
 
-async def recommendation_polling_task():
-    """Background task to poll for recommendations"""
+def on_recommendation(rec: Dict):
+    """Show a recommendation pushed or polled from the AI Service"""
     global current_recommendation
     
-    while True:
-        try:
-            rec = await ai_client.poll_recommendation()
-            if rec:
-                current_recommendation = rec
-                logger.info(f"New recommendation: {rec.get('message', '')}")
-            
-            await asyncio.sleep(config.recommendation_interval)
-        except Exception as e:
-            logger.error(f"Error in recommendation polling: {e}")
-            await asyncio.sleep(config.recommendation_interval)
-
-
-def generate_frames():
-    """Generate video frames with gaze overlay"""
-    global camera, gaze_tracker
-    
-    while True:
-        if camera is None or not camera.isOpened():
-            break
-        
-        ret, frame = camera.read()
-        if not ret:
-            logger.warning("Failed to read frame")
-            break
-        
-        # Update gaze tracking
-        if gaze_tracker:
-            result = gaze_tracker.update(frame)
-            
-            # Draw gaze pointer
-            if result.get('gaze_position'):
-                x, y = result['gaze_position']
-                cv2.circle(frame, (x, y), 15, (0, 255, 0), 2)
-                
-                # Draw dwell progress
-                if result.get('dwell_progress', 0) > 0:
-                    radius = int(15 + 20 * result['dwell_progress'])
-                    cv2.circle(frame, (x, y), radius, (255, 0, 0), 2)
-        
-        # Encode frame to JPEG
-        ret, buffer = cv2.imencode('.jpg', frame)
-        frame_bytes = buffer.tobytes()
-        
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+    current_recommendation = rec
+    publish_state()
+    logger.info(f"New recommendation: {rec.get('message', '')}")
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -286,8 +439,11 @@ async def index(request: Request):
 @app.get("/video_feed")
 async def video_feed():
     """Video streaming endpoint"""
+    if preview_encoder is None:
+        return JSONResponse({'error': 'Camera not initialized'}, status_code=503)
+    
     return StreamingResponse(
-        generate_frames(),
+        preview_encoder.stream(),
         media_type="multipart/x-mixed-replace; boundary=frame"
     )
 
@@ -296,18 +452,103 @@ async def video_feed():
 async def get_state():
     """Get current application state"""
     return JSONResponse({
+        'version': state_store.version,
         'calibrated': gaze_tracker.is_calibrated() if gaze_tracker else False,
         'devices': devices_cache,
         'recommendation': current_recommendation,
-        'user_uuid': config.user_uuid
+        'user_uuid': config.user_uuid,
+        'pipeline': gaze_tracker.get_pipeline_stats() if gaze_tracker else None,
+        'quality': gaze_tracker.get_quality_state() if gaze_tracker else None
     })
 
 
+@app.get("/api/face-tracking")
+async def get_face_tracking_stats():
+    """Get face detection / tracking counters"""
+    if gaze_tracker:
+        return JSONResponse(gaze_tracker.get_face_tracking_stats())
+    return JSONResponse({'error': 'Gaze tracker not initialized'})
+
+
+@app.get("/api/camera")
+async def get_camera_stats():
+    """Get capture counters and dropped frames / lag of each frame consumer"""
+    if vision_worker:
+        return JSONResponse(vision_worker.get_camera_stats())
+    return JSONResponse({'error': 'Camera not initialized'})
+
+
+@app.get("/api/vision")
+async def get_vision_stats():
+    """Get vision thread counters"""
+    if vision_worker:
+        return JSONResponse(vision_worker.get_stats())
+    return JSONResponse({'error': 'Vision worker not initialized'})
+
+
+@app.get("/api/preview")
+async def get_preview_stats():
+    """Get preview viewers, encode time and bytes sent per second"""
+    if preview_encoder:
+        return JSONResponse(preview_encoder.get_stats())
+    return JSONResponse({'error': 'Preview not initialized'})
+
+
+@app.get("/api/websocket")
+async def get_websocket_stats():
+    """Get broadcast counters and the queue of each WebSocket client"""
+    if broadcast_hub:
+        return JSONResponse(broadcast_hub.get_stats())
+    return JSONResponse({'error': 'Broadcast hub not initialized'})
+
+
+@app.get("/api/ai-service")
+async def get_ai_service_stats():
+    """Get AI Service request counters and circuit breaker state"""
+    if ai_client:
+        return JSONResponse(ai_client.get_stats())
+    return JSONResponse({'error': 'AI Service client not initialized'})
+
+
+@app.get("/api/devices/cache")
+async def get_device_cache_stats():
+    """Get device cache hit, miss and coalesce counters"""
+    if device_cache:
+        return JSONResponse(device_cache.get_stats())
+    return JSONResponse({'error': 'Device cache not initialized'})
+
+
+@app.get("/api/recommendation/feed")
+async def get_recommendation_feed_stats():
+    """Get how recommendations are received: push stream or adaptive polling"""
+    if recommendation_feed:
+        return JSONResponse(recommendation_feed.get_stats())
+    return JSONResponse({'error': 'Recommendation feed not initialized'})
+
+
+@app.get("/api/prefetch")
+async def get_prefetch_stats():
+    """Get hit rate and latency saved by the click prefetch"""
+    if click_prefetcher:
+        return JSONResponse(click_prefetcher.get_stats())
+    return JSONResponse({'error': 'Click prefetch not initialized'})
+
+
+@app.get("/api/models")
+async def get_model_stats():
+    """Get load time and resident memory of the gaze tracking models"""
+    if isinstance(vision_worker, VisionProcess):
+        # The models are loaded by the vision process
+        return JSONResponse(vision_worker.get_model_stats())
+    return JSONResponse(model_registry.stats())
+
+
 @app.post("/api/calibration/start")
 async def start_calibration():
     """Start calibration process"""
     if gaze_tracker:
         gaze_tracker.start_calibration()
+        publish_state()
         return JSONResponse({'status': 'started'})
     return JSONResponse({'status': 'error', 'message': 'Gaze tracker not initialized'})
 
@@ -316,7 +557,7 @@ async def start_calibration():
 async def get_calibration_progress():
     """Get calibration progress"""
     if gaze_tracker:
-        return JSONResponse(gaze_tracker.get_calibration_progress())
+        return JSONResponse(await run_blocking(gaze_tracker.get_calibration_progress))
     return JSONResponse({'error': 'Gaze tracker not initialized'})
 
 
@@ -324,7 +565,7 @@ async def get_calibration_progress():
 async def add_calibration_sample():
     """Add calibration sample"""
     if gaze_tracker:
-        ready = gaze_tracker.add_calibration_sample()
+        ready = await run_blocking(gaze_tracker.add_calibration_sample)
         return JSONResponse({'ready': ready})
     return JSONResponse({'error': 'Gaze tracker not initialized'})
 
@@ -333,11 +574,13 @@ async def add_calibration_sample():
 async def next_calibration_target():
     """Move to next calibration target"""
     if gaze_tracker:
-        complete = gaze_tracker.next_calibration_target()
+        complete = await run_blocking(gaze_tracker.next_calibration_target)
         
         if complete:
             # Save calibration
-            gaze_tracker.save_calibration(config.calibration_file)
+            await run_blocking(gaze_tracker.save_calibration, config.calibration_file)
+            await run_blocking(gaze_tracker.save_pupil_thresholds, config.pupil_threshold_file, config.user_uuid)
+            publish_state()
         
         return JSONResponse({'complete': complete})
     return JSONResponse({'error': 'Gaze tracker not initialized'})
@@ -349,8 +592,8 @@ async def update_dwell_time(request: Request):
     data = await request.json()
     dwell_time = data.get('dwell_time', 0.8)
     
-    if gaze_tracker and gaze_tracker.dwell_detector:
-        gaze_tracker.dwell_detector.dwell_time = dwell_time
+    if gaze_tracker:
+        gaze_tracker.set_dwell_time(dwell_time)
         logger.info(f"Updated dwell time to {dwell_time}s")
         return JSONResponse({'status': 'success', 'dwell_time': dwell_time})
     
@@ -367,7 +610,7 @@ async def update_click_mode(request: Request):
         return JSONResponse({'error': 'Invalid click mode. Must be dwell, blink, or both'}, status_code=400)
     
     if gaze_tracker:
-        gaze_tracker.click_mode = click_mode
+        gaze_tracker.set_click_mode(click_mode)
         logger.info(f"Updated click mode to {click_mode}")
         return JSONResponse({'status': 'success', 'click_mode': click_mode})
     
@@ -377,7 +620,7 @@ async def update_click_mode(request: Request):
 @app.post("/api/devices/refresh")
 async def refresh_devices_endpoint():
     """Manually refresh device list"""
-    await refresh_devices()
+    await refresh_devices(force=True)
     return JSONResponse({'status': 'refreshed', 'count': len(devices_cache)})
 
 
@@ -388,11 +631,8 @@ async def control_device(device_id: str, request: Request):
     action = data.get('action', 'toggle')
     parameters = data.get('parameters')
     
-    # Send control request to AI Service (which forwards to Gateway)
-    result = await ai_client.control_device(device_id, action, parameters)
-    
-    # Refresh devices to get updated state
-    await refresh_devices()
+    recommendation_feed.notify_click()
+    result = await execute_control(device_id, action, parameters)
     
     return JSONResponse(result or {'error': 'Control failed'})
 
@@ -423,99 +663,64 @@ async def respond_to_recommendation(request: Request):
         
         if device_id and command:
             # AI Service will forward the control command to Gateway
-            await ai_client.control_device(device_id, command, parameters)
-            await refresh_devices()
+            await execute_control(device_id, command, parameters)
     
     # Clear recommendation
     current_recommendation = None
+    publish_state()
     
     return JSONResponse(result or {'status': 'ok'})
 
 
+async def receive_state_acks(websocket: WebSocket, subscription: StateSubscription):
+    """Read the state acks and resync requests of a client"""
+    while True:
+        message = await websocket.receive_json()
+        if message.get('type') == 'ack':
+            subscription.ack(message.get('version', 0))
+        elif message.get('type') == 'resync':
+            subscription.resync()
+
+
+async def send_hub_messages(websocket: WebSocket, subscriber: HubSubscriber):
+    """Send the messages the broadcast hub queued for a client"""
+    while True:
+        message = await subscriber.get()
+        if isinstance(message, bytes):
+            await websocket.send_bytes(message)
+        else:
+            await websocket.send_text(message)
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket for real-time updates"""
-    await websocket.accept()
-    logger.info("WebSocket connection opened")
+    # Clients asking for the binary subprotocol get the gaze samples packed, one message per tick
+    binary = GAZE_SUBPROTOCOL in websocket.scope.get('subprotocols', [])
+    await websocket.accept(subprotocol=GAZE_SUBPROTOCOL if binary else None)
+    logger.info(f"WebSocket connection opened ({'binary' if binary else 'JSON'} gaze stream)")
     
-    frame_count = 0
+    if vision_worker is None or not vision_worker.is_running:
+        logger.warning(f"Camera not ready: vision={'None' if vision_worker is None else vision_worker.get_stats()}, gaze_tracker={'None' if gaze_tracker is None else 'OK'}")
+    
+    # The hub produces the messages once for every client, this connection only sends its own queue
+    subscriber = broadcast_hub.subscribe(binary)
+    sender = asyncio.create_task(send_hub_messages(websocket, subscriber))
+    receiver = asyncio.create_task(receive_state_acks(websocket, subscriber.state))
     
     try:
-        while True:
-            frame_count += 1
-            
-            # Log camera status periodically
-            if frame_count % 100 == 0:
-                camera_status = "OPEN" if (camera and camera.isOpened()) else "CLOSED"
-                logger.info(f"WebSocket frame {frame_count}: Camera={camera_status}, GazeTracker={'OK' if gaze_tracker else 'None'}")
-            
-            # Get latest frame and gaze data
-            if camera is not None and camera.isOpened() and gaze_tracker:
-                ret, frame = camera.read()
-                if not ret:
-                    if frame_count % 50 == 0:
-                        logger.warning("Failed to read frame from camera")
-                    await asyncio.sleep(0.05)
-                    continue
-                
-                # Update gaze tracking
-                result = gaze_tracker.update(frame)
-                
-                # Log result periodically for debugging
-                if frame_count % 100 == 0:
-                    logger.info(f"Gaze result: position={result.get('gaze_position')}, pupils_detected={result.get('pupils_detected')}")
-                
-                # Send gaze position
-                if result.get('gaze_position'):
-                    await websocket.send_json({
-                        'type': 'gaze',
-                        'position': {
-                            'x': result['gaze_position'][0],
-                            'y': result['gaze_position'][1]
-                        }
-                    })
-                
-                # Send dwell progress
-                if result.get('dwell_progress', 0) > 0:
-                    await websocket.send_json({
-                        'type': 'dwell',
-                        'progress': result['dwell_progress'],
-                        'position': {
-                            'x': result['gaze_position'][0],
-                            'y': result['gaze_position'][1]
-                        } if result.get('gaze_position') else None
-                    })
-                
-                # Send click event
-                if result.get('click_detected'):
-                    clicked_device = result.get('clicked_device')
-                    await websocket.send_json({
-                        'type': 'click',
-                        'method': result.get('click_method'),
-                        'device_id': clicked_device['device_id'] if clicked_device else None,
-                        'device_name': clicked_device.get('device_id') if clicked_device else None,
-                        'position': clicked_device.get('position') if clicked_device else None
-                    })
-            else:
-                # Camera not ready - log warning
-                if frame_count == 1:
-                    logger.warning(f"Camera not ready: camera={'None' if camera is None else ('Open' if camera.isOpened() else 'Closed')}, gaze_tracker={'None' if gaze_tracker is None else 'OK'}")
-            
-            # Send state updates
-            state = {
-                'type': 'state',
-                'devices': devices_cache,
-                'recommendation': current_recommendation,
-                'calibrated': gaze_tracker.is_calibrated() if gaze_tracker else False
-            }
-            
-            await websocket.send_json(state)
-            await asyncio.sleep(0.05)  # 20 FPS for smooth tracking
+        done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
     
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected")
     except Exception as e:
         logger.error(f"WebSocket error: {e}", exc_info=True)
+    finally:
+        sender.cancel()
+        receiver.cancel()
+        broadcast_hub.unsubscribe(subscriber)
 
 
 if __name__ == "__main__":
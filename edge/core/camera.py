@@ -0,0 +1,226 @@
+"""
+Camera Capture
+A single thread reads the camera into a ring buffer of preallocated frames
+that any number of consumers read without copying
+"""
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class FrameRingBuffer:
+    """
+    Fixed-size ring of frames numbered by a sequence. The producer reads
+    the camera directly into the next slot; consumers get a view of a slot,
+    valid until the producer wraps around and overwrites it.
+    """
+    
+    def __init__(self, size: int = 4):
+        if size < 2:
+            raise ValueError(f"Ring buffer needs at least 2 slots, got {size}")
+        
+        self.size = size
+        self.frames: List[Optional[np.ndarray]] = [None] * size
+        self.sequences = [-1] * size
+        self.timestamps = [0.0] * size
+        
+        self.sequence = -1  # Sequence of the last written frame
+        self._condition = threading.Condition()
+    
+    def next_slot(self) -> Optional[np.ndarray]:
+        """Get the preallocated array the next frame should be read into.
+        The frame it held is invalidated first, so that a consumer copying it
+        sees with is_valid() that the copy may be torn."""
+        index = (self.sequence + 1) % self.size
+        self.sequences[index] = -1
+        return self.frames[index]
+    
+    def commit(self, frame: np.ndarray, timestamp: float) -> int:
+        """
+        Publish the next frame
+        
+        Args:
+            frame: Frame read into next_slot(), or a new array if the slot
+                was missing or had another shape
+            timestamp: Capture time of the frame
+        
+        Returns:
+            Sequence number of the frame
+        """
+        with self._condition:
+            sequence = self.sequence + 1
+            index = sequence % self.size
+            self.frames[index] = frame
+            self.sequences[index] = sequence
+            self.timestamps[index] = timestamp
+            self.sequence = sequence
+            self._condition.notify_all()
+        return sequence
+    
+    def get(self, sequence: int) -> Optional[Tuple[np.ndarray, float]]:
+        """Get (frame, timestamp) of a sequence, None if it was overwritten or not written yet"""
+        index = sequence % self.size
+        if sequence < 0 or self.sequences[index] != sequence:
+            return None
+        return self.frames[index], self.timestamps[index]
+    
+    def is_valid(self, sequence: int) -> bool:
+        """Check that a frame read earlier hasn't been overwritten since"""
+        return sequence >= 0 and self.sequences[sequence % self.size] == sequence
+    
+    def wait(self, after: int, timeout: Optional[float] = None) -> int:
+        """Block until a frame newer than after is written, return the last sequence"""
+        with self._condition:
+            self._condition.wait_for(lambda: self.sequence > after, timeout)
+            return self.sequence
+
+
+class FrameSubscriber:
+    """Reads the latest frames of a ring buffer and counts what it missed"""
+    
+    def __init__(self, ring: FrameRingBuffer, name: str):
+        self.ring = ring
+        self.name = name
+        self.last_sequence = ring.sequence
+        
+        self.frames_read = 0
+        self.frames_dropped = 0  # Frames written after the previous read and skipped
+        self.max_lag = 0         # Largest number of frames skipped at once
+        self.frame_age = 0.0     # Average age of the frames when read (seconds)
+    
+    def poll(self) -> Optional[Tuple[int, np.ndarray, float]]:
+        """Get (sequence, frame, timestamp) of the latest frame if it wasn't read yet, without blocking"""
+        sequence = self.ring.sequence
+        if sequence <= self.last_sequence:
+            return None
+        
+        entry = self.ring.get(sequence)
+        if entry is None:
+            return None
+        
+        frame, timestamp = entry
+        lag = sequence - self.last_sequence - 1 if self.last_sequence >= 0 else 0
+        self.frames_dropped += lag
+        self.max_lag = max(self.max_lag, lag)
+        self.frames_read += 1
+        self.frame_age += 0.1 * ((time.time() - timestamp) - self.frame_age)
+        self.last_sequence = sequence
+        return sequence, frame, timestamp
+    
+    def read(self, timeout: Optional[float] = None) -> Optional[Tuple[int, np.ndarray, float]]:
+        """Wait for a frame that wasn't read yet and return it, None on timeout"""
+        self.ring.wait(self.last_sequence, timeout)
+        return self.poll()
+    
+    def get_stats(self) -> Dict:
+        """Get read, dropped and lag counters"""
+        return {
+            'name': self.name,
+            'frames_read': self.frames_read,
+            'frames_dropped': self.frames_dropped,
+            'max_lag': self.max_lag,
+            'frame_age_ms': self.frame_age * 1000
+        }
+
+
+class CameraProducer:
+    """Thread reading a cv2.VideoCapture into a FrameRingBuffer"""
+    
+    def __init__(self, capture: cv2.VideoCapture, ring_size: int = 4,
+                 ring: Optional[FrameRingBuffer] = None):
+        self.capture = capture
+        self.ring = ring or FrameRingBuffer(ring_size)
+        
+        self.frames_captured = 0
+        self.read_failures = 0
+        self.fps = 0.0
+        
+        self._subscribers: List[FrameSubscriber] = []
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+    
+    @property
+    def is_running(self) -> bool:
+        """True while the capture thread reads frames"""
+        return self._running and self.capture is not None and self.capture.isOpened()
+    
+    def start(self):
+        """Start the capture thread"""
+        if self._thread is not None:
+            return
+        
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="camera", daemon=True)
+        self._thread.start()
+        logger.info(f"Camera producer started ({self.ring.size} frames ring buffer)")
+    
+    def stop(self):
+        """Stop the capture thread and release the camera"""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        if self.capture is not None:
+            self.capture.release()
+    
+    def _run(self):
+        """Capture loop"""
+        last_time = time.time()
+        
+        while self._running:
+            if self.capture is None or not self.capture.isOpened():
+                time.sleep(0.5)
+                continue
+            
+            # Read straight into the slot, OpenCV allocates a new array if its shape doesn't match
+            ret, frame = self.capture.read(self.ring.next_slot())
+            if not ret or frame is None:
+                self.read_failures += 1
+                if self.read_failures % 50 == 1:
+                    logger.warning("Failed to read frame from camera")
+                time.sleep(0.05)
+                continue
+            
+            now = time.time()
+            self.ring.commit(frame, now)
+            self.frames_captured += 1
+            
+            dt = now - last_time
+            last_time = now
+            if dt > 0:
+                self.fps += 0.1 * (1.0 / dt - self.fps)
+    
+    def subscribe(self, name: str) -> FrameSubscriber:
+        """Register a consumer of the frames"""
+        subscriber = FrameSubscriber(self.ring, name)
+        with self._lock:
+            self._subscribers.append(subscriber)
+        return subscriber
+    
+    def unsubscribe(self, subscriber: FrameSubscriber):
+        """Remove a consumer"""
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+    
+    def get_stats(self) -> Dict:
+        """Get capture counters and the counters of each consumer"""
+        with self._lock:
+            subscribers = [subscriber.get_stats() for subscriber in self._subscribers]
+        
+        return {
+            'running': self.is_running,
+            'sequence': self.ring.sequence,
+            'ring_size': self.ring.size,
+            'frames_captured': self.frames_captured,
+            'read_failures': self.read_failures,
+            'fps': self.fps,
+            'subscribers': subscribers
+        }
@@ -4,7 +4,7 @@ Handles loading and saving configuration parameters
 """
 import json
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from pathlib import Path
 
 
@@ -40,6 +40,11 @@ class Config:
         """Get AI service URL"""
         return self.config.get("ai_service_url", "http://localhost:8001")
     
+    @property
+    def ai_transport(self) -> Dict[str, Any]:
+        """Get connection pool, timeout, retry and circuit breaker settings of the AI service client"""
+        return self.config.get("ai_transport", {})
+    
     @property
     def dwell_time(self) -> float:
         """Get dwell time for gaze click"""
@@ -60,22 +65,174 @@ class Config:
         """Get camera index"""
         return self.config.get("gaze", {}).get("camera_index", 0)
     
+    @property
+    def frame_buffer_size(self) -> int:
+        """Get number of camera frames kept in the capture ring buffer"""
+        return self.config.get("gaze", {}).get("frame_buffer_size", 4)
+    
+    @property
+    def tracking_mode(self) -> str:
+        """Get face tracking mode ('detect' or 'track')"""
+        return self.config.get("gaze", {}).get("tracking_mode", "detect")
+    
+    @property
+    def detect_interval(self) -> int:
+        """Get number of frames between two face detections in track mode"""
+        return self.config.get("gaze", {}).get("detect_interval", 10)
+    
+    @property
+    def face_tracker(self) -> str:
+        """Get tracker following the face between detections ('landmarks' or 'correlation')"""
+        return self.config.get("gaze", {}).get("face_tracking", {}).get("tracker", "landmarks")
+    
+    @property
+    def max_lost_frames(self) -> int:
+        """Get number of consecutive frames without pupils after which the face is detected again"""
+        return self.config.get("gaze", {}).get("face_tracking", {}).get("max_lost_frames", 3)
+    
+    @property
+    def min_tracker_confidence(self) -> float:
+        """Get correlation tracker confidence under which the face is detected again"""
+        return self.config.get("gaze", {}).get("face_tracking", {}).get("min_tracker_confidence", 7.0)
+    
+    @property
+    def min_landmark_fill(self) -> float:
+        """Get share of the face region the landmarks must cover to keep tracking it"""
+        return self.config.get("gaze", {}).get("face_tracking", {}).get("min_landmark_fill", 0.3)
+    
+    @property
+    def detection_scale(self) -> int:
+        """Get downscale factor of the frame given to the face detector"""
+        return self.config.get("gaze", {}).get("detection_scale", 1)
+    
+    @property
+    def iris_locator(self) -> str:
+        """Get iris locator ('contours', 'components' or 'moments')"""
+        return self.config.get("gaze", {}).get("iris_locator", "contours")
+    
+    @property
+    def preprocessing_backend(self) -> str:
+        """Get eye preprocessing backend ('bilateral', 'gaussian', 'median' or 'box')"""
+        return self.config.get("gaze", {}).get("preprocessing", {}).get("backend", "bilateral")
+    
+    @property
+    def preprocessing_downscale(self) -> int:
+        """Get downscale factor applied to eye frames before preprocessing"""
+        return self.config.get("gaze", {}).get("preprocessing", {}).get("downscale", 1)
+    
+    @property
+    def filter_min_cutoff(self) -> float:
+        """Get gaze filter cutoff frequency while the gaze is still (Hz)"""
+        return self.config.get("gaze", {}).get("filter", {}).get("min_cutoff", 1.0)
+    
+    @property
+    def filter_beta(self) -> float:
+        """Get gaze filter cutoff increase per pixel/s of gaze speed"""
+        return self.config.get("gaze", {}).get("filter", {}).get("beta", 0.007)
+    
+    @property
+    def max_frame_interval(self) -> int:
+        """Get maximum number of frames between two analyzed frames while the gaze is stable"""
+        return self.config.get("gaze", {}).get("frame_skip", {}).get("max_interval", 1)
+    
+    @property
+    def saccade_speed(self) -> float:
+        """Get gaze speed (pixels/s) above which every frame is analyzed"""
+        return self.config.get("gaze", {}).get("frame_skip", {}).get("saccade_speed", 600.0)
+    
+    @property
+    def frame_budget(self) -> Optional[float]:
+        """Get gaze update latency budget (seconds), None disables the quality governor"""
+        budget_ms = self.config.get("gaze", {}).get("frame_budget_ms")
+        return budget_ms / 1000 if budget_ms else None
+    
+    @property
+    def vision_mode(self) -> str:
+        """Get where capture and gaze tracking run ('thread' or 'process')"""
+        return self.config.get("vision", {}).get("mode", "thread")
+    
+    @property
+    def vision_heartbeat_timeout(self) -> float:
+        """Get seconds without news from the vision process before it is restarted"""
+        return self.config.get("vision", {}).get("heartbeat_timeout", 5.0)
+    
+    @property
+    def preview_quality(self) -> int:
+        """Get JPEG quality of the video preview (0-100)"""
+        return self.config.get("preview", {}).get("quality", 80)
+    
+    @property
+    def preview_width(self) -> int:
+        """Get width of the video preview in pixels, 0 keeps the camera width"""
+        return self.config.get("preview", {}).get("width", 0)
+    
+    @property
+    def preview_max_fps(self) -> float:
+        """Get maximum frame rate of the video preview, 0 for no limit"""
+        return self.config.get("preview", {}).get("max_fps", 15.0)
+    
+    @property
+    def websocket_queue_size(self) -> int:
+        """Get number of messages buffered per WebSocket client before the oldest are dropped"""
+        return self.config.get("websocket", {}).get("queue_size", 32)
+    
     @property
     def calibration_file(self) -> Path:
         """Get calibration file path"""
         filename = self.config.get("calibration_file", "calibration_params.json")
         return Path(__file__).parent.parent / filename
     
+    @property
+    def pupil_threshold_file(self) -> Path:
+        """Get pupil thresholds file path (thresholds of every user)"""
+        filename = self.config.get("pupil_threshold_file", "pupil_thresholds.json")
+        return Path(__file__).parent.parent / filename
+    
     @property
     def device_status_interval(self) -> float:
         """Get device status polling interval"""
         return self.config.get("polling", {}).get("device_status_interval", 5.0)
     
+    @property
+    def click_prefetch_threshold(self) -> float:
+        """Get dwell progress at which the click recommendation is requested, 1 disables the prefetch"""
+        return self.config.get("gaze", {}).get("click_prefetch", 1.0)
+    
+    @property
+    def device_cache_ttl(self) -> float:
+        """Get age under which the cached device list is served without refresh"""
+        return self.config.get("device_cache", {}).get("ttl", 4.0)
+    
+    @property
+    def device_cache_stale_ttl(self) -> float:
+        """Get extra age during which the stale device list is served while it's refreshed"""
+        return self.config.get("device_cache", {}).get("stale_ttl", 30.0)
+    
     @property
     def recommendation_interval(self) -> float:
         """Get recommendation polling interval"""
         return self.config.get("polling", {}).get("recommendation_interval", 3.0)
     
+    @property
+    def recommendation_min_interval(self) -> float:
+        """Get recommendation polling interval right after a click"""
+        return self.config.get("polling", {}).get("recommendation_min_interval", 1.0)
+    
+    @property
+    def recommendation_max_interval(self) -> float:
+        """Get longest recommendation polling interval while nothing is pending"""
+        return self.config.get("polling", {}).get("recommendation_max_interval", 15.0)
+    
+    @property
+    def recommendation_push(self) -> bool:
+        """Get whether recommendations are received from the AI Service push stream"""
+        return self.config.get("recommendation_push", {}).get("enabled", True)
+    
+    @property
+    def recommendation_push_retry(self) -> float:
+        """Get delay before the push stream is tried again after it failed"""
+        return self.config.get("recommendation_push", {}).get("retry_interval", 60.0)
+    
     @property
     def mock_mode(self) -> bool:
         """Get mock mode setting"""
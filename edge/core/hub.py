@@ -0,0 +1,213 @@
+"""
+Broadcast Hub
+One task turns the vision results and state changes of each tick into
+messages, serialized once, and fans them out to every WebSocket client
+"""
+import asyncio
+import json
+import logging
+from typing import Callable, Dict, List, Optional, Set, Union
+
+from .protocol import encode_gaze_batch
+from .state import StateStore, StateSubscription
+from .vision import VisionResult, VisionWorker
+
+logger = logging.getLogger(__name__)
+
+Message = Union[str, bytes]
+
+
+def _dumps(data: Dict) -> str:
+    """Serialize a JSON message, compact like WebSocket.send_json"""
+    return json.dumps(data, separators=(',', ':'))
+
+
+class HubSubscriber:
+    """
+    Outgoing messages of one client. The queue is bounded: when the client
+    doesn't keep up its oldest messages are dropped, so it never holds
+    back the other clients.
+    """
+    
+    def __init__(self, state_store: StateStore, binary: bool = False, queue_size: int = 32):
+        self.binary = binary  # Gaze samples as binary batches instead of JSON messages
+        self.state = StateSubscription(state_store)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        
+        self.messages_sent = 0
+        self.messages_dropped = 0
+    
+    def put(self, message: Message):
+        """Queue a message, dropping the oldest one if the queue is full"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.messages_dropped += 1
+        self.queue.put_nowait(message)
+    
+    async def get(self) -> Message:
+        """Wait for the next message to send"""
+        message = await self.queue.get()
+        self.messages_sent += 1
+        return message
+    
+    def get_stats(self) -> Dict:
+        """Get message counters and state sync versions"""
+        return {
+            'binary': self.binary,
+            'queued': self.queue.qsize(),
+            'messages_sent': self.messages_sent,
+            'messages_dropped': self.messages_dropped,
+            'state': self.state.get_stats()
+        }
+
+
+class BroadcastHub:
+    """
+    Single producer of the /ws messages. Every tick it drains the vision
+    results published since the previous one and encodes the gaze, dwell and
+    click messages once for all the clients of each format.
+    """
+    
+    def __init__(self, vision_worker: Optional[VisionWorker], state_store: StateStore,
+                 sync_state: Optional[Callable[[], None]] = None,
+                 interval: float = 0.05, queue_size: int = 32,
+                 on_result: Optional[Callable[[Dict], None]] = None):
+        self.vision_worker = vision_worker
+        self.state_store = state_store
+        self.sync_state = sync_state  # Called each tick to refresh polled values of the state
+        self.interval = interval      # Tick period (seconds)
+        self.queue_size = queue_size  # Messages buffered per client
+        self.on_result = on_result    # Called with each gaze result, in order, even without clients
+        
+        self.ticks = 0
+        self.results_broadcast = 0
+        
+        self._subscribers: Set[HubSubscriber] = set()
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        """Start the producer task, to be called from the event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info("Broadcast hub started")
+    
+    def stop(self):
+        """Stop the producer task"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+    
+    def subscribe(self, binary: bool = False) -> HubSubscriber:
+        """Register a client, it gets a state snapshot on the next tick"""
+        subscriber = HubSubscriber(self.state_store, binary, self.queue_size)
+        self._subscribers.add(subscriber)
+        return subscriber
+    
+    def unsubscribe(self, subscriber: HubSubscriber):
+        """Remove a client"""
+        self._subscribers.discard(subscriber)
+    
+    async def _run(self):
+        """Producer loop"""
+        vision_worker = self.vision_worker
+        results = vision_worker.subscribe() if vision_worker else None
+        try:
+            while True:
+                self.ticks += 1
+                try:
+                    self._tick(results)
+                except Exception as e:
+                    logger.error(f"Broadcast tick failed: {e}", exc_info=True)
+                
+                if self.ticks % 100 == 0 and self._subscribers:
+                    camera_status = "OPEN" if (vision_worker and vision_worker.is_running) else "CLOSED"
+                    logger.info(f"Broadcast tick {self.ticks}: Camera={camera_status}, clients={len(self._subscribers)}")
+                
+                await asyncio.sleep(self.interval)  # 20 FPS for smooth tracking
+        finally:
+            if results is not None:
+                vision_worker.unsubscribe(results)
+    
+    def _tick(self, results: Optional[asyncio.Queue]):
+        """Fan out the messages of one tick"""
+        # Get the gaze results published since the last tick
+        pending: List[VisionResult] = []
+        while results is not None and not results.empty():
+            pending.append(results.get_nowait())
+        
+        if self.on_result:
+            for vision_result in pending:
+                self.on_result(vision_result.result)
+        
+        if self.sync_state:
+            self.sync_state()
+        
+        if not self._subscribers:
+            return
+        
+        gaze_messages: Dict[bool, List[Message]] = {}
+        if pending:
+            self.results_broadcast += len(pending)
+            clicks = self._click_messages(pending)
+            gaze_messages[True] = [encode_gaze_batch(pending)] + clicks
+            gaze_messages[False] = self._json_gaze_messages(pending[-1].result) + clicks
+        
+        state_messages: Dict[int, str] = {}  # Serialized deltas by base version
+        for subscriber in list(self._subscribers):
+            for message in gaze_messages.get(subscriber.binary, ()):
+                subscriber.put(message)
+            
+            since = subscriber.state.sent_version
+            state_message = subscriber.state.next_message()
+            if state_message is None:
+                continue
+            if state_message['type'] == 'snapshot':
+                subscriber.put(_dumps(state_message))
+                continue
+            if since not in state_messages:
+                state_messages[since] = _dumps(state_message)
+            subscriber.put(state_messages[since])
+    
+    def _json_gaze_messages(self, result: Dict) -> List[Message]:
+        """Gaze and dwell JSON messages of the latest result"""
+        messages = []
+        position = result.get('gaze_position')
+        if position:
+            messages.append(_dumps({
+                'type': 'gaze',
+                'position': {'x': position[0], 'y': position[1]}
+            }))
+        
+        if result.get('dwell_progress', 0) > 0:
+            messages.append(_dumps({
+                'type': 'dwell',
+                'progress': result['dwell_progress'],
+                'position': {'x': position[0], 'y': position[1]} if position else None
+            }))
+        return messages
+    
+    def _click_messages(self, pending: List[VisionResult]) -> List[Message]:
+        """Click messages of every result of the tick, not only the latest one"""
+        messages = []
+        for vision_result in pending:
+            clicked = vision_result.result
+            if not clicked.get('click_detected'):
+                continue
+            clicked_device = clicked.get('clicked_device')
+            messages.append(_dumps({
+                'type': 'click',
+                'method': clicked.get('click_method'),
+                'device_id': clicked_device['device_id'] if clicked_device else None,
+                'device_name': clicked_device.get('device_id') if clicked_device else None,
+                'position': clicked_device.get('position') if clicked_device else None
+            }))
+        return messages
+    
+    def get_stats(self) -> Dict:
+        """Get tick counters and the counters of each client"""
+        return {
+            'running': self._task is not None,
+            'ticks': self.ticks,
+            'results_broadcast': self.results_broadcast,
+            'clients': [subscriber.get_stats() for subscriber in self._subscribers]
+        }
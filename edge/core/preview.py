@@ -0,0 +1,168 @@
+"""
+Preview Encoder
+Encodes the annotated camera preview once per frame and shares the JPEG
+bytes with every /video_feed viewer
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, Optional
+
+import cv2
+
+from .vision import VisionResult, VisionWorker
+
+logger = logging.getLogger(__name__)
+
+
+class PreviewEncoder:
+    """
+    Encodes vision results to MJPEG parts while at least one viewer is
+    connected. Each frame is encoded at most once, at most max_fps times per
+    second, and the same bytes are sent to every viewer.
+    """
+
+    def __init__(self, vision_worker: VisionWorker, quality: int = 80,
+                 width: int = 0, max_fps: float = 15.0):
+        self.vision_worker = vision_worker
+        self.quality = quality  # JPEG quality (0-100)
+        self.width = width      # Preview width in pixels, 0 keeps the camera width
+        self.max_fps = max_fps  # Maximum encoded frames per second, 0 for no limit
+
+        self.part: Optional[bytes] = None  # Last encoded multipart part
+        self.version = 0                   # Incremented on each encoded frame
+
+        self.frames_encoded = 0
+        self.frames_skipped = 0
+        self.encode_time = 0.0  # Average encode time (seconds)
+
+        self.viewers = 0
+        self._new_part = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._sent: deque = deque()  # (time, bytes) of the parts sent in the last seconds
+
+    def _encode(self, vision_result: VisionResult) -> Optional[bytes]:
+        """Draw the gaze overlay on a copy of the frame, resized, and encode it to a JPEG part"""
+        frame = vision_result.frame
+        scale = 1.0
+        if self.width and frame.shape[1] != self.width:
+            scale = self.width / frame.shape[1]
+            frame = cv2.resize(frame, (self.width, int(frame.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+        else:
+            frame = frame.copy()
+
+        if not self.vision_worker.is_frame_valid(vision_result):
+            # The camera overwrote the frame while it was copied
+            return None
+
+        result = vision_result.result
+
+        # Draw gaze pointer
+        if result.get('gaze_position'):
+            x, y = result['gaze_position']
+            center = (int(x * scale), int(y * scale))
+            cv2.circle(frame, center, 15, (0, 255, 0), 2)
+
+            # Draw dwell progress
+            if result.get('dwell_progress', 0) > 0:
+                radius = int(15 + 20 * result['dwell_progress'])
+                cv2.circle(frame, center, radius, (255, 0, 0), 2)
+
+        ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ret:
+            return None
+
+        return (b'--frame\r\n'
+                b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+
+    async def _run(self):
+        """Encode the latest vision results while there are viewers"""
+        loop = asyncio.get_running_loop()
+        # Only the latest result matters for the preview
+        results = self.vision_worker.subscribe(maxsize=1)
+        last_encode = 0.0
+
+        try:
+            while True:
+                vision_result = await results.get()
+
+                now = time.time()
+                if self.max_fps and now - last_encode < 1.0 / self.max_fps:
+                    self.frames_skipped += 1
+                    continue
+                last_encode = now
+
+                # Encoding is CPU bound, keep it off the event loop
+                started = time.perf_counter()
+                part = await loop.run_in_executor(None, self._encode, vision_result)
+                self.encode_time += 0.1 * ((time.perf_counter() - started) - self.encode_time)
+                if part is None:
+                    continue
+
+                self.part = part
+                self.version += 1
+                self.frames_encoded += 1
+
+                # Wake up the viewers waiting for this part
+                self._new_part.set()
+                self._new_part = asyncio.Event()
+        finally:
+            self.vision_worker.unsubscribe(results)
+
+    def _add_viewer(self):
+        """Register a viewer, encoding starts with the first one"""
+        self.viewers += 1
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info("Preview encoding started")
+
+    def _remove_viewer(self):
+        """Unregister a viewer, encoding stops with the last one"""
+        self.viewers -= 1
+        if self.viewers == 0 and self._task is not None:
+            self._task.cancel()
+            self._task = None
+            self.part = None
+            logger.info("Preview encoding stopped, no viewer left")
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        """Yield the multipart parts of the preview for one viewer"""
+        self._add_viewer()
+        try:
+            version = self.version
+            while True:
+                if self.version == version:
+                    await self._new_part.wait()
+                if self.part is None:
+                    continue
+
+                version = self.version
+                part = self.part
+                self._count_sent(len(part))
+                yield part
+        finally:
+            self._remove_viewer()
+
+    def _count_sent(self, size: int):
+        """Record bytes sent to a viewer"""
+        now = time.time()
+        self._sent.append((now, size))
+        while self._sent and self._sent[0][0] < now - 2.0:
+            self._sent.popleft()
+
+    def get_stats(self) -> Dict:
+        """Get encoding counters, encode time and bytes sent per second"""
+        now = time.time()
+        sent = sum(size for timestamp, size in self._sent if timestamp >= now - 2.0)
+        return {
+            'viewers': self.viewers,
+            'encoding': self._task is not None,
+            'quality': self.quality,
+            'width': self.width,
+            'max_fps': self.max_fps,
+            'frames_encoded': self.frames_encoded,
+            'frames_skipped': self.frames_skipped,
+            'encode_ms': self.encode_time * 1000,
+            'bytes_per_second': sent / 2.0
+        }
@@ -0,0 +1,85 @@
+"""
+Binary Gaze Protocol
+Fixed-layout encoding of the gaze samples sent over the /ws WebSocket when
+the client asks for the binary subprotocol
+"""
+import struct
+from typing import Dict, List, Sequence
+
+from .vision import VisionResult
+
+# WebSocket subprotocol selecting the binary gaze stream
+GAZE_SUBPROTOCOL = 'gazehome.gaze.v1'
+
+# Message: header followed by count samples, little endian
+#   header: message type (u8), protocol version (u8), sample count (u16)
+#   sample: timestamp (f64, seconds), gaze x (i16), gaze y (i16),
+#           dwell progress (u16, 0-65535), flags (u8), padding
+HEADER = struct.Struct('<BBH')
+SAMPLE = struct.Struct('<dhhHBx')
+
+MESSAGE_GAZE_BATCH = 1
+PROTOCOL_VERSION = 1
+
+FLAG_GAZE = 0x01       # Gaze position is valid
+FLAG_BLINKING = 0x02   # Eyes closed
+FLAG_PREDICTED = 0x04  # Position predicted by the gaze filter, frame not analyzed
+FLAG_CLICK = 0x08      # A click was detected on this frame
+
+
+def sample_flags(result: Dict) -> int:
+    """Get the flags of a GazeTracker.update result"""
+    flags = 0
+    if result.get('gaze_position'):
+        flags |= FLAG_GAZE
+    if result.get('blinking'):
+        flags |= FLAG_BLINKING
+    if result.get('predicted'):
+        flags |= FLAG_PREDICTED
+    if result.get('click_detected'):
+        flags |= FLAG_CLICK
+    return flags
+
+
+def encode_gaze_batch(vision_results: Sequence[VisionResult]) -> bytes:
+    """
+    Pack the gaze samples of one tick into a single binary message
+
+    Args:
+        vision_results: Results published since the previous tick, oldest first
+
+    Returns:
+        The message bytes
+    """
+    buffer = bytearray(HEADER.size + SAMPLE.size * len(vision_results))
+    HEADER.pack_into(buffer, 0, MESSAGE_GAZE_BATCH, PROTOCOL_VERSION, len(vision_results))
+
+    offset = HEADER.size
+    for vision_result in vision_results:
+        result = vision_result.result
+        x, y = result.get('gaze_position') or (0, 0)
+        dwell = min(max(result.get('dwell_progress', 0.0), 0.0), 1.0)
+        SAMPLE.pack_into(buffer, offset, vision_result.timestamp, x, y,
+                         int(dwell * 65535), sample_flags(result))
+        offset += SAMPLE.size
+
+    return bytes(buffer)
+
+
+def decode_gaze_batch(message: bytes) -> List[Dict]:
+    """Unpack a gaze batch message, the inverse of encode_gaze_batch"""
+    message_type, version, count = HEADER.unpack_from(message, 0)
+    if message_type != MESSAGE_GAZE_BATCH or version != PROTOCOL_VERSION:
+        raise ValueError(f"Unsupported gaze message type {message_type} version {version}")
+
+    samples = []
+    for timestamp, x, y, dwell, flags in SAMPLE.iter_unpack(message[HEADER.size:HEADER.size + count * SAMPLE.size]):
+        samples.append({
+            'timestamp': timestamp,
+            'gaze_position': (x, y) if flags & FLAG_GAZE else None,
+            'dwell_progress': dwell / 65535,
+            'blinking': bool(flags & FLAG_BLINKING),
+            'predicted': bool(flags & FLAG_PREDICTED),
+            'click_detected': bool(flags & FLAG_CLICK)
+        })
+    return samples
@@ -0,0 +1,172 @@
+"""
+State Store
+Versioned application state synchronized to the web clients with a
+snapshot followed by JSON-patch-style deltas
+"""
+import copy
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _escape(key: str) -> str:
+    """Escape a key for a JSON pointer"""
+    return str(key).replace('~', '~0').replace('/', '~1')
+
+
+def diff(old: Any, new: Any, path: str = '') -> List[Dict]:
+    """
+    Compute the operations turning old into new
+    
+    Dicts are compared key by key and lists item by item, anything else is
+    replaced as a whole.
+    
+    Args:
+        old: Previous value
+        new: New value
+        path: JSON pointer of the values
+    
+    Returns:
+        List of {'op': 'add' | 'remove' | 'replace', 'path': ..., 'value': ...}
+    """
+    if old == new:
+        return []
+    
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({'op': 'remove', 'path': f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            child = f"{path}/{_escape(key)}"
+            if key not in old:
+                ops.append({'op': 'add', 'path': child, 'value': value})
+            else:
+                ops.extend(diff(old[key], value, child))
+        return ops
+    
+    if isinstance(old, list) and isinstance(new, list):
+        ops = []
+        common = min(len(old), len(new))
+        for index in range(common):
+            ops.extend(diff(old[index], new[index], f"{path}/{index}"))
+        for index in range(common, len(new)):
+            ops.append({'op': 'add', 'path': f"{path}/{index}", 'value': new[index]})
+        # Remove from the end so that the indexes stay valid
+        for index in range(len(old) - 1, common - 1, -1):
+            ops.append({'op': 'remove', 'path': f"{path}/{index}"})
+        return ops
+    
+    return [{'op': 'replace', 'path': path, 'value': new}]
+
+
+class StateStore:
+    """
+    Application state with a version incremented on every change. The
+    operations of the last changes are kept so that a client can be brought
+    up to date with deltas instead of a new snapshot.
+    """
+    
+    def __init__(self, history: int = 100):
+        self.state: Dict[str, Any] = {}
+        self.version = 0
+        self._history: deque = deque(maxlen=history)  # (version, ops)
+    
+    def update(self, **values) -> bool:
+        """
+        Set top-level values of the state
+        
+        Returns:
+            True if something changed and a new version was created
+        """
+        ops = []
+        for key, value in values.items():
+            value = copy.deepcopy(value)
+            if key not in self.state:
+                ops.append({'op': 'add', 'path': f"/{_escape(key)}", 'value': value})
+            else:
+                ops.extend(diff(self.state[key], value, f"/{_escape(key)}"))
+            self.state[key] = value
+        
+        if not ops:
+            return False
+        
+        self.version += 1
+        self._history.append((self.version, ops))
+        return True
+    
+    def snapshot(self) -> Dict:
+        """Get the whole state message"""
+        return {'type': 'snapshot', 'version': self.version, 'state': copy.deepcopy(self.state)}
+    
+    def delta(self, since: int) -> Optional[Dict]:
+        """
+        Get the delta message bringing a client from a version to the current one
+        
+        Returns:
+            The delta, or None if the history doesn't go back that far
+        """
+        if since == self.version:
+            return {'type': 'delta', 'from': since, 'version': self.version, 'ops': []}
+        if since > self.version or not self._history or self._history[0][0] > since + 1:
+            return None
+        
+        ops = []
+        for version, version_ops in self._history:
+            if version > since:
+                ops.extend(version_ops)
+        return {'type': 'delta', 'from': since, 'version': self.version, 'ops': ops}
+
+
+class StateSubscription:
+    """Synchronization state of one client"""
+    
+    def __init__(self, store: StateStore, max_unacked: int = 50):
+        self.store = store
+        self.max_unacked = max_unacked  # Versions sent without ack before a snapshot is forced
+        self.sent_version: Optional[int] = None
+        self.acked_version: Optional[int] = None
+        self.needs_snapshot = True
+        
+        self.snapshots_sent = 0
+        self.deltas_sent = 0
+    
+    def ack(self, version: int):
+        """Record the version the client has applied"""
+        self.acked_version = version
+    
+    def resync(self):
+        """Send a snapshot next, the client lost track of the versions"""
+        self.needs_snapshot = True
+    
+    def next_message(self) -> Optional[Dict]:
+        """Get the message to send to the client, None if it's up to date"""
+        store = self.store
+        if not self.needs_snapshot and self.sent_version == store.version:
+            return None
+        
+        unacked = self.sent_version - (self.acked_version or 0) if self.sent_version is not None else 0
+        message = None
+        if not self.needs_snapshot and unacked <= self.max_unacked:
+            message = store.delta(self.sent_version)
+        
+        if message is None:
+            message = store.snapshot()
+            self.needs_snapshot = False
+            self.snapshots_sent += 1
+        else:
+            self.deltas_sent += 1
+        
+        self.sent_version = store.version
+        return message
+    
+    def get_stats(self) -> Dict:
+        """Get versions and message counters"""
+        return {
+            'sent_version': self.sent_version,
+            'acked_version': self.acked_version,
+            'snapshots_sent': self.snapshots_sent,
+            'deltas_sent': self.deltas_sent
+        }
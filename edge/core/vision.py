@@ -0,0 +1,140 @@
+"""
+Vision Worker
+Runs gaze tracking on a dedicated thread, off the asyncio event loop, and
+publishes the results to asyncio consumers
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, NamedTuple, Optional, Set
+
+import numpy as np
+
+from .camera import CameraProducer
+
+if TYPE_CHECKING:
+    from gaze.tracker import GazeTracker
+
+logger = logging.getLogger(__name__)
+
+
+class VisionResult(NamedTuple):
+    """Gaze tracking result of one camera frame"""
+    sequence: int       # Sequence of the frame in the camera ring buffer
+    timestamp: float    # Capture time of the frame
+    frame: np.ndarray   # View of the ring buffer slot, valid while the sequence is
+    result: Dict        # Result of GazeTracker.update
+
+
+class VisionWorker:
+    """
+    Thread owning the camera producer and the gaze tracker. Every captured
+    frame is analyzed once, and the result is pushed to the asyncio queue
+    of each subscriber from the event loop thread.
+    """
+    
+    def __init__(self, producer: CameraProducer, gaze_tracker: 'GazeTracker'):
+        self.producer = producer
+        self.gaze_tracker = gaze_tracker
+        self.latest: Optional[VisionResult] = None
+        
+        self.frames_processed = 0
+        self.results_dropped = 0
+        self.processing_time = 0.0  # Average GazeTracker.update time (seconds)
+        
+        self._queues: Set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+    
+    @property
+    def is_running(self) -> bool:
+        """True while frames are captured and analyzed"""
+        return self._running and self.producer.is_running
+    
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Start the camera and the vision thread, results are delivered on loop"""
+        self._loop = loop
+        self.producer.start()
+        
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="vision", daemon=True)
+        self._thread.start()
+        logger.info("Vision worker started")
+    
+    def stop(self):
+        """Stop the vision thread and the camera"""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        self.producer.stop()
+        self.gaze_tracker.close()
+    
+    def _run(self):
+        """Vision loop: wait for a frame, analyze it, publish the result"""
+        subscriber = self.producer.subscribe('vision')
+        try:
+            while self._running:
+                item = subscriber.read(timeout=0.5)
+                if item is None:
+                    continue
+                
+                sequence, frame, timestamp = item
+                started = time.perf_counter()
+                try:
+                    # The camera may wrap around the ring during a slow analysis, and the
+                    # tracker keeps the frame after it: analyze a copy, the result keeps the view
+                    result = self.gaze_tracker.update(frame.copy())
+                except Exception as e:
+                    logger.error(f"Gaze tracking failed on frame {sequence}: {e}", exc_info=True)
+                    continue
+                
+                self.processing_time += 0.1 * ((time.perf_counter() - started) - self.processing_time)
+                self.frames_processed += 1
+                
+                vision_result = VisionResult(sequence, timestamp, frame, result)
+                self.latest = vision_result
+                if self._loop is not None and not self._loop.is_closed():
+                    self._loop.call_soon_threadsafe(self._publish, vision_result)
+        finally:
+            self.producer.unsubscribe(subscriber)
+    
+    def _publish(self, vision_result: VisionResult):
+        """Push a result to every subscriber, runs on the event loop"""
+        for queue in self._queues:
+            if queue.full():
+                # Slow consumer: drop its oldest result
+                queue.get_nowait()
+                self.results_dropped += 1
+            queue.put_nowait(vision_result)
+    
+    def subscribe(self, maxsize: int = 8) -> asyncio.Queue:
+        """Get a queue receiving every new result, to be called from the event loop"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._queues.add(queue)
+        return queue
+    
+    def unsubscribe(self, queue: asyncio.Queue):
+        """Stop delivering results to a queue"""
+        self._queues.discard(queue)
+    
+    def is_frame_valid(self, vision_result: VisionResult) -> bool:
+        """Check that the frame of a result hasn't been overwritten by the camera yet"""
+        return self.producer.ring.is_valid(vision_result.sequence)
+    
+    def get_camera_stats(self) -> Dict:
+        """Get capture counters"""
+        return self.producer.get_stats()
+    
+    def get_stats(self) -> Dict:
+        """Get vision thread counters"""
+        return {
+            'running': self._running,
+            'mode': 'thread',
+            'frames_processed': self.frames_processed,
+            'processing_ms': self.processing_time * 1000,
+            'subscribers': len(self._queues),
+            'results_dropped': self.results_dropped
+        }
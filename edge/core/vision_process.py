@@ -0,0 +1,623 @@
+"""
+Vision Process
+Runs capture and gaze tracking in a child process, so that dlib and OpenCV
+don't compete with the web server for the GIL. Frames and compact gaze
+records are shared through multiprocessing.shared_memory ring buffers.
+"""
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .camera import CameraProducer, FrameRingBuffer
+from .vision import VisionResult, VisionWorker
+
+logger = logging.getLogger(__name__)
+
+CLICK_METHODS = (None, 'dwell', 'blink')
+
+# One record per ring slot: header of the frame it holds, then the gaze
+# result of that frame once it's analyzed
+RECORD_DTYPE = np.dtype([
+    ('frame_sequence', 'i8'),
+    ('timestamp', 'f8'),
+    ('result_sequence', 'i8'),
+    ('has_gaze', '?'),
+    ('gaze_x', 'i4'),
+    ('gaze_y', 'i4'),
+    ('h_ratio', 'f4'),
+    ('v_ratio', 'f4'),
+    ('dwell_progress', 'f4'),
+    ('pupils_detected', '?'),
+    ('predicted', '?'),
+    ('blinking', '?'),
+    ('dwell_target', 'S64'),
+    ('click_method', 'u1'),
+    ('click_x', 'i4'),
+    ('click_y', 'i4'),
+    ('device_id', 'S64'),
+    ('action', 'S32'),
+])
+
+
+def encode_result(record: np.ndarray, sequence: int, result: Dict):
+    """Write a GazeTracker.update result into a shared record"""
+    position = result.get('gaze_position')
+    ratios = result.get('raw_ratios')
+    clicked = result.get('clicked_device') or {}
+    click_position = clicked.get('position') or (0, 0)
+    
+    record['has_gaze'] = position is not None
+    record['gaze_x'], record['gaze_y'] = position or (0, 0)
+    record['h_ratio'], record['v_ratio'] = ratios or (np.nan, np.nan)
+    record['dwell_progress'] = result.get('dwell_progress', 0.0)
+    record['pupils_detected'] = bool(result.get('pupils_detected'))
+    record['predicted'] = bool(result.get('predicted'))
+    record['blinking'] = bool(result.get('blinking'))
+    record['dwell_target'] = (result.get('dwell_target') or '').encode()[:64]
+    record['click_method'] = CLICK_METHODS.index(result.get('click_method')) if result.get('click_detected') else 0
+    record['click_x'], record['click_y'] = click_position
+    record['device_id'] = clicked.get('device_id', '').encode()[:64]
+    record['action'] = clicked.get('action', '').encode()[:32]
+    # Written last: the record is complete once the sequence matches
+    record['result_sequence'] = sequence
+
+
+def decode_result(record: np.ndarray) -> Dict:
+    """Rebuild a GazeTracker.update result from a shared record"""
+    click_method = CLICK_METHODS[record['click_method']]
+    device_id = record['device_id'].decode()
+    position = (int(record['gaze_x']), int(record['gaze_y'])) if record['has_gaze'] else None
+    ratios = None if np.isnan(record['h_ratio']) else (float(record['h_ratio']), float(record['v_ratio']))
+    
+    clicked_device = None
+    if click_method and device_id:
+        clicked_device = {
+            'device_id': device_id,
+            'action': record['action'].decode(),
+            'position': (int(record['click_x']), int(record['click_y'])),
+            'method': click_method
+        }
+    
+    return {
+        'gaze_position': position,
+        'raw_ratios': ratios if position else None,
+        'click_detected': click_method is not None,
+        'clicked_device': clicked_device,
+        'dwell_progress': float(record['dwell_progress']),
+        'pupils_detected': bool(record['pupils_detected']),
+        'click_method': click_method,
+        'sample': None,
+        'predicted': bool(record['predicted']),
+        'blinking': bool(record['blinking']),
+        'dwell_target': record['dwell_target'].decode() or None
+    }
+
+
+class SharedFrameRing(FrameRingBuffer):
+    """FrameRingBuffer whose slots and headers live in shared memory"""
+    
+    def __init__(self, frames: np.ndarray, records: np.ndarray):
+        super().__init__(len(frames))
+        self.frames = list(frames)
+        self.records = records
+    
+    def next_slot(self) -> np.ndarray:
+        """Get the shared slot of the next frame, invalidating the frame it held"""
+        self.records[(self.sequence + 1) % self.size]['frame_sequence'] = -1
+        return super().next_slot()
+    
+    def commit(self, frame: np.ndarray, timestamp: float) -> int:
+        """Publish the next frame, copied into its shared slot if it was read elsewhere"""
+        index = (self.sequence + 1) % self.size
+        slot = self.frames[index]
+        if frame is not slot:
+            if frame.shape == slot.shape:
+                np.copyto(slot, frame)
+            else:
+                cv2.resize(frame, (slot.shape[1], slot.shape[0]), dst=slot)
+        
+        sequence = super().commit(slot, timestamp)
+        self.records[index]['timestamp'] = timestamp
+        self.records[index]['frame_sequence'] = sequence
+        return sequence
+
+
+def _status(gaze_tracker, producer: CameraProducer, processing_time: float, frames_processed: int,
+            model_stats: Dict) -> Dict:
+    """Status of the vision process sent to the web process"""
+    return {
+        'calibrated': gaze_tracker.is_calibrated(),
+        'pipeline': gaze_tracker.get_pipeline_stats(),
+        'quality': gaze_tracker.get_quality_state(),
+        'face_tracking': gaze_tracker.get_face_tracking_stats(),
+        'camera': producer.get_stats(),
+        'processing_ms': processing_time * 1000,
+        'frames_processed': frames_processed,
+        'models': model_stats
+    }
+
+
+def vision_process_main(conn, camera_index: int, tracker_options: Dict, ring_size: int):
+    """
+    Entry point of the vision process: owns the camera and the GazeTracker
+    
+    Args:
+        conn: Pipe to the web process, carries commands, results and status
+        camera_index: Camera device index
+        tracker_options: GazeTracker keyword arguments
+        ring_size: Number of frames of the shared ring buffer
+    """
+    from gaze.tracker import GazeTracker
+    from gaze_tracking.models import registry as model_registry
+    
+    capture = cv2.VideoCapture(camera_index)
+    ret, frame = capture.read()
+    if not ret:
+        conn.send(('error', f"Failed to read from camera {camera_index}"))
+        capture.release()
+        return
+    
+    # Segments are unlinked by the web process, which outlives this one
+    frames_memory = shared_memory.SharedMemory(create=True, size=ring_size * frame.nbytes)
+    records_memory = shared_memory.SharedMemory(create=True, size=ring_size * RECORD_DTYPE.itemsize)
+    frames = np.ndarray((ring_size,) + frame.shape, frame.dtype, buffer=frames_memory.buf)
+    records = np.ndarray((ring_size,), RECORD_DTYPE, buffer=records_memory.buf)
+    records['frame_sequence'] = -1
+    records['result_sequence'] = -1
+    
+    producer = CameraProducer(capture, ring=SharedFrameRing(frames, records))
+    conn.send(('ready', {
+        'frames': frames_memory.name,
+        'records': records_memory.name,
+        'shape': frame.shape,
+        'dtype': frame.dtype.str,
+        'slots': ring_size
+    }))
+    
+    gaze_tracker = GazeTracker(**tracker_options)
+    model_registry.preload()
+    producer.start()
+    
+    subscriber = producer.subscribe('vision')
+    item = None
+    processing_time = 0.0
+    frames_processed = 0
+    last_status = 0.0
+    
+    try:
+        while True:
+            # Commands of the web process run between two frames
+            while conn.poll():
+                message = conn.recv()
+                if message[0] == 'stop':
+                    return
+                _, call_id, method, args = message
+                try:
+                    value = getattr(gaze_tracker, method)(*args)
+                except Exception as e:
+                    logger.error(f"Vision process command {method} failed: {e}")
+                    value = None
+                if call_id is not None:
+                    conn.send(('reply', call_id, value))
+            
+            now = time.time()
+            if now - last_status >= 1.0:
+                conn.send(('status', _status(gaze_tracker, producer, processing_time, frames_processed,
+                                             model_registry.stats())))
+                last_status = now
+            
+            item = subscriber.read(timeout=0.2)
+            if item is None:
+                continue
+            
+            sequence, frame, _ = item
+            started = time.perf_counter()
+            # The camera may overwrite the shared slot during the analysis, see VisionWorker
+            result = gaze_tracker.update(frame.copy())
+            processing_time += 0.1 * ((time.perf_counter() - started) - processing_time)
+            frames_processed += 1
+            
+            encode_result(records[sequence % ring_size], sequence, result)
+            conn.send(('result', sequence))
+    except (EOFError, BrokenPipeError, KeyboardInterrupt):
+        pass
+    finally:
+        producer.stop()
+        gaze_tracker.close()
+        # Every view of the shared buffers must be gone before unmapping them
+        del subscriber, producer, item, frame, frames, records
+        frames_memory.close()
+        records_memory.close()
+
+
+class RemoteGazeTracker:
+    """
+    Stands in for the GazeTracker of the vision process in the web process.
+    Settings are forwarded as commands and replayed when the process
+    restarts, queries are answered from the last status or by a call.
+    """
+    
+    def __init__(self, worker: 'VisionProcess'):
+        self._worker = worker
+        self._aois: List[Tuple] = []
+        self._settings: Dict[str, Any] = {}
+        self._calibration_file = None
+        self._pupil_thresholds: Optional[Tuple] = None
+        self.pupil_thresholds_loaded: Optional[bool] = None  # Result of the last load in the vision process
+    
+    @property
+    def status(self) -> Dict:
+        """Last status sent by the vision process"""
+        return self._worker.status
+    
+    def replay(self):
+        """Send the settings again to a restarted vision process"""
+        send = self._worker.send
+        send('clear_aois')
+        for aoi in self._aois:
+            send('add_aoi', *aoi)
+        for method, args in self._settings.items():
+            send(method, *args)
+        if self._calibration_file is not None:
+            send('load_calibration', self._calibration_file)
+        if self._pupil_thresholds is not None:
+            # Called from the relay thread, which handles the reply: don't wait for it
+            self._worker.submit('load_pupil_thresholds', *self._pupil_thresholds).add_done_callback(
+                self._on_pupil_thresholds_loaded)
+    
+    def _on_pupil_thresholds_loaded(self, future: Future):
+        """Record whether the vision process loaded the pupil thresholds"""
+        self.pupil_thresholds_loaded = bool(future.result())
+        if not self.pupil_thresholds_loaded:
+            logger.info("No saved pupil thresholds loaded by the vision process")
+    
+    def add_aoi(self, x: int, y: int, width: int, height: int, device_id: str, action: str = "toggle"):
+        """Add an Area of Interest for device mapping"""
+        self._aois.append((x, y, width, height, device_id, action))
+        self._worker.send('add_aoi', x, y, width, height, device_id, action)
+    
+    def clear_aois(self):
+        """Clear all AOIs"""
+        self._aois.clear()
+        self._worker.send('clear_aois')
+    
+    def set_dwell_time(self, dwell_time: float):
+        """Change the dwell time of dwell clicks"""
+        self._settings['set_dwell_time'] = (dwell_time,)
+        self._worker.send('set_dwell_time', dwell_time)
+    
+    def set_click_mode(self, click_mode: str):
+        """Change the click mode ('dwell', 'blink' or 'both')"""
+        self._settings['set_click_mode'] = (click_mode,)
+        self._worker.send('set_click_mode', click_mode)
+    
+    def load_pupil_thresholds(self, filepath, user_id: str) -> Optional[bool]:
+        """
+        Load the pupil thresholds saved for a user, now and after every restart
+        
+        Returns:
+            True if the vision process loaded them, None if it isn't running
+            yet: they are loaded when it starts, see pupil_thresholds_loaded
+        """
+        self._pupil_thresholds = (filepath, user_id)
+        if not self._worker.is_running:
+            return None
+        self.pupil_thresholds_loaded = bool(self._worker.call('load_pupil_thresholds', filepath, user_id))
+        return self.pupil_thresholds_loaded
+    
+    def save_pupil_thresholds(self, filepath, user_id: str):
+        """Save the pupil thresholds of a user"""
+        self._worker.call('save_pupil_thresholds', filepath, user_id)
+    
+    def load_calibration(self, filepath) -> bool:
+        """Load calibration from file"""
+        self._calibration_file = filepath
+        return bool(self._worker.call('load_calibration', filepath))
+    
+    def save_calibration(self, filepath):
+        """Save calibration to file, it's loaded again after a restart"""
+        self._calibration_file = filepath
+        self._worker.call('save_calibration', filepath)
+    
+    def start_calibration(self):
+        """Start calibration process"""
+        self._calibration_file = None
+        self._worker.send('start_calibration')
+    
+    def add_calibration_sample(self) -> bool:
+        """Add calibration sample for current target"""
+        return bool(self._worker.call('add_calibration_sample'))
+    
+    def next_calibration_target(self) -> bool:
+        """Move to next calibration target"""
+        return bool(self._worker.call('next_calibration_target'))
+    
+    def get_calibration_progress(self) -> Dict:
+        """Get calibration progress"""
+        return self._worker.call('get_calibration_progress') or {}
+    
+    def is_calibrated(self) -> bool:
+        """Check if calibration is complete"""
+        return self.status.get('calibrated', False)
+    
+    def get_pipeline_stats(self) -> Optional[Dict]:
+        """Get effective analysis rate and gaze filter state"""
+        return self.status.get('pipeline')
+    
+    def get_quality_state(self) -> Optional[Dict]:
+        """Get latency governor level and transitions"""
+        return self.status.get('quality')
+    
+    def get_face_tracking_stats(self) -> Dict:
+        """Get face detection / tracking counters"""
+        return self.status.get('face_tracking', {})
+
+
+class VisionProcess(VisionWorker):
+    """
+    Supervises the vision process: maps its shared buffers, publishes its
+    results to asyncio subscribers like VisionWorker, and restarts it when
+    it dies or stops sending anything.
+    """
+    
+    def __init__(self, camera_index: int, tracker_options: Dict, ring_size: int = 4,
+                 heartbeat_timeout: float = 5.0, startup_timeout: float = 30.0):
+        super().__init__(None, None)
+        self.camera_index = camera_index
+        self.tracker_options = tracker_options
+        self.ring_size = ring_size
+        self.heartbeat_timeout = heartbeat_timeout  # Seconds without message before a restart
+        self.startup_timeout = startup_timeout      # Seconds allowed to open the camera and load the models
+        
+        self.gaze_tracker = RemoteGazeTracker(self)
+        self.status: Dict = {}
+        self.restarts = 0
+        self.last_error: Optional[str] = None
+        
+        self._context = multiprocessing.get_context('spawn')
+        self._process = None
+        self._conn = None
+        self._send_lock = threading.Lock()
+        self._calls: Dict[int, Future] = {}
+        self._next_call_id = 0
+        
+        self._memories: List[shared_memory.SharedMemory] = []
+        self._retired: List[shared_memory.SharedMemory] = []
+        self._frames: Optional[np.ndarray] = None
+        self._records: Optional[np.ndarray] = None
+    
+    @property
+    def is_running(self) -> bool:
+        """True while the vision process analyzes frames"""
+        return self._running and self._records is not None and self._process is not None and self._process.is_alive()
+    
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Start the supervisor thread, which starts the vision process"""
+        self._loop = loop
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="vision-supervisor", daemon=True)
+        self._thread.start()
+        logger.info("Vision process supervisor started")
+    
+    def stop(self):
+        """Stop the vision process and release the shared buffers"""
+        self._running = False
+        self.send_message(('stop',))
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+    
+    def send_message(self, message: Tuple) -> bool:
+        """Send a message to the vision process, dropped if it isn't running"""
+        with self._send_lock:
+            if self._conn is None:
+                return False
+            try:
+                self._conn.send(message)
+            except (OSError, ValueError):
+                return False
+        return True
+    
+    def send(self, method: str, *args):
+        """Run a GazeTracker method in the vision process without waiting"""
+        self.send_message(('call', None, method, args))
+    
+    def submit(self, method: str, *args) -> Future:
+        """
+        Run a GazeTracker method in the vision process without waiting
+        
+        Returns:
+            A future set to its result by the relay thread, or to None if the
+            process isn't running or stops before answering
+        """
+        future = Future()
+        with self._send_lock:
+            call_id = self._next_call_id
+            self._next_call_id += 1
+        self._calls[call_id] = future
+        
+        if not self.send_message(('call', call_id, method, args)):
+            self._calls.pop(call_id, None)
+            future.set_result(None)
+        return future
+    
+    def call(self, method: str, *args, timeout: float = 2.0):
+        """
+        Run a GazeTracker method in the vision process and return its result,
+        None on timeout. Blocks until the process answers between two frames:
+        from the event loop, run it in an executor or await submit() instead.
+        """
+        future = self.submit(method, *args)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            # Not the builtin TimeoutError before Python 3.11
+            future.cancel()
+            return None
+    
+    def _run(self):
+        """Supervisor loop: start the process, relay its messages, restart it when unhealthy"""
+        backoff = 1.0
+        while self._running:
+            started = time.time()
+            self._spawn()
+            self._relay()
+            self._cleanup()
+            
+            if not self._running:
+                break
+            
+            self.restarts += 1
+            # Restart at once after a long run, back off when it keeps failing
+            backoff = 1.0 if time.time() - started > 60 else min(backoff * 2, 30.0)
+            logger.warning(f"Vision process restarting in {backoff:.0f}s ({self.last_error})")
+            time.sleep(backoff)
+    
+    def _spawn(self):
+        """Start a new vision process"""
+        parent_conn, child_conn = self._context.Pipe()
+        self._process = self._context.Process(
+            target=vision_process_main, name="vision",
+            args=(child_conn, self.camera_index, self.tracker_options, self.ring_size),
+            daemon=True
+        )
+        self._process.start()
+        child_conn.close()
+        with self._send_lock:
+            self._conn = parent_conn
+        logger.info(f"Vision process started (pid {self._process.pid})")
+    
+    def _relay(self):
+        """Handle the messages of the vision process until it dies or stops responding"""
+        last_message = time.time()
+        timeout = self.startup_timeout
+        
+        while True:
+            if not self._process.is_alive():
+                self.last_error = f"exited with code {self._process.exitcode}"
+                return
+            if time.time() - last_message > timeout:
+                self.last_error = f"no message for {timeout:.0f}s"
+                return
+            
+            try:
+                if not self._conn.poll(0.5):
+                    continue
+                message = self._conn.recv()
+            except (EOFError, OSError):
+                self.last_error = "pipe closed"
+                return
+            
+            last_message = time.time()
+            kind = message[0]
+            if kind == 'result':
+                self._on_result(message[1])
+            elif kind == 'status':
+                self.status = message[1]
+                timeout = self.heartbeat_timeout
+            elif kind == 'reply':
+                future = self._calls.pop(message[1], None)
+                if future is not None and not future.done():
+                    future.set_result(message[2])
+            elif kind == 'ready':
+                self._attach(message[1])
+                self.gaze_tracker.replay()
+            elif kind == 'error':
+                self.last_error = message[1]
+                logger.error(f"Vision process error: {message[1]}")
+    
+    def _attach(self, layout: Dict):
+        """Map the shared buffers created by the vision process"""
+        frames_memory = shared_memory.SharedMemory(name=layout['frames'])
+        records_memory = shared_memory.SharedMemory(name=layout['records'])
+        self._memories = [frames_memory, records_memory]
+        
+        shape = (layout['slots'],) + tuple(layout['shape'])
+        self._frames = np.ndarray(shape, np.dtype(layout['dtype']), buffer=frames_memory.buf)
+        self._records = np.ndarray((layout['slots'],), RECORD_DTYPE, buffer=records_memory.buf)
+    
+    def _on_result(self, sequence: int):
+        """Publish the result of a frame analyzed by the vision process"""
+        index = sequence % len(self._records)
+        record = self._records[index].copy()
+        if record['result_sequence'] != sequence:
+            # Already overwritten by a newer result
+            return
+        
+        self.frames_processed += 1
+        vision_result = VisionResult(sequence, float(record['timestamp']), self._frames[index], decode_result(record))
+        self.latest = vision_result
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._publish, vision_result)
+    
+    def _cleanup(self):
+        """Stop the vision process and release its shared buffers"""
+        if self._process.is_alive():
+            self._process.join(timeout=2.0)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join(timeout=2.0)
+        
+        with self._send_lock:
+            self._conn.close()
+            self._conn = None
+        for call_id in list(self._calls):
+            future = self._calls.pop(call_id, None)
+            if future is not None and not future.done():
+                future.set_result(None)
+        
+        self._frames = None
+        self._records = None
+        self.latest = None
+        for memory in self._memories:
+            try:
+                memory.unlink()
+            except FileNotFoundError:
+                pass
+        
+        # Consumers may still hold views of the frames: retry closing on the next cleanup
+        memories = self._retired + self._memories
+        self._memories = []
+        self._retired = []
+        for memory in memories:
+            try:
+                memory.close()
+            except BufferError:
+                self._retired.append(memory)
+    
+    def is_frame_valid(self, vision_result: VisionResult) -> bool:
+        """Check that the frame of a result hasn't been overwritten by the camera yet"""
+        records = self._records
+        if records is None:
+            return False
+        return int(records[vision_result.sequence % len(records)]['frame_sequence']) == vision_result.sequence
+    
+    def get_camera_stats(self) -> Dict:
+        """Get capture counters of the vision process"""
+        return self.status.get('camera', {'running': False})
+    
+    def get_model_stats(self) -> Dict:
+        """Get load time and resident memory of the models of the vision process"""
+        return self.status.get('models', {})
+    
+    def get_stats(self) -> Dict:
+        """Get vision process counters"""
+        return {
+            'running': self.is_running,
+            'mode': 'process',
+            'pid': self._process.pid if self._process is not None else None,
+            'restarts': self.restarts,
+            'last_error': self.last_error,
+            'frames_processed': self.frames_processed,
+            'processing_ms': self.status.get('processing_ms', 0.0),
+            'subscribers': len(self._queues),
+            'results_dropped': self.results_dropped
+        }
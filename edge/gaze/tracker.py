@@ -4,15 +4,20 @@ Integrates with existing gaze_tracking module and applies calibration
 """
 import sys
 import os
+import json
+import math
 import time
 import logging
+from collections import deque
+from pathlib import Path
 from typing import Optional, Tuple, Callable, Dict, List
 import numpy as np
 
 # Add parent directory to path to import gaze_tracking
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
-from gaze_tracking import GazeTracking
+from gaze_tracking import GazeTracking, GazeSample
+from gaze_tracking.preprocessing import Preprocessor
 from .calibrator import GazeCalibrator
 
 logger = logging.getLogger(__name__)
@@ -174,6 +179,293 @@ class BlinkClickDetector:
         self.is_blinking = False
 
 
+class OneEuroFilter:
+    """
+    One Euro filter for a noisy 1D signal: strong smoothing while the signal
+    is slow, little lag when it moves fast. Also keeps the filtered speed so
+    the next value can be predicted.
+    """
+    
+    def __init__(self, min_cutoff: float = 1.0, beta: float = 0.007, d_cutoff: float = 1.0):
+        self.min_cutoff = min_cutoff  # Hz, smoothing when still
+        self.beta = beta              # Cutoff increase per unit of speed
+        self.d_cutoff = d_cutoff      # Hz, smoothing of the speed
+        
+        self.value: Optional[float] = None
+        self.speed = 0.0
+        self.timestamp: Optional[float] = None
+    
+    @staticmethod
+    def _alpha(cutoff: float, dt: float) -> float:
+        """Smoothing factor of a low-pass filter with the given cutoff"""
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+    
+    def filter(self, value: float, timestamp: float) -> float:
+        """Filter a new value and return the smoothed one"""
+        if self.value is None or self.timestamp is None:
+            self.value = value
+            self.speed = 0.0
+            self.timestamp = timestamp
+            return value
+        
+        dt = timestamp - self.timestamp
+        if dt <= 0:
+            return self.value
+        
+        speed = (value - self.value) / dt
+        alpha_d = self._alpha(self.d_cutoff, dt)
+        self.speed = alpha_d * speed + (1 - alpha_d) * self.speed
+        
+        cutoff = self.min_cutoff + self.beta * abs(self.speed)
+        alpha = self._alpha(cutoff, dt)
+        self.value = alpha * value + (1 - alpha) * self.value
+        self.timestamp = timestamp
+        return self.value
+    
+    def predict(self, timestamp: float) -> Optional[float]:
+        """Extrapolate the value at the given time from the filtered speed"""
+        if self.value is None or self.timestamp is None:
+            return None
+        return self.value + self.speed * (timestamp - self.timestamp)
+    
+    def reset(self):
+        """Forget the signal history"""
+        self.value = None
+        self.speed = 0.0
+        self.timestamp = None
+
+
+class GazeFilter:
+    """Smooths screen gaze positions and predicts them between analyzed frames"""
+    
+    def __init__(self, screen_width: int, screen_height: int,
+                 min_cutoff: float = 1.0, beta: float = 0.007):
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.filter_x = OneEuroFilter(min_cutoff, beta)
+        self.filter_y = OneEuroFilter(min_cutoff, beta)
+    
+    @property
+    def is_ready(self) -> bool:
+        """True once a position has been filtered"""
+        return self.filter_x.value is not None
+    
+    @property
+    def speed(self) -> float:
+        """Filtered gaze speed (pixels per second)"""
+        return math.hypot(self.filter_x.speed, self.filter_y.speed)
+    
+    def _clamp(self, x: float, y: float) -> Tuple[int, int]:
+        """Round and clamp a position to the screen bounds"""
+        x = max(0, min(int(x), self.screen_width - 1))
+        y = max(0, min(int(y), self.screen_height - 1))
+        return (x, y)
+    
+    def update(self, position: Tuple[int, int], timestamp: float) -> Tuple[int, int]:
+        """Filter a measured position"""
+        x = self.filter_x.filter(position[0], timestamp)
+        y = self.filter_y.filter(position[1], timestamp)
+        return self._clamp(x, y)
+    
+    def predict(self, timestamp: float) -> Optional[Tuple[int, int]]:
+        """Predict the position at the given time without a measurement"""
+        if not self.is_ready:
+            return None
+        return self._clamp(self.filter_x.predict(timestamp), self.filter_y.predict(timestamp))
+    
+    def reset(self):
+        """Forget the gaze history"""
+        self.filter_x.reset()
+        self.filter_y.reset()
+
+
+class AdaptiveFrameSkipper:
+    """
+    Decides which frames go through the full gaze pipeline. While the gaze
+    is stable only every max_interval-th frame is analyzed and the others
+    use the filter prediction; during saccades every frame is analyzed.
+    """
+    
+    def __init__(self, max_interval: int = 1, saccade_speed: float = 600.0, window: float = 2.0):
+        self.max_interval = max_interval    # Analyze at least every max_interval frames
+        self.saccade_speed = saccade_speed  # pixels/s above which every frame is analyzed
+        self.window = window                # seconds used to measure the rates
+        
+        self.interval = 1
+        self._frames_since_analysis = 0
+        self._ticks: deque = deque()
+    
+    def should_analyze(self, gaze_filter: GazeFilter) -> bool:
+        """Return True if the next frame must be analyzed"""
+        if self.max_interval <= 1 or not gaze_filter.is_ready or gaze_filter.speed > self.saccade_speed:
+            self.interval = 1
+        else:
+            self.interval = self.max_interval
+        
+        return self._frames_since_analysis + 1 >= self.interval
+    
+    def record(self, analyzed: bool, timestamp: float):
+        """Record whether a frame was analyzed or predicted"""
+        self._frames_since_analysis = 0 if analyzed else self._frames_since_analysis + 1
+        
+        self._ticks.append((timestamp, analyzed))
+        while self._ticks and self._ticks[0][0] < timestamp - self.window:
+            self._ticks.popleft()
+    
+    def reset(self):
+        """Analyze the next frame"""
+        self.interval = 1
+        self._frames_since_analysis = 0
+    
+    def get_stats(self) -> Dict:
+        """Get input and effective analysis rates (frames per second)"""
+        if len(self._ticks) < 2:
+            span = 0.0
+        else:
+            span = self._ticks[-1][0] - self._ticks[0][0]
+        
+        frames = len(self._ticks)
+        analyzed = sum(1 for _, was_analyzed in self._ticks if was_analyzed)
+        return {
+            'input_fps': frames / span if span > 0 else 0.0,
+            'analysis_fps': analyzed / span if span > 0 else 0.0,
+            'analysis_ratio': analyzed / frames if frames else 1.0,
+            'frame_interval': self.interval,
+            'max_frame_interval': self.max_interval
+        }
+
+
+class LatencyGovernor:
+    """
+    Keeps the gaze pipeline within a per-frame latency budget. The average
+    update latency is compared to the budget: above it the pipeline steps
+    down one quality level, well below it for a while it steps back up.
+    """
+    
+    # Each step makes the previous level cheaper. Numeric settings are only
+    # raised, the bilateral filter is replaced by the cheaper gaussian one.
+    QUALITY_STEPS = [
+        {'detection_scale': 2},
+        {'preprocessing': 'gaussian'},
+        {'max_frame_interval': 2},
+        {'detection_scale': 4, 'max_frame_interval': 3},
+    ]
+    
+    def __init__(self, base_level: Dict, frame_budget: Optional[float] = None,
+                 headroom: float = 0.6, cooldown: float = 2.0, smoothing: float = 0.1):
+        self.frame_budget = frame_budget  # seconds, None disables the governor
+        self.headroom = headroom          # Step up below headroom * frame_budget
+        self.cooldown = cooldown          # Minimum seconds between two transitions
+        self.smoothing = smoothing        # Weight of the last frame in the averages
+        
+        self.levels = self.build_levels(base_level)
+        self.level = 0
+        
+        self.latency: Optional[float] = None
+        self.stages: Dict[str, float] = {}
+        self.transitions: deque = deque(maxlen=20)
+        self._last_transition = 0.0
+        
+        self.frames_analyzed = 0  # Updates averaged
+        self.frames_skipped = 0   # Predicted updates left out of the averages
+    
+    @classmethod
+    def build_levels(cls, base_level: Dict) -> List[Dict]:
+        """Build the quality levels, from the configured settings to the cheapest"""
+        levels = [dict(base_level)]
+        for step in cls.QUALITY_STEPS:
+            level = dict(levels[-1])
+            for key, value in step.items():
+                if key == 'preprocessing':
+                    if level[key] == 'bilateral':
+                        level[key] = value
+                else:
+                    level[key] = max(level[key], value)
+            if level != levels[-1]:
+                levels.append(level)
+        return levels
+    
+    @property
+    def enabled(self) -> bool:
+        """True if a frame budget is set"""
+        return self.frame_budget is not None and self.frame_budget > 0
+    
+    @property
+    def settings(self) -> Dict:
+        """Pipeline settings of the current level"""
+        return self.levels[self.level]
+    
+    def record(self, stages: Dict[str, float], timestamp: float, analyzed: bool = True) -> Optional[Dict]:
+        """
+        Record the stage latencies of one update
+        
+        Args:
+            stages: Seconds spent in each stage of the update
+            timestamp: Time of the update
+            analyzed: False for a frame skipped by the frame skipper. It costs
+                almost nothing and would pull the average under the budget of
+                the analyzed frames, so it's left out
+            
+        Returns:
+            The transition if the level changed, None otherwise
+        """
+        if not analyzed:
+            self.frames_skipped += 1
+            return None
+        self.frames_analyzed += 1
+        
+        for name, value in stages.items():
+            previous = self.stages.get(name)
+            self.stages[name] = value if previous is None else previous + self.smoothing * (value - previous)
+        
+        total = sum(stages.values())
+        if self.latency is None:
+            self.latency = total
+        else:
+            self.latency += self.smoothing * (total - self.latency)
+        
+        if not self.enabled or timestamp - self._last_transition < self.cooldown:
+            return None
+        
+        if self.latency > self.frame_budget and self.level < len(self.levels) - 1:
+            return self._transition(self.level + 1, 'over budget', timestamp)
+        if self.latency < self.frame_budget * self.headroom and self.level > 0:
+            return self._transition(self.level - 1, 'headroom', timestamp)
+        return None
+    
+    def _transition(self, level: int, reason: str, timestamp: float) -> Dict:
+        """Move to another level and record the transition"""
+        transition = {
+            'timestamp': timestamp,
+            'from_level': self.level,
+            'to_level': level,
+            'reason': reason,
+            'latency_ms': self.latency * 1000
+        }
+        self.level = level
+        self._last_transition = timestamp
+        self.transitions.append(transition)
+        logger.info(f"Quality level {transition['from_level']} -> {level} ({reason}, "
+                    f"{transition['latency_ms']:.1f}ms for a {self.frame_budget * 1000:.0f}ms budget)")
+        return transition
+    
+    def get_state(self) -> Dict:
+        """Get current level, latencies and recent transitions"""
+        return {
+            'enabled': self.enabled,
+            'level': self.level,
+            'max_level': len(self.levels) - 1,
+            'settings': dict(self.settings),
+            'frame_budget_ms': self.frame_budget * 1000 if self.enabled else None,
+            'latency_ms': self.latency * 1000 if self.latency is not None else None,
+            'stages_ms': {name: value * 1000 for name, value in self.stages.items()},
+            'frames_analyzed': self.frames_analyzed,
+            'frames_skipped': self.frames_skipped,
+            'transitions': list(self.transitions)
+        }
+
+
 class GazeTracker:
     """
     Main gaze tracker with calibration and click detection
@@ -181,16 +473,44 @@ class GazeTracker:
     
     def __init__(self, screen_width: int, screen_height: int, 
                  dwell_time: float = 0.8, camera_index: int = 0, 
-                 click_mode: str = 'dwell'):
+                 click_mode: str = 'dwell', tracking_mode: str = 'detect',
+                 detect_interval: int = 10, detection_scale: int = 1,
+                 iris_locator: str = 'contours', preprocessing: str = 'bilateral',
+                 preprocessing_downscale: int = 1, filter_min_cutoff: float = 1.0,
+                 filter_beta: float = 0.007, max_frame_interval: int = 1,
+                 saccade_speed: float = 600.0, frame_budget: Optional[float] = None,
+                 face_tracker: str = 'landmarks', max_lost_frames: int = 3,
+                 min_tracker_confidence: float = 7.0, min_landmark_fill: float = 0.3):
         self.screen_width = screen_width
         self.screen_height = screen_height
         
         # Initialize gaze tracking
-        self.gaze = GazeTracking()
+        # tracking_mode='track' runs face detection only every detect_interval frames,
+        # detection_scale > 1 runs it on a downscaled frame, the face is detected
+        # again when the loss criteria (max_lost_frames, min_*) are met
+        self.gaze = GazeTracking(tracking_mode=tracking_mode, detect_interval=detect_interval,
+                                 detection_scale=detection_scale, iris_locator=iris_locator,
+                                 preprocessing=preprocessing,
+                                 preprocessing_downscale=preprocessing_downscale,
+                                 face_tracker=face_tracker, max_lost_frames=max_lost_frames,
+                                 min_tracker_confidence=min_tracker_confidence,
+                                 min_landmark_fill=min_landmark_fill)
         
         # Initialize calibrator
         self.calibrator = GazeCalibrator(screen_width, screen_height)
         
+        # Smoothing of screen positions, and prediction for the frames not analyzed
+        self.gaze_filter = GazeFilter(screen_width, screen_height, filter_min_cutoff, filter_beta)
+        self.frame_skipper = AdaptiveFrameSkipper(max_frame_interval, saccade_speed)
+        
+        # Steps the settings above down when updates take longer than frame_budget (seconds)
+        self.preprocessing_downscale = preprocessing_downscale
+        self.governor = LatencyGovernor({
+            'detection_scale': detection_scale,
+            'preprocessing': preprocessing,
+            'max_frame_interval': max_frame_interval
+        }, frame_budget)
+        
         # Initialize click detectors
         self.dwell_detector = DwellClickDetector(dwell_time)
         self.blink_detector = BlinkClickDetector()
@@ -224,33 +544,59 @@ class GazeTracker:
         self.aois.clear()
         logger.info("Cleared all AOIs")
     
+    def get_aoi_at(self, x: int, y: int) -> Optional[AOI]:
+        """Get the AOI containing a screen position"""
+        for aoi in self.aois:
+            if aoi.contains(x, y):
+                return aoi
+        return None
+    
+    def set_dwell_time(self, dwell_time: float):
+        """Change the dwell time of dwell clicks"""
+        self.dwell_detector.dwell_time = dwell_time
+    
+    def set_click_mode(self, click_mode: str):
+        """Change the click mode ('dwell', 'blink' or 'both')"""
+        self.click_mode = click_mode
+    
     def set_click_callback(self, callback: Callable):
         """Set callback function for click events"""
         self.click_callback = callback
     
-    def get_raw_gaze_ratio(self) -> Optional[Tuple[float, float]]:
+    def get_raw_gaze_ratio(self, sample: Optional[GazeSample] = None) -> Optional[Tuple[float, float]]:
         """
         Get raw gaze ratios from gaze tracking
         
+        Args:
+            sample: Gaze sample to read, defaults to the last analyzed frame
+            
         Returns:
             (horizontal_ratio, vertical_ratio) or None if not available
         """
-        h_ratio = self.gaze.horizontal_ratio()
-        v_ratio = self.gaze.vertical_ratio()
+        if sample is None:
+            sample = self.gaze.sample
+        if sample is None or not sample.pupils_located:
+            return None
+        
+        h_ratio = sample.horizontal_ratio
+        v_ratio = sample.vertical_ratio
         
         if h_ratio is None or v_ratio is None:
             return None
         
         return (h_ratio, v_ratio)
     
-    def get_calibrated_gaze_position(self) -> Optional[Tuple[int, int]]:
+    def get_calibrated_gaze_position(self, sample: Optional[GazeSample] = None) -> Optional[Tuple[int, int]]:
         """
         Get calibrated gaze position in screen coordinates
         
+        Args:
+            sample: Gaze sample to read, defaults to the last analyzed frame
+            
         Returns:
             (screen_x, screen_y) or None if not available
         """
-        raw_ratios = self.get_raw_gaze_ratio()
+        raw_ratios = self.get_raw_gaze_ratio(sample)
         if raw_ratios is None:
             return None
         
@@ -280,8 +626,18 @@ class GazeTracker:
         Returns:
             Dictionary with gaze information and any detected clicks
         """
-        # Refresh gaze tracking
-        self.gaze.refresh(frame)
+        now = time.time()
+        started = time.perf_counter()
+        # Every frame is analyzed while calibrating, the calibrator needs fresh ratios
+        analyzed = not self.calibrator.is_calibrated or self.frame_skipper.should_analyze(self.gaze_filter)
+        
+        if analyzed:
+            # Refresh gaze tracking, every value below is read from this sample
+            sample = self.gaze.refresh(frame)
+        else:
+            # Stable gaze: skip the pipeline and use the filter prediction
+            sample = self.gaze.sample
+        analyzed_at = time.perf_counter()
         
         result = {
             'gaze_position': None,
@@ -289,14 +645,27 @@ class GazeTracker:
             'click_detected': False,
             'clicked_device': None,
             'dwell_progress': 0.0,
-            'pupils_detected': self.gaze.pupils_located,
-            'click_method': None
+            'pupils_detected': sample.pupils_located,
+            'click_method': None,
+            'sample': sample,
+            'predicted': not analyzed,
+            'blinking': bool(sample.is_blinking),
+            'dwell_target': None
         }
         
         # Get gaze position
-        gaze_pos = self.get_calibrated_gaze_position()
-        raw_ratios = self.get_raw_gaze_ratio()
-        is_blinking = self.gaze.is_blinking()
+        raw_ratios = self.get_raw_gaze_ratio(sample)
+        if analyzed:
+            gaze_pos = self.get_calibrated_gaze_position(sample)
+            if gaze_pos:
+                gaze_pos = self.gaze_filter.update(gaze_pos, now)
+            else:
+                self.gaze_filter.reset()
+        else:
+            gaze_pos = self.gaze_filter.predict(now)
+        is_blinking = result['blinking']
+        
+        self.frame_skipper.record(analyzed, now)
         
         click_pos = None
         click_method = None
@@ -310,11 +679,18 @@ class GazeTracker:
                 dwell_click = self.dwell_detector.update(gaze_pos[0], gaze_pos[1])
                 result['dwell_progress'] = self.dwell_detector.get_progress()
                 
+                # Device the dwell would click
+                fixation = self.dwell_detector.fixation_position
+                if fixation:
+                    aoi = self.get_aoi_at(*fixation)
+                    result['dwell_target'] = aoi.device_id if aoi else None
+                
                 if dwell_click:
                     click_pos = dwell_click
                     click_method = 'dwell'
             
-            if self.click_mode in ['blink', 'both']:
+            # Blinks can only be seen on analyzed frames
+            if self.click_mode in ['blink', 'both'] and analyzed:
                 blink_click = self.blink_detector.update(is_blinking, gaze_pos)
                 
                 if blink_click:
@@ -347,8 +723,43 @@ class GazeTracker:
             self.dwell_detector.reset()
             self.blink_detector.reset()
         
+        # Face detection, landmarks and pupils stages of the analysis, then the click detection
+        stages = dict(self.gaze.stage_times)
+        stages['other'] = max(0.0, (analyzed_at - started) - sum(stages.values()))
+        stages['clicks'] = time.perf_counter() - analyzed_at
+        transition = self.governor.record(stages, now, analyzed)
+        if transition:
+            self._apply_quality_level()
+        
         return result
     
+    def _apply_quality_level(self):
+        """Apply the pipeline settings of the governor's current level"""
+        settings = self.governor.settings
+        self.gaze.face_locator.detection_scale = settings['detection_scale']
+        self.gaze.calibration.set_preprocessor(
+            Preprocessor(settings['preprocessing'], self.preprocessing_downscale))
+        self.frame_skipper.max_interval = settings['max_frame_interval']
+    
+    def get_quality_state(self) -> Dict:
+        """Get latency governor level and transitions"""
+        return self.governor.get_state()
+    
+    def get_pipeline_stats(self) -> Dict:
+        """Get effective analysis rate and gaze filter state"""
+        stats = self.frame_skipper.get_stats()
+        stats['gaze_speed'] = self.gaze_filter.speed
+        stats['pupil_thresholds'] = self.gaze.calibration.stats()
+        return stats
+    
+    def get_face_tracking_stats(self) -> Dict:
+        """Get face detection / tracking counters"""
+        return self.gaze.face_locator.stats()
+    
+    def close(self):
+        """Stop the background work of the gaze tracking, to be called on shutdown"""
+        self.gaze.close()
+    
     def get_annotated_frame(self):
         """Get frame with gaze annotations"""
         return self.gaze.annotated_frame()
@@ -365,6 +776,48 @@ class GazeTracker:
         """Save calibration to file"""
         self.calibrator.save_calibration(filepath)
     
+    def load_pupil_thresholds(self, filepath: Path, user_id: str) -> bool:
+        """
+        Load the pupil thresholds saved for a user, so that tracking starts warm
+        
+        Returns:
+            True if thresholds matching the preprocessing backend were loaded
+        """
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to load pupil thresholds: {e}")
+            return False
+        
+        if not self.gaze.calibration.load_dict(data.get(user_id)):
+            return False
+        
+        logger.info(f"Pupil thresholds loaded for {user_id}: {self.gaze.calibration.to_dict()['thresholds']}")
+        return True
+    
+    def save_pupil_thresholds(self, filepath: Path, user_id: str):
+        """Save the pupil thresholds of a user, keeping the other users' ones"""
+        # Those of the configured backend, even while the governor uses a cheaper one
+        configured = Preprocessor(self.governor.levels[0]['preprocessing'], self.preprocessing_downscale)
+        calibration = self.gaze.calibration.to_dict(configured.name)
+        if calibration['thresholds'] is None:
+            return
+        
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        
+        data[user_id] = calibration
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        
+        logger.info(f"Pupil thresholds saved to {filepath}")
+    
     def start_calibration(self):
         """Start calibration process"""
         self.calibrator.reset()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Stand-in AI Service
+Serves the AI Service endpoints used by the edge device from the mock data,
+including the recommendation push stream, to run everything offline
+
+Usage:
+    python mock_ai_server.py [--port 8001] [--interval 30]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+
+from aiohttp import web
+
+from mock_data import MOCK_RECOMMENDATIONS, MockAIClient
+
+logger = logging.getLogger(__name__)
+
+
+class MockAIServer:
+    """AI Service endpoints backed by MockAIClient, with per-user pending recommendations"""
+
+    def __init__(self, interval: float = 0.0, keepalive: float = 15.0):
+        self.mock = MockAIClient('', '')
+        self.interval = interval    # Period of spontaneous recommendations (seconds), 0 for none
+        self.keepalive = keepalive  # Period of the stream keep-alive comments (seconds)
+
+        self.pending = {}           # user_uuid -> recommendations not delivered yet
+        self.streams = {}           # user_uuid -> set of queues of the open streams
+        self.users = set()          # Users that polled or opened a stream
+
+    def create_app(self) -> web.Application:
+        """Build the aiohttp application"""
+        app = web.Application()
+        app.router.add_get('/api/gaze/status', self.status)
+        app.router.add_get('/health', self.status)
+        app.router.add_get('/api/devices', self.get_devices)
+        app.router.add_post('/api/devices/control', self.control_device)
+        app.router.add_post('/api/gaze/click', self.device_click)
+        app.router.add_get('/v1/intent', self.poll_intent)
+        app.router.add_post('/v1/intent', self.respond_intent)
+        app.router.add_get('/v1/intent/stream', self.stream_intent)
+        app.router.add_post('/debug/recommend', self.debug_recommend)
+        if self.interval:
+            app.on_startup.append(self._start_generator)
+        return app
+
+    def publish(self, user_uuid: str, recommendation: dict):
+        """Push a recommendation to the open streams of a user, or keep it for the next poll"""
+        queues = self.streams.get(user_uuid)
+        if queues:
+            for queue in queues:
+                queue.put_nowait(recommendation)
+        else:
+            self.pending.setdefault(user_uuid, []).append(recommendation)
+        logger.info(f"Recommendation {recommendation['recommendation_id']} for {user_uuid} "
+                    f"({'pushed' if queues else 'pending'})")
+
+    async def status(self, request: web.Request) -> web.Response:
+        """Health check"""
+        return web.json_response({'status': 'active'})
+
+    async def get_devices(self, request: web.Request) -> web.Response:
+        """Device list"""
+        return web.json_response({'devices': await self.mock.get_devices()})
+
+    async def control_device(self, request: web.Request) -> web.Response:
+        """Change the state of a mock device"""
+        data = await request.json()
+        result = await self.mock.control_device(data.get('device_id'), data.get('action', 'toggle'),
+                                                data.get('parameters'))
+        return web.json_response(result)
+
+    async def device_click(self, request: web.Request) -> web.Response:
+        """Recommendation for a clicked device"""
+        data = await request.json()
+        return web.json_response(await self.mock.send_device_click(data.get('clicked_device', {}),
+                                                                   data.get('context')))
+
+    async def poll_intent(self, request: web.Request) -> web.Response:
+        """Next pending recommendation of a user"""
+        user_uuid = request.query.get('user_uuid', '')
+        self.users.add(user_uuid)
+        pending = self.pending.get(user_uuid)
+        if pending:
+            return web.json_response({'status': 'success', 'recommendation': pending.pop(0)})
+        return web.json_response({'status': 'empty'})
+
+    async def respond_intent(self, request: web.Request) -> web.Response:
+        """YES/NO answer to a recommendation"""
+        data = await request.json()
+        return web.json_response(await self.mock.respond_to_recommendation(
+            data.get('recommendation_id'), data.get('answer', 'NO'), data.get('device_id')))
+
+    async def stream_intent(self, request: web.Request) -> web.StreamResponse:
+        """Server-sent events: one 'recommendation' event per recommendation"""
+        user_uuid = request.query.get('user_uuid', '')
+        self.users.add(user_uuid)
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache'
+        })
+        await response.prepare(request)
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for recommendation in self.pending.pop(user_uuid, []):
+            queue.put_nowait(recommendation)
+        self.streams.setdefault(user_uuid, set()).add(queue)
+        logger.info(f"Stream opened for {user_uuid}")
+
+        try:
+            await response.write(b': connected\n\n')
+            while True:
+                try:
+                    recommendation = await asyncio.wait_for(queue.get(), self.keepalive)
+                except asyncio.TimeoutError:
+                    await response.write(b': keep-alive\n\n')
+                    continue
+                payload = json.dumps(recommendation, ensure_ascii=False)
+                await response.write(f"event: recommendation\ndata: {payload}\n\n".encode('utf-8'))
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass
+        finally:
+            self.streams[user_uuid].discard(queue)
+            logger.info(f"Stream closed for {user_uuid}")
+        return response
+
+    async def debug_recommend(self, request: web.Request) -> web.Response:
+        """Send a recommendation now: {"user_uuid": ..., "device_id": optional}"""
+        data = await request.json()
+        recommendation = self._make_recommendation(data.get('device_id'))
+        self.publish(data.get('user_uuid', ''), recommendation)
+        return web.json_response({'status': 'sent', 'recommendation': recommendation})
+
+    def _make_recommendation(self, device_id: str = None) -> dict:
+        """Copy a mock recommendation with a new id"""
+        candidates = [r for r in MOCK_RECOMMENDATIONS if not device_id or r['device_id'] == device_id]
+        recommendation = dict(random.choice(candidates or MOCK_RECOMMENDATIONS))
+        recommendation['recommendation_id'] = f"rec_{random.randrange(16 ** 6):06x}"
+        return recommendation
+
+    async def _start_generator(self, app: web.Application):
+        app['generator'] = asyncio.create_task(self._generate())
+
+    async def _generate(self):
+        """Send spontaneous recommendations to every user seen so far"""
+        while True:
+            await asyncio.sleep(self.interval)
+            for user_uuid in self.users:
+                self.publish(user_uuid, self._make_recommendation())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in AI Service for offline testing")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--interval', type=float, default=0.0,
+                        help="Send a recommendation every N seconds (0 for none)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    web.run_app(MockAIServer(args.interval).create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
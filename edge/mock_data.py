@@ -183,3 +183,11 @@ class MockAIClient:
     async def health_check(self):
         """Always healthy in mock mode"""
         return True
+    
+    async def close(self):
+        """Nothing to close in mock mode"""
+        pass
+    
+    def get_stats(self):
+        """No transport in mock mode"""
+        return {'mock': True}
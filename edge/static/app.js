@@ -3,6 +3,17 @@
 let ws = null;
 let calibrationInProgress = false;
 let currentRecommendation = null;
+let appState = null;
+let stateVersion = null;
+
+// Binary gaze stream, must match edge/core/protocol.py
+const GAZE_SUBPROTOCOL = 'gazehome.gaze.v1';
+const GAZE_HEADER_SIZE = 4;
+const GAZE_SAMPLE_SIZE = 16;
+const GAZE_FLAG_GAZE = 0x01;
+const GAZE_FLAG_BLINKING = 0x02;
+const GAZE_FLAG_PREDICTED = 0x04;
+const GAZE_FLAG_CLICK = 0x08;
 let gazeCanvas = null;
 let gazeCtx = null;
 let calibrationCanvas = null;
@@ -21,11 +32,7 @@ document.addEventListener('DOMContentLoaded', () => {
     // Setup event listeners
     setupEventListeners();
 
-    // Initial state fetch
-    fetchState();
-
-    // Start polling for updates
-    setInterval(fetchState, 2000);
+    // State updates arrive over the WebSocket: a snapshot, then deltas
 });
 
 function setupGazeCanvas() {
@@ -38,7 +45,9 @@ function connectWebSocket() {
     const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
     const wsUrl = `${protocol}//${window.location.host}/ws`;
 
-    ws = new WebSocket(wsUrl);
+    // Ask for the binary gaze stream, the server falls back to JSON messages if it doesn't know it
+    ws = new WebSocket(wsUrl, [GAZE_SUBPROTOCOL]);
+    ws.binaryType = 'arraybuffer';
 
     ws.onopen = () => {
         console.log('WebSocket connected');
@@ -46,6 +55,11 @@ function connectWebSocket() {
     };
 
     ws.onmessage = (event) => {
+        if (event.data instanceof ArrayBuffer) {
+            handleGazeBatch(decodeGazeBatch(event.data));
+            return;
+        }
+
         const data = JSON.parse(event.data);
 
         // Handle different message types
@@ -57,8 +71,10 @@ function connectWebSocket() {
             updateDwellProgress(data);
         } else if (data.type === 'recommendation') {
             showRecommendation(data.recommendation);
-        } else {
-            handleStateUpdate(data);
+        } else if (data.type === 'snapshot') {
+            applyStateSnapshot(data);
+        } else if (data.type === 'delta') {
+            applyStateDelta(data);
         }
     };
 
@@ -76,6 +92,46 @@ function connectWebSocket() {
     };
 }
 
+function decodeGazeBatch(buffer) {
+    const view = new DataView(buffer);
+    const messageType = view.getUint8(0);
+    const version = view.getUint8(1);
+    if (messageType !== 1 || version !== 1) {
+        console.warn(`Unsupported gaze message type ${messageType} version ${version}`);
+        return [];
+    }
+
+    const count = view.getUint16(2, true);
+    const samples = [];
+    for (let i = 0; i < count; i++) {
+        const offset = GAZE_HEADER_SIZE + i * GAZE_SAMPLE_SIZE;
+        const flags = view.getUint8(offset + 14);
+        samples.push({
+            timestamp: view.getFloat64(offset, true),
+            position: (flags & GAZE_FLAG_GAZE) ? {
+                x: view.getInt16(offset + 8, true),
+                y: view.getInt16(offset + 10, true)
+            } : null,
+            progress: view.getUint16(offset + 12, true) / 65535,
+            blinking: (flags & GAZE_FLAG_BLINKING) !== 0,
+            predicted: (flags & GAZE_FLAG_PREDICTED) !== 0,
+            click: (flags & GAZE_FLAG_CLICK) !== 0
+        });
+    }
+    return samples;
+}
+
+function handleGazeBatch(samples) {
+    // Only the latest sample of the batch is drawn, clicks arrive as separate messages
+    const latest = samples[samples.length - 1];
+    if (!latest) {
+        return;
+    }
+
+    updateGazePointer(latest);
+    updateDwellProgress(latest);
+}
+
 function setupEventListeners() {
     // Calibration button
     document.getElementById('calibrate-btn').addEventListener('click', startCalibration);
@@ -122,13 +178,56 @@ async function updateDwellTime(dwellTime) {
     }
 }
 
-async function fetchState() {
-    try {
-        const response = await fetch('/api/state');
-        const data = await response.json();
-        handleStateUpdate(data);
-    } catch (error) {
-        console.error('Error fetching state:', error);
+function applyStateSnapshot(data) {
+    appState = data.state;
+    stateVersion = data.version;
+    handleStateUpdate(appState);
+    sendStateAck();
+}
+
+function applyStateDelta(data) {
+    if (appState === null || data.from !== stateVersion) {
+        // Missed a change, ask for the whole state again
+        ws.send(JSON.stringify({ type: 'resync' }));
+        return;
+    }
+
+    for (const op of data.ops) {
+        applyPatchOp(appState, op);
+    }
+    stateVersion = data.version;
+    handleStateUpdate(appState);
+    sendStateAck();
+}
+
+function applyPatchOp(state, op) {
+    // JSON pointer: "/devices/0/state" -> ['devices', '0', 'state']
+    const keys = op.path.split('/').slice(1).map(key => key.replace(/~1/g, '/').replace(/~0/g, '~'));
+    const last = keys.pop();
+    let parent = state;
+    for (const key of keys) {
+        parent = parent[key];
+    }
+
+    if (Array.isArray(parent)) {
+        const index = parseInt(last, 10);
+        if (op.op === 'add') {
+            parent.splice(index, 0, op.value);
+        } else if (op.op === 'remove') {
+            parent.splice(index, 1);
+        } else {
+            parent[index] = op.value;
+        }
+    } else if (op.op === 'remove') {
+        delete parent[last];
+    } else {
+        parent[last] = op.value;
+    }
+}
+
+function sendStateAck() {
+    if (ws && ws.readyState === WebSocket.OPEN) {
+        ws.send(JSON.stringify({ type: 'ack', version: stateVersion }));
     }
 }
 
@@ -265,9 +364,6 @@ async function toggleDevice(deviceId) {
 
         const result = await response.json();
         console.log('Device control result:', result);
-
-        // Refresh state
-        await fetchState();
     } catch (error) {
         console.error('Error controlling device:', error);
     }
@@ -537,9 +633,6 @@ async function respondToRecommendation(answer) {
         // Hide popup
         document.getElementById('recommendation-popup').classList.add('hidden');
         currentRecommendation = null;
-
-        // Refresh state
-        await fetchState();
     } catch (error) {
         console.error('Error responding to recommendation:', error);
     }
@@ -550,8 +643,6 @@ async function refreshDevices() {
         const response = await fetch('/api/devices/refresh', { method: 'POST' });
         const result = await response.json();
         console.log('Devices refreshed:', result);
-
-        await fetchState();
     } catch (error) {
         console.error('Error refreshing devices:', error);
     }
@@ -9,6 +9,8 @@ import sys
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent))
+# Repository root, for the gaze_tracking package
+sys.path.append(str(Path(__file__).parent.parent))
 
 from core.config import config
 from gaze.calibrator import GazeCalibrator
@@ -65,6 +67,53 @@ async def test_calibrator():
         test_file.unlink()
 
 
+async def test_iris_locators():
+    """Test that the iris locators agree on sample eye crops"""
+    print("\n=== Testing Iris Locators ===")
+    
+    from gaze_tracking.benchmark import synthetic_eye_frames, compare_iris_locators
+    
+    results = compare_iris_locators(synthetic_eye_frames(100), repeat=1)
+    for r in results:
+        print(f"  {r['locator']}: {r['agreement'] * 100:.1f}% agreement, "
+              f"{r['mean_distance_px']:.2f}px mean distance, {r['mean_us']:.1f}us")
+    
+    components = next(r for r in results if r['locator'] == 'components')
+    assert components['agreement'] >= 0.95, "Connected components locator disagrees with contours"
+    
+    print("\n✅ Iris locators agree")
+
+
+async def test_pupil_thresholds():
+    """Test that pupil thresholds saved while degraded reload with a downscaled backend"""
+    print("\n=== Testing Pupil Thresholds ===")
+    
+    from gaze.tracker import GazeTracker
+    
+    tracker = GazeTracker(640, 480, preprocessing_downscale=2, frame_budget=0.05)
+    calibration = tracker.gaze.calibration
+    assert calibration.load_dict({'preprocessing': calibration.preprocessing,
+                                  'thresholds': [40, 42], 'brightness': 100})
+    
+    # The governor switches to the gaussian backend, the configured one is saved
+    tracker.governor.level = len(tracker.governor.levels) - 1
+    tracker._apply_quality_level()
+    
+    test_file = Path(__file__).parent / "test_pupil_thresholds.json"
+    try:
+        tracker.save_pupil_thresholds(test_file, 'test_user')
+        assert test_file.exists(), "No thresholds saved"
+    
+        loaded = GazeTracker(640, 480, preprocessing_downscale=2).load_pupil_thresholds(test_file, 'test_user')
+        assert loaded, "Saved thresholds not loaded"
+        print(f"  Saved and loaded: {json.loads(test_file.read_text())['test_user']}")
+    finally:
+        if test_file.exists():
+            test_file.unlink()
+    
+    print("\n✅ Pupil thresholds saved and reloaded")
+
+
 async def test_api_clients():
     """Test API clients"""
     print("\n=== Testing API Clients ===")
@@ -86,6 +135,89 @@ async def test_api_clients():
                 print("  No devices found (AI Service might not be running)")
 
 
+async def test_click_then_yes():
+    """Test that a recommendation from a device click can be accepted"""
+    print("\n=== Testing Click and YES ===")
+    
+    from starlette.requests import Request
+    import app as edge_app
+    from api.device_cache import DeviceCache
+    from api.recommendations import RecommendationFeed
+    from mock_data import MockAIClient
+    
+    edge_app.ai_client = MockAIClient(config.ai_service_url, config.user_uuid)
+    edge_app.recommendation_feed = RecommendationFeed(edge_app.ai_client, edge_app.on_recommendation, push=False)
+    edge_app.device_cache = DeviceCache(edge_app.ai_client, on_update=edge_app.apply_devices)
+    await edge_app.refresh_devices()
+    
+    device_id = edge_app.devices_cache[0]['device_id']
+    await edge_app.on_device_click(device_id, 'toggle', (100, 100))
+    recommendation = edge_app.current_recommendation
+    assert recommendation is not None, "No recommendation after the click"
+    assert isinstance(recommendation['action'], dict), "The click replaced the recommended action"
+    print(f"  Recommendation: {recommendation.get('prompt_text', '')}")
+    
+    body = json.dumps({'answer': 'YES'}).encode()
+    
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+    
+    request = Request({'type': 'http', 'method': 'POST', 'headers': []}, receive)
+    response = await edge_app.respond_to_recommendation(request)
+    assert response.status_code == 200, f"YES answer failed with {response.status_code}"
+    assert edge_app.current_recommendation is None
+    
+    print("\n✅ Recommendation accepted")
+
+
+async def test_click_prefetch():
+    """Test that dwell prefetches are taken by the click, or cancelled when the gaze leaves"""
+    print("\n=== Testing Click Prefetch ===")
+    
+    from api.prefetch import ClickPrefetcher
+    
+    sent = []
+    
+    async def send_click(device_id, position):
+        sent.append(device_id)
+        await asyncio.sleep(0.01)
+        return {'recommendation': {'device_id': device_id}}
+    
+    prefetcher = ClickPrefetcher(send_click, threshold=0.5)
+    
+    # Hit: the dwell passes the threshold, then the click takes the request
+    prefetcher.observe('lamp', 0.3)
+    assert prefetcher.get_stats()['prefetches'] == 0, "Prefetched below the threshold"
+    prefetcher.observe('lamp', 0.6, (10, 10))
+    prefetcher.observe('lamp', 0.8, (10, 10))
+    task = prefetcher.take('lamp')
+    assert task is not None, "No prefetch taken by the click"
+    assert (await task)['recommendation']['device_id'] == 'lamp'
+    
+    # Cancel: the gaze moves to another device before the click
+    prefetcher.observe('fan', 0.6)
+    cancelled = prefetcher._task
+    await asyncio.sleep(0)  # The request is sent
+    prefetcher.observe('tv', 0.1)
+    await asyncio.sleep(0)
+    assert cancelled.cancelled(), "Prefetch not cancelled when the gaze left"
+    
+    # Miss: a click without a prefetch for its device
+    assert prefetcher.take('tv') is None
+    
+    stats = prefetcher.get_stats()
+    print(f"  {stats}")
+    assert (stats['prefetches'], stats['hits'], stats['cancelled'], stats['misses']) == (2, 1, 1, 1)
+    assert sent == ['lamp', 'fan']
+    
+    # Disabled at 1.0, the default
+    disabled = ClickPrefetcher(send_click, threshold=1.0)
+    disabled.observe('lamp', 0.99)
+    assert disabled.take('lamp') is None and disabled.get_stats()['prefetches'] == 0
+    
+    print("\n✅ Click prefetch hits, cancels and misses")
+
+
 async def test_config():
     """Test configuration"""
     print("\n=== Testing Configuration ===")
@@ -109,6 +241,10 @@ async def main():
     try:
         await test_config()
         await test_calibrator()
+        await test_iris_locators()
+        await test_pupil_thresholds()
+        await test_click_then_yes()
+        await test_click_prefetch()
         await test_api_clients()
         
         print("\n" + "=" * 60)
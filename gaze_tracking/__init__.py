@@ -1 +1,2 @@
 from .gaze_tracking import GazeTracking
+from .gaze_sample import GazeSample
@@ -0,0 +1,228 @@
+"""
+Offline gaze extraction over recorded videos or image directories.
+
+The frames are split in chunks that are processed by a pool of worker
+processes. The dlib models are loaded once in the parent process and
+shared with forked workers (or loaded once per worker when processes are
+spawned), and the results are written in frame order to a columnar .npz file.
+
+Usage:
+    python -m gaze_tracking.batch <video or image directory> [-o results.npz] [--workers N]
+"""
+
+from __future__ import division, print_function
+import argparse
+import multiprocessing
+import os
+import time
+import cv2
+import numpy as np
+from . import models
+from .gaze_tracking import GazeTracking
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+COLUMNS = (
+    "frame_index", "timestamp", "face_detected", "pupils_located",
+    "pupil_left_x", "pupil_left_y", "pupil_right_x", "pupil_right_y",
+    "horizontal_ratio", "vertical_ratio", "blinking_ratio", "confidence", "processing_time",
+)
+
+# GazeTracking instance of the worker process, created once by _init_worker
+_worker_gaze = None
+
+
+def list_images(directory):
+    """Returns the sorted paths of the images of a directory"""
+    names = sorted(name for name in os.listdir(directory) if name.lower().endswith(IMAGE_EXTENSIONS))
+    return [os.path.join(directory, name) for name in names]
+
+
+def count_frames(source):
+    """Returns the number of frames of a video or an image directory"""
+    if os.path.isdir(source):
+        return len(list_images(source))
+
+    capture = cv2.VideoCapture(source)
+    count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    capture.release()
+    return count
+
+
+def iter_frames(source, start, stop):
+    """Yields (frame_index, timestamp, frame) for the frames [start, stop) of the source
+
+    Arguments:
+        source (str): Path of a video or an image directory
+        start (int): Index of the first frame
+        stop (int): Index after the last frame
+    """
+    if os.path.isdir(source):
+        for index, path in enumerate(list_images(source)[start:stop], start):
+            frame = cv2.imread(path)
+            if frame is not None:
+                yield index, float(index), frame
+        return
+
+    capture = cv2.VideoCapture(source)
+    capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+    for index in range(start, stop):
+        ret, frame = capture.read()
+        if not ret:
+            break
+        yield index, capture.get(cv2.CAP_PROP_POS_MSEC) / 1000, frame
+    capture.release()
+
+
+def calibrate(source, gaze, nb_frames=200):
+    """Runs the pupil threshold calibration on the first frames of the source,
+    so that every chunk is analyzed with the same thresholds
+
+    Arguments:
+        source (str): Path of a video or an image directory
+        gaze (GazeTracking): Tracker whose calibration is filled
+        nb_frames (int): Maximum number of frames used to complete the calibration
+
+    Returns:
+        The calibration as a dict (see Calibration.to_dict), without
+        thresholds if no face was found
+    """
+    for _, _, frame in iter_frames(source, 0, nb_frames):
+        gaze.refresh(frame)
+        if gaze.calibration.is_complete():
+            break
+    return gaze.calibration.to_dict()
+
+
+def _empty_columns(size):
+    """Returns the result columns for a chunk, filled with missing values"""
+    columns = {name: np.full(size, np.nan, np.float64) for name in COLUMNS}
+    columns["frame_index"] = np.full(size, -1, np.int64)
+    columns["face_detected"] = np.zeros(size, np.bool_)
+    columns["pupils_located"] = np.zeros(size, np.bool_)
+    return columns
+
+
+def _init_worker(calibration):
+    """Creates the tracker of the worker process. With fork, the models
+    preloaded by the parent are reused, otherwise they are loaded once here.
+
+    Argument:
+        calibration (dict): Calibration found by calibrate()
+    """
+    global _worker_gaze
+    models.registry.preload()
+    _worker_gaze = GazeTracking()
+    # Every chunk keeps the shared thresholds, the output doesn't depend on timing
+    _worker_gaze.calibration.adapt_interval = None
+    _worker_gaze.calibration.load_dict(calibration)
+
+
+def process_chunk(task):
+    """Analyzes the frames [start, stop) of the source in a worker process
+
+    Argument:
+        task (tuple): (source, start, stop)
+
+    Returns:
+        The result columns of the chunk and the time spent (seconds)
+    """
+    source, start, stop = task
+    gaze = _worker_gaze
+    gaze.face_locator.reset()
+
+    columns = _empty_columns(stop - start)
+    count = 0
+    began = time.time()
+
+    for index, timestamp, frame in iter_frames(source, start, stop):
+        sample = gaze.refresh(frame, timestamp)
+        row = count
+        count += 1
+
+        columns["frame_index"][row] = index
+        columns["timestamp"][row] = timestamp
+        columns["face_detected"][row] = sample.face_detected
+        columns["pupils_located"][row] = sample.pupils_located
+        columns["processing_time"][row] = sample.processing_time
+        if sample.confidence is not None:
+            columns["confidence"][row] = sample.confidence
+        if sample.pupils_located:
+            columns["pupil_left_x"][row], columns["pupil_left_y"][row] = sample.pupil_left
+            columns["pupil_right_x"][row], columns["pupil_right_y"][row] = sample.pupil_right
+        for name in ("horizontal_ratio", "vertical_ratio", "blinking_ratio"):
+            value = getattr(sample, name)
+            if value is not None:
+                columns[name][row] = value
+
+    columns = {name: values[:count] for name, values in columns.items()}
+    return columns, time.time() - began
+
+
+def run(source, output, workers=None, chunk_size=200):
+    """Analyzes every frame of the source and writes the results to output
+
+    Arguments:
+        source (str): Path of a video or an image directory
+        output (str): Path of the .npz file to write
+        workers (int): Number of worker processes, defaults to the number of cores
+        chunk_size (int): Number of frames per chunk
+
+    Returns:
+        A dict with the number of frames, the elapsed time and the throughput
+    """
+    workers = workers or multiprocessing.cpu_count()
+    nb_frames = count_frames(source)
+    if nb_frames <= 0:
+        raise ValueError("No frame found in {}".format(source))
+
+    began = time.time()
+    # Loaded before the pool starts so that forked workers share the model pages
+    models.registry.preload()
+    calibration = calibrate(source, GazeTracking())
+    tasks = [(source, start, min(start + chunk_size, nb_frames)) for start in range(0, nb_frames, chunk_size)]
+
+    chunks = []
+    busy_time = 0.0
+    pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(calibration,))
+    try:
+        # imap keeps the chunks in frame order
+        for columns, elapsed in pool.imap(process_chunk, tasks):
+            chunks.append(columns)
+            busy_time += elapsed
+    finally:
+        pool.close()
+        pool.join()
+
+    results = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in COLUMNS}
+    np.savez_compressed(output, **results)
+
+    elapsed = time.time() - began
+    processed = len(results["frame_index"])
+    return {
+        'frames': processed,
+        'workers': workers,
+        'elapsed': elapsed,
+        'fps': processed / elapsed if elapsed else 0.0,
+        'fps_per_core': processed / busy_time if busy_time else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline gaze extraction over a video or an image directory")
+    parser.add_argument("source", help="Video file or image directory")
+    parser.add_argument("-o", "--output", help="Output .npz file (default: <source>.gaze.npz)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--chunk-size", type=int, default=200, help="Number of frames per chunk")
+    args = parser.parse_args()
+
+    output = args.output or os.path.normpath(args.source) + ".gaze.npz"
+    stats = run(args.source, output, args.workers, args.chunk_size)
+
+    print("Processed {} frames in {:.1f}s with {} workers".format(stats['frames'], stats['elapsed'], stats['workers']))
+    print("Throughput: {:.1f} frames/s, {:.1f} frames/s per core".format(stats['fps'], stats['fps_per_core']))
+    print("Results written to {}".format(output))
+
+
+if __name__ == "__main__":
+    main()
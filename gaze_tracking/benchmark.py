@@ -0,0 +1,325 @@
+"""
+Benchmarks of the gaze tracking pipeline on recorded frames.
+
+Usage:
+    python -m gaze_tracking.benchmark pyramid <video, image directory or camera index> [--frames N]
+    python -m gaze_tracking.benchmark iris [--source <video, image directory or camera index>] [--frames N]
+    python -m gaze_tracking.benchmark preprocessing [--source <video, image directory or camera index>] [--frames N]
+"""
+
+from __future__ import division, print_function
+import argparse
+import os
+import time
+import cv2
+import numpy as np
+from .gaze_tracking import GazeTracking
+from .face_locator import FaceLocator
+from .pupil import Pupil
+from .calibration import Calibration
+from .batch import list_images
+from .landmarks import to_array
+from .preprocessing import BACKENDS, Preprocessor
+
+
+def read_frames(source, limit=None):
+    """Reads frames from a video file, a directory of images or a camera
+
+    Arguments:
+        source (str): Path of a video or an image directory, or a camera index
+        limit (int): Maximum number of frames to read
+
+    Returns:
+        A list of BGR frames
+    """
+    frames = []
+
+    if os.path.isdir(source):
+        for path in list_images(source)[:limit]:
+            frame = cv2.imread(path)
+            if frame is not None:
+                frames.append(frame)
+        return frames
+
+    capture = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    while limit is None or len(frames) < limit:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        frames.append(frame)
+    capture.release()
+    return frames
+
+
+def _iou(a, b):
+    """Returns the intersection over union of two dlib rectangles"""
+    left, top = max(a.left(), b.left()), max(a.top(), b.top())
+    right, bottom = min(a.right(), b.right()), min(a.bottom(), b.bottom())
+    intersection = max(right - left, 0) * max(bottom - top, 0)
+    union = a.width() * a.height() + b.width() * b.height() - intersection
+    return intersection / union if union else 0.0
+
+
+def benchmark_pyramid(frames, scales=(1, 2, 3, 4)):
+    """Measures face detection latency and accuracy for each detection scale.
+    The detection at full resolution is used as the reference.
+
+    Arguments:
+        frames (list): BGR frames
+        scales (tuple): Detection scales to compare
+
+    Returns:
+        One dict of results per scale
+    """
+    gaze = GazeTracking()
+    grays = [cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) for frame in frames]
+
+    references = []
+    for gray in grays:
+        faces = gaze._face_detector(gray)
+        if len(faces):
+            references.append((faces[0], to_array(gaze._predictor(gray, faces[0])).astype(np.float64)))
+        else:
+            references.append(None)
+    nb_references = sum(1 for reference in references if reference is not None)
+
+    results = []
+    for scale in scales:
+        locator = FaceLocator(gaze._face_detector, detection_scale=scale)
+        latencies, ious, errors = [], [], []
+        found = 0
+
+        for gray, reference in zip(grays, references):
+            start = time.perf_counter()
+            faces, _ = locator.detect_faces(gray)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+            if reference is None or not faces:
+                continue
+            found += 1
+            reference_face, reference_landmarks = reference
+            ious.append(_iou(faces[0], reference_face))
+            landmarks = to_array(gaze._predictor(gray, faces[0])).astype(np.float64)
+            errors.append(np.mean(np.linalg.norm(landmarks - reference_landmarks, axis=1)))
+
+        results.append({
+            'scale': scale,
+            'mean_ms': float(np.mean(latencies)) if latencies else 0.0,
+            'p95_ms': float(np.percentile(latencies, 95)) if latencies else 0.0,
+            'detection_rate': found / nb_references if nb_references else 0.0,
+            'mean_iou': float(np.mean(ious)) if ious else 0.0,
+            'landmark_error_px': float(np.mean(errors)) if errors else 0.0,
+        })
+
+    return results
+
+
+def print_pyramid(results):
+    """Prints the latency-vs-accuracy table of benchmark_pyramid"""
+    print("{:>5} {:>9} {:>9} {:>10} {:>9} {:>13}".format(
+        "scale", "mean ms", "p95 ms", "detected", "IoU", "landmark px"))
+    for r in results:
+        print("{:>5} {:>9.2f} {:>9.2f} {:>9.1f}% {:>9.3f} {:>13.2f}".format(
+            r['scale'], r['mean_ms'], r['p95_ms'], r['detection_rate'] * 100,
+            r['mean_iou'], r['landmark_error_px']))
+
+
+def synthetic_eye_frames(count, seed=0):
+    """Generates eye crops looking like the output of Eye._isolate: white
+    outside the eye, a light sclera and a dark iris at a random position
+
+    Arguments:
+        count (int): Number of crops
+        seed (int): Seed of the random generator
+
+    Returns:
+        A list of grayscale eye frames
+    """
+    rng = np.random.RandomState(seed)
+    frames = []
+
+    for _ in range(count):
+        height, width = rng.randint(20, 32), rng.randint(40, 64)
+        frame = np.full((height, width), 255, np.uint8)
+        eye = np.zeros((height, width), np.uint8)
+        center = (width // 2, height // 2)
+        cv2.ellipse(eye, center, (width // 2 - 5, height // 2 - 5), 0, 0, 360, 255, -1)
+
+        sclera = rng.normal(rng.randint(150, 210), 12, (height, width))
+        iris = np.zeros((height, width), np.uint8)
+        radius = int(height * rng.uniform(0.25, 0.4))
+        iris_center = (int(center[0] + rng.uniform(-0.3, 0.3) * width / 2), int(center[1] + rng.uniform(-2, 2)))
+        cv2.circle(iris, iris_center, radius, 255, -1)
+        sclera[iris > 0] = rng.normal(rng.randint(20, 60), 8, (height, width))[iris > 0]
+
+        content = np.clip(sclera, 0, 255).astype(np.uint8)
+        frame[eye > 0] = content[eye > 0]
+        frames.append(frame)
+
+    return frames
+
+
+def recorded_eye_frames(frames):
+    """Returns the eye crops found by GazeTracking in the given BGR frames"""
+    gaze = GazeTracking()
+    eye_frames = []
+    for frame in frames:
+        gaze.refresh(frame)
+        if gaze.eye_left is not None:
+            eye_frames.extend([gaze.eye_left.frame, gaze.eye_right.frame])
+    return eye_frames
+
+
+def compare_iris_locators(eye_frames, repeat=20):
+    """Measures the latency of each iris locator and its agreement with
+    the contour-based locator on the same binarized frames
+
+    Arguments:
+        eye_frames (list): Grayscale eye crops
+        repeat (int): Number of timed runs per crop
+
+    Returns:
+        One dict of results per locator
+    """
+    pupils = []
+    for eye_frame in eye_frames:
+        threshold = Calibration.find_best_threshold(eye_frame)
+        pupils.append(Pupil(eye_frame, threshold))
+
+    reference = [(pupil.x, pupil.y) for pupil in pupils]
+    results = []
+
+    for locator in Pupil.LOCATORS:
+        method = getattr(Pupil, "_locate_" + locator)
+        latencies, distances = [], []
+        agree = 0
+
+        for pupil, expected in zip(pupils, reference):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                pupil.x, pupil.y = None, None
+                method(pupil)
+            latencies.append((time.perf_counter() - start) / repeat * 1e6)
+
+            if expected[0] is None or pupil.x is None:
+                agree += expected[0] is None and pupil.x is None
+                continue
+            distance = np.hypot(pupil.x - expected[0], pupil.y - expected[1])
+            distances.append(distance)
+            agree += distance <= 1
+
+        results.append({
+            'locator': locator,
+            'mean_us': float(np.mean(latencies)) if latencies else 0.0,
+            'agreement': agree / len(pupils) if pupils else 0.0,
+            'mean_distance_px': float(np.mean(distances)) if distances else 0.0,
+        })
+
+    return results
+
+
+def print_iris(results):
+    """Prints the table of compare_iris_locators"""
+    print("{:>10} {:>9} {:>10} {:>12}".format("locator", "mean us", "agreement", "distance px"))
+    for r in results:
+        print("{:>10} {:>9.1f} {:>9.1f}% {:>12.2f}".format(
+            r['locator'], r['mean_us'], r['agreement'] * 100, r['mean_distance_px']))
+
+
+def compare_preprocessing(eye_frames, downscales=(1, 2), repeat=5):
+    """Measures the latency of each preprocessing backend and the distance
+    between the pupil it finds and the one found with the bilateral filter
+
+    Arguments:
+        eye_frames (list): Grayscale eye crops
+        downscales (tuple): Downscale factors to try with each backend
+        repeat (int): Number of timed runs per crop
+
+    Returns:
+        One dict of results per backend and downscale factor
+    """
+    def locate(eye_frame, preprocessor):
+        threshold = Calibration.find_best_threshold(eye_frame, preprocessor=preprocessor)
+        pupil = Pupil(eye_frame, threshold, preprocessor=preprocessor)
+        return pupil.x, pupil.y
+
+    reference = [locate(eye_frame, Preprocessor()) for eye_frame in eye_frames]
+    results = []
+
+    for backend in sorted(BACKENDS):
+        for downscale in downscales:
+            preprocessor = Preprocessor(backend, downscale)
+            latencies, errors = [], []
+            located = 0
+
+            for eye_frame, expected in zip(eye_frames, reference):
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    preprocessor(eye_frame)
+                latencies.append((time.perf_counter() - start) / repeat * 1e6)
+
+                x, y = locate(eye_frame, preprocessor)
+                if x is None or expected[0] is None:
+                    continue
+                located += 1
+                errors.append(np.hypot(x - expected[0], y - expected[1]))
+
+            results.append({
+                'backend': preprocessor.name,
+                'mean_us': float(np.mean(latencies)) if latencies else 0.0,
+                'located': located / len(eye_frames) if eye_frames else 0.0,
+                'centroid_error_px': float(np.mean(errors)) if errors else 0.0,
+            })
+
+    return results
+
+
+def print_preprocessing(results):
+    """Prints the table of compare_preprocessing"""
+    print("{:>12} {:>9} {:>9} {:>11}".format("backend", "mean us", "located", "error px"))
+    for r in results:
+        print("{:>12} {:>9.1f} {:>8.1f}% {:>11.2f}".format(
+            r['backend'], r['mean_us'], r['located'] * 100, r['centroid_error_px']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the gaze tracking pipeline")
+    subparsers = parser.add_subparsers(dest="benchmark")
+    subparsers.required = True
+
+    pyramid = subparsers.add_parser("pyramid", help="Face detection latency and accuracy per detection scale")
+    pyramid.add_argument("source", help="Video file, image directory or camera index")
+    pyramid.add_argument("--frames", type=int, default=200, help="Number of frames to use")
+    pyramid.add_argument("--scales", type=int, nargs="+", default=[1, 2, 3, 4], help="Detection scales to compare")
+
+    iris = subparsers.add_parser("iris", help="Iris locators latency and agreement on eye crops")
+    iris.add_argument("--source", help="Video file, image directory or camera index (default: synthetic crops)")
+    iris.add_argument("--frames", type=int, default=200, help="Number of frames or synthetic crops to use")
+
+    preprocessing = subparsers.add_parser("preprocessing", help="Preprocessing backends latency and centroid error")
+    preprocessing.add_argument("--source", help="Video file, image directory or camera index (default: synthetic crops)")
+    preprocessing.add_argument("--frames", type=int, default=200, help="Number of frames or synthetic crops to use")
+
+    args = parser.parse_args()
+
+    if args.benchmark == "iris" and args.source is None:
+        print_iris(compare_iris_locators(synthetic_eye_frames(args.frames)))
+        return
+    if args.benchmark == "preprocessing" and args.source is None:
+        print_preprocessing(compare_preprocessing(synthetic_eye_frames(args.frames)))
+        return
+
+    frames = read_frames(args.source, args.frames)
+    if not frames:
+        parser.error("No frame could be read from {}".format(args.source))
+
+    if args.benchmark == "pyramid":
+        print_pyramid(benchmark_pyramid(frames, args.scales))
+    elif args.benchmark == "iris":
+        print_iris(compare_iris_locators(recorded_eye_frames(frames)))
+    elif args.benchmark == "preprocessing":
+        print_preprocessing(compare_preprocessing(recorded_eye_frames(frames)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,114 @@
 from __future__ import division
+import queue
+import threading
 import cv2
 from .pupil import Pupil
+from .threshold_search import ThresholdSearch
+from . import preprocessing
 
 
 class Calibration(object):
     """
     This class calibrates the pupil detection algorithm by finding the
     best binarization threshold value for the person and the webcam.
+    The thresholds depend on the preprocessing backend, which is
+    recorded with them.
+
+    The first nb_frames eye frames of each side are evaluated in the frame
+    loop. Afterwards the threshold of each eye is a running average that
+    keeps adapting from eye frames evaluated by a background thread, and
+    that is learned again when the brightness of the frames shifts.
     """
 
-    def __init__(self):
+    def __init__(self, search_mode="histogram", preprocessor=None, adapt_interval=30, brightness_shift=20):
+        """
+        Arguments:
+            search_mode (str): Threshold search mode (see ThresholdSearch)
+            preprocessor (preprocessing.Preprocessor): Backend filtering the eye frames
+            adapt_interval (int): Number of frames of an eye between two background evaluations,
+                None freezes the thresholds once complete, e.g. for reproducible batch runs
+            brightness_shift (float): Change of the average gray level of the frames
+                above which the thresholds are learned again
+        """
         self.nb_frames = 20
-        self.thresholds_left = []
-        self.thresholds_right = []
+        self.adapt_interval = adapt_interval
+        self.brightness_shift = brightness_shift
+        self.preprocessor = preprocessor or preprocessing.DEFAULT
+        self.threshold_search = ThresholdSearch(mode=search_mode, preprocessor=self.preprocessor)
+
+        # Background evaluation of eye frames, started on first use
+        self._lock = threading.Lock()
+        self._jobs = None
+        self._generation = 0
+        self._closed = False
+
+        # Thresholds of the other backends used, restored when switching back
+        self._saved = {}
+
+        # Slow average of the frames brightness and its recent value
+        self.brightness = None
+        self._recent_brightness = None
+        self.lighting_changes = 0
+
+        self.reset()
+
+    @property
+    def preprocessing(self):
+        """Returns the name of the preprocessing backend that produced the thresholds"""
+        return self.preprocessor.name
+
+    def reset(self):
+        """Forgets the thresholds, the calibration starts again"""
+        with self._lock:
+            self._generation += 1
+            self._means = [None, None]
+            self._sums = [0, 0]
+            self._counts = [0, 0]
+            self._frames_since_job = [0, 0]
+            self._complete = False
+
+    def set_preprocessor(self, preprocessor):
+        """Changes the preprocessing backend. The thresholds found with
+        another backend don't apply: the ones of the new backend are restored
+        if it was used before, otherwise they are learned again in the
+        background, the current ones being used in the meantime. The
+        thresholds of the previous backend are kept for when it's used again.
+
+        Argument:
+            preprocessor (preprocessing.Preprocessor): New preprocessing backend
+        """
+        if preprocessor.name == self.preprocessor.name:
+            return
+
+        with self._lock:
+            if self._complete:
+                self._saved[self.preprocessing] = (list(self._means), list(self._sums), list(self._counts))
+            self.preprocessor = preprocessor
+            self.threshold_search.preprocessor = preprocessor
+
+            saved = self._saved.get(preprocessor.name)
+            if saved is not None:
+                self._generation += 1
+                self._means, self._sums, self._counts = [list(values) for values in saved]
+                self._complete = True
+                return
+            if self._complete:
+                self._relearn()
+                return
+
+        self.reset()
+
+    def _relearn(self):
+        """Learns the thresholds again from the next eye frames, keeping the
+        current ones until then. Must be called with the lock held."""
+        # Evaluations queued before are dropped
+        self._generation += 1
+        self._sums = [0, 0]
+        self._counts = [0, 0]
 
     def is_complete(self):
         """Returns true if the calibration is completed"""
-        return len(self.thresholds_left) >= self.nb_frames and len(self.thresholds_right) >= self.nb_frames
+        return self._complete
 
     def threshold(self, side):
         """Returns the threshold value for the given eye.
@@ -24,10 +116,30 @@ class Calibration(object):
         Argument:
             side: Indicates whether it's the left eye (0) or the right eye (1)
         """
-        if side == 0:
-            return int(sum(self.thresholds_left) / len(self.thresholds_left))
-        elif side == 1:
-            return int(sum(self.thresholds_right) / len(self.thresholds_right))
+        if side in (0, 1):
+            return int(self._means[side])
+
+    def _add(self, side, threshold):
+        """Updates the running threshold of an eye, must be called with the lock held.
+        The nb_frames first thresholds are averaged, the next ones are
+        blended in with a weight of 1 / nb_frames. While a complete
+        calibration is learned again, the current threshold is kept until
+        the nb_frames new ones are averaged.
+
+        Arguments:
+            side: Indicates whether it's the left eye (0) or the right eye (1)
+            threshold (int): Best threshold of a new eye frame
+        """
+        self._counts[side] += 1
+        if self._counts[side] <= self.nb_frames:
+            self._sums[side] += threshold
+            if not self._complete or self._counts[side] == self.nb_frames:
+                self._means[side] = self._sums[side] / self._counts[side]
+        else:
+            self._means[side] += (threshold - self._means[side]) / self.nb_frames
+
+        if min(self._counts) >= self.nb_frames:
+            self._complete = True
 
     @staticmethod
     def iris_size(frame):
@@ -44,10 +156,24 @@ class Calibration(object):
         return nb_blacks / nb_pixels
 
     @staticmethod
-    def find_best_threshold(eye_frame):
+    def find_best_threshold(eye_frame, search_mode="histogram", preprocessor=None):
         """Calculates the optimal threshold to binarize the
         frame for the given eye.
 
+        Arguments:
+            eye_frame (numpy.ndarray): Frame of the eye to be analyzed
+            search_mode (str): "histogram" scores every threshold from one pass,
+                "binary" only probes a few thresholds
+            preprocessor (preprocessing.Preprocessor): Backend to use, bilateral filter by default
+        """
+        return ThresholdSearch(mode=search_mode, preprocessor=preprocessor).find_best_threshold(eye_frame)
+
+    @staticmethod
+    def find_best_threshold_reference(eye_frame):
+        """Calculates the optimal threshold by binarizing the frame once
+        per candidate threshold. Slow, kept as a reference for the
+        faster search modes.
+
         Argument:
             eye_frame (numpy.ndarray): Frame of the eye to be analyzed
         """
@@ -69,9 +195,156 @@ class Calibration(object):
             eye_frame (numpy.ndarray): Frame of the eye
             side: Indicates whether it's the left eye (0) or the right eye (1)
         """
-        threshold = self.find_best_threshold(eye_frame)
+        threshold = self.threshold_search.find_best_threshold(eye_frame)
+
+        if side in (0, 1):
+            with self._lock:
+                self._add(side, threshold)
+
+    def adapt(self, eye_frame, side):
+        """Sends the eye frame to the background evaluation when the
+        threshold of the eye is due for an update. Never blocks: the frame
+        is dropped if the background thread is busy.
+
+        Arguments:
+            eye_frame (numpy.ndarray): Frame of the eye
+            side: Indicates whether it's the left eye (0) or the right eye (1)
+        """
+        if side not in (0, 1) or self.adapt_interval is None or self._closed:
+            return
+
+        self._frames_since_job[side] += 1
+        relearning = self._counts[side] < self.nb_frames
+        if not relearning and self._frames_since_job[side] < self.adapt_interval:
+            return
+
+        with self._lock:
+            generation = self._generation
+        try:
+            self._queue().put_nowait((eye_frame.copy(), side, generation))
+        except queue.Full:
+            return
+        self._frames_since_job[side] = 0
+
+    def _queue(self):
+        """Returns the jobs queue of the background thread, starting it on first use"""
+        if self._jobs is None:
+            self._jobs = queue.Queue(maxsize=2)
+            worker = threading.Thread(target=self._work, name="calibration", daemon=True)
+            worker.start()
+        return self._jobs
+
+    def _work(self):
+        """Background thread evaluating the eye frames sent by adapt()"""
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            eye_frame, side, generation = job
+            try:
+                threshold = self.threshold_search.find_best_threshold(eye_frame)
+            except ZeroDivisionError:
+                continue
+
+            with self._lock:
+                # Thresholds found before a reset are dropped
+                if generation == self._generation:
+                    self._add(side, threshold)
+
+    def close(self):
+        """Stops the background evaluation thread, the thresholds don't adapt anymore"""
+        self._closed = True
+        if self._jobs is not None:
+            # Waits for a free slot, the thread drains the queue
+            self._jobs.put(None)
+
+    def observe(self, frame):
+        """Follows the average brightness of the frames. When it shifts,
+        the thresholds are learned again from the next eye frames, the
+        current ones being used in the meantime.
+
+        Argument:
+            frame (numpy.ndarray): Grayscale frame
+
+        Returns:
+            True if a lighting change was detected
+        """
+        if self.adapt_interval is None:
+            return False
+
+        brightness = float(frame[::8, ::8].mean())
+        if self.brightness is None:
+            self.brightness = self._recent_brightness = brightness
+            return False
+
+        self._recent_brightness += 0.3 * (brightness - self._recent_brightness)
+
+        if abs(self._recent_brightness - self.brightness) <= self.brightness_shift:
+            # Slow drifts are followed by the periodic background evaluations
+            self.brightness += 0.01 * (self._recent_brightness - self.brightness)
+            return False
+
+        self.brightness = self._recent_brightness = brightness
+        if not self._complete:
+            return False
+
+        with self._lock:
+            self._relearn()
+            self.lighting_changes += 1
+        return True
+
+    def to_dict(self, preprocessing=None):
+        """Returns the thresholds and the settings they depend on,
+        to restore them with load_dict()
+
+        Argument:
+            preprocessing (str): Backend of the thresholds, the current one by default
+        """
+        if preprocessing is not None and preprocessing != self.preprocessing:
+            saved = self._saved.get(preprocessing)
+            return {
+                'preprocessing': preprocessing,
+                'thresholds': saved[0] if saved is not None else None,
+                'brightness': self.brightness,
+            }
+
+        return {
+            'preprocessing': self.preprocessing,
+            'thresholds': [self._means[0], self._means[1]] if self._complete else None,
+            'brightness': self.brightness,
+        }
+
+    def load_dict(self, data):
+        """Restores thresholds saved by to_dict(), the calibration is then complete
+
+        Argument:
+            data (dict): Saved calibration
+
+        Returns:
+            False if the data can't be used with the current preprocessing backend
+        """
+        thresholds = data.get('thresholds') if data else None
+        if not thresholds or data.get('preprocessing') != self.preprocessing:
+            return False
+
+        self.reset()
+        with self._lock:
+            # The thresholds kept for the other backends belong to another session
+            self._saved = {}
+            self._means = [float(thresholds[0]), float(thresholds[1])]
+            self._sums = [mean * self.nb_frames for mean in self._means]
+            self._counts = [self.nb_frames, self.nb_frames]
+            self._complete = True
+        self.brightness = self._recent_brightness = data.get('brightness')
+        return True
 
-        if side == 0:
-            self.thresholds_left.append(threshold)
-        elif side == 1:
-            self.thresholds_right.append(threshold)
+    def stats(self):
+        """Returns the current thresholds and the lighting changes detected"""
+        return {
+            'complete': self._complete,
+            'preprocessing': self.preprocessing,
+            'thresholds': [self._means[0], self._means[1]],
+            'relearning': self._complete and min(self._counts) < self.nb_frames,
+            'brightness': self.brightness,
+            'lighting_changes': self.lighting_changes,
+        }
@@ -2,6 +2,7 @@ import math
 import numpy as np
 import cv2
 from .pupil import Pupil
+from . import landmarks as landmarks_utils
 
 
 class Eye(object):
@@ -10,28 +11,28 @@ class Eye(object):
     initiates the pupil detection.
     """
 
-    LEFT_EYE_POINTS = [36, 37, 38, 39, 40, 41]
-    RIGHT_EYE_POINTS = [42, 43, 44, 45, 46, 47]
+    LEFT_EYE_POINTS = np.array([36, 37, 38, 39, 40, 41])
+    RIGHT_EYE_POINTS = np.array([42, 43, 44, 45, 46, 47])
 
-    def __init__(self, original_frame, landmarks, side, calibration):
+    def __init__(self, original_frame, landmarks, side, calibration, iris_locator="contours"):
         self.frame = None
         self.origin = None
         self.center = None
         self.pupil = None
         self.landmark_points = None
 
-        self._analyze(original_frame, landmarks, side, calibration)
+        self._analyze(original_frame, landmarks, side, calibration, iris_locator)
 
     @staticmethod
     def _middle_point(p1, p2):
         """Returns the middle point (x,y) between two points
 
         Arguments:
-            p1 (dlib.point): First point
-            p2 (dlib.point): Second point
+            p1 (numpy.ndarray): First point
+            p2 (numpy.ndarray): Second point
         """
-        x = int((p1.x + p2.x) / 2)
-        y = int((p1.y + p2.y) / 2)
+        x = int((p1[0] + p2[0]) / 2)
+        y = int((p1[1] + p2[1]) / 2)
         return (x, y)
 
     def _isolate(self, frame, landmarks, points):
@@ -39,28 +40,31 @@ class Eye(object):
 
         Arguments:
             frame (numpy.ndarray): Frame containing the face
-            landmarks (dlib.full_object_detection): Facial landmarks for the face region
-            points (list): Points of an eye (from the 68 Multi-PIE landmarks)
+            landmarks (numpy.ndarray): (68, 2) array of facial landmarks for the face region
+            points (numpy.ndarray): Points of an eye (from the 68 Multi-PIE landmarks)
         """
-        region = np.array([(landmarks.part(point).x, landmarks.part(point).y) for point in points])
-        region = region.astype(np.int32)
+        region = landmarks[points]
         self.landmark_points = region
 
-        # Applying a mask to get only the eye
-        height, width = frame.shape[:2]
-        black_frame = np.zeros((height, width), np.uint8)
-        mask = np.full((height, width), 255, np.uint8)
-        cv2.fillPoly(mask, [region], (0, 0, 0))
-        eye = cv2.bitwise_not(black_frame, frame.copy(), mask=mask)
-
         # Cropping on the eye
         margin = 5
-        min_x = np.min(region[:, 0]) - margin
-        max_x = np.max(region[:, 0]) + margin
-        min_y = np.min(region[:, 1]) - margin
-        max_y = np.max(region[:, 1]) + margin
+        min_x, min_y, max_x, max_y = landmarks_utils.bounding_box(region)
+        min_x, min_y = min_x - margin, min_y - margin
+        max_x, max_y = max_x + margin, max_y + margin
 
-        self.frame = eye[min_y:max_y, min_x:max_x]
+        # Applying a mask to get only the eye, inside the crop only
+        height, width = frame.shape[:2]
+        crop_x = slice(min_x, max_x).indices(width)[0]
+        crop_y = slice(min_y, max_y).indices(height)[0]
+        roi = frame[min_y:max_y, min_x:max_x]
+
+        if roi.size:
+            black_frame = np.zeros(roi.shape[:2], np.uint8)
+            mask = np.full(roi.shape[:2], 255, np.uint8)
+            cv2.fillPoly(mask, [region], (0, 0, 0), offset=(-crop_x, -crop_y))
+            self.frame = cv2.bitwise_not(black_frame, roi.copy(), mask=mask)
+        else:
+            self.frame = roi.copy()
         self.origin = (min_x, min_y)
 
         height, width = self.frame.shape[:2]
@@ -71,16 +75,16 @@ class Eye(object):
         It's the division of the width of the eye, by its height.
 
         Arguments:
-            landmarks (dlib.full_object_detection): Facial landmarks for the face region
-            points (list): Points of an eye (from the 68 Multi-PIE landmarks)
+            landmarks (numpy.ndarray): (68, 2) array of facial landmarks for the face region
+            points (numpy.ndarray): Points of an eye (from the 68 Multi-PIE landmarks)
 
         Returns:
             The computed ratio
         """
-        left = (landmarks.part(points[0]).x, landmarks.part(points[0]).y)
-        right = (landmarks.part(points[3]).x, landmarks.part(points[3]).y)
-        top = self._middle_point(landmarks.part(points[1]), landmarks.part(points[2]))
-        bottom = self._middle_point(landmarks.part(points[5]), landmarks.part(points[4]))
+        left = landmarks[points[0]]
+        right = landmarks[points[3]]
+        top = self._middle_point(landmarks[points[1]], landmarks[points[2]])
+        bottom = self._middle_point(landmarks[points[5]], landmarks[points[4]])
 
         eye_width = math.hypot((left[0] - right[0]), (left[1] - right[1]))
         eye_height = math.hypot((top[0] - bottom[0]), (top[1] - bottom[1]))
@@ -92,15 +96,17 @@ class Eye(object):
 
         return ratio
 
-    def _analyze(self, original_frame, landmarks, side, calibration):
+    def _analyze(self, original_frame, landmarks, side, calibration, iris_locator="contours"):
         """Detects and isolates the eye in a new frame, sends data to the calibration
         and initializes Pupil object.
 
         Arguments:
             original_frame (numpy.ndarray): Frame passed by the user
-            landmarks (dlib.full_object_detection): Facial landmarks for the face region
+            landmarks (numpy.ndarray): (68, 2) array of facial landmarks for the face region,
+                a dlib.full_object_detection is converted
             side: Indicates whether it's the left eye (0) or the right eye (1)
             calibration (calibration.Calibration): Manages the binarization threshold value
+            iris_locator (str): Method used by Pupil to locate the iris
         """
         if side == 0:
             points = self.LEFT_EYE_POINTS
@@ -109,11 +115,16 @@ class Eye(object):
         else:
             return
 
+        if not isinstance(landmarks, np.ndarray):
+            landmarks = landmarks_utils.to_array(landmarks)
+
         self.blinking = self._blinking_ratio(landmarks, points)
         self._isolate(original_frame, landmarks, points)
 
         if not calibration.is_complete():
             calibration.evaluate(self.frame, side)
+        else:
+            calibration.adapt(self.frame, side)
 
         threshold = calibration.threshold(side)
-        self.pupil = Pupil(self.frame, threshold)
+        self.pupil = Pupil(self.frame, threshold, iris_locator, calibration.preprocessor)
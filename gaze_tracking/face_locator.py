@@ -0,0 +1,226 @@
+from __future__ import division
+import cv2
+import dlib
+from . import models
+from .landmarks import bounding_box
+
+
+class FaceLocator(object):
+    """
+    This class finds the face region that is given to the landmark predictor.
+    In "detect" mode the HOG face detector runs on every frame. In "track"
+    mode it only runs on startup, when tracking is lost or every
+    `detect_interval` frames, and the face is followed by a cheap tracker
+    in between.
+
+    With a `detection_scale` above 1, the detector runs on a copy of the
+    frame downscaled by that factor and the face region is scaled back, so
+    the landmark predictor still works on the full resolution frame.
+    """
+
+    MODES = ("detect", "track")
+    TRACKERS = ("landmarks", "correlation")
+
+    def __init__(self, detector=None, mode="detect", detect_interval=10, tracker="landmarks",
+                 margin=0.1, max_lost_frames=3, min_tracker_confidence=7.0, min_landmark_fill=0.3,
+                 detection_scale=1):
+        if mode not in self.MODES:
+            raise ValueError("Unknown face tracking mode: {}".format(mode))
+        if tracker not in self.TRACKERS:
+            raise ValueError("Unknown face tracker: {}".format(tracker))
+        if detection_scale < 1:
+            raise ValueError("Detection scale must be >= 1, got {}".format(detection_scale))
+
+        self._detector = detector
+        self.mode = mode
+        self.detect_interval = detect_interval
+        self.tracker = tracker
+        self.margin = margin
+        self.max_lost_frames = max_lost_frames
+        self.min_tracker_confidence = min_tracker_confidence
+        self.min_landmark_fill = min_landmark_fill
+        self.detection_scale = detection_scale
+
+        self.face = None
+        self.confidence = None
+        self._correlation_tracker = None
+        self._frames_since_detection = 0
+        self._lost_frames = 0
+
+        self.frames = 0
+        self.tracked_frames = 0
+        self.detections = 0
+        self.detections_on_startup = 0
+        self.detections_on_loss = 0
+        self.detections_on_interval = 0
+
+    @property
+    def detector(self):
+        """Face detector given at construction, or the shared one"""
+        if self._detector is not None:
+            return self._detector
+        return models.registry.get("face_detector")
+
+    def reset(self):
+        """Forgets the followed face, the next frame runs a full detection"""
+        self.face = None
+        self.confidence = None
+        self._correlation_tracker = None
+        self._lost_frames = 0
+
+    def detect_faces(self, frame):
+        """Runs the face detector, on a downscaled copy of the frame
+        if detection_scale is above 1
+
+        Argument:
+            frame (numpy.ndarray): Grayscale frame
+
+        Returns:
+            The face regions (dlib.rectangle) in full resolution coordinates
+            and their detection scores
+        """
+        scale = self.detection_scale
+        if scale == 1:
+            faces, scores, _ = self.detector.run(frame, 0, 0.0)
+            return list(faces), list(scores)
+
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (int(width / scale), int(height / scale)), interpolation=cv2.INTER_AREA)
+        faces, scores, _ = self.detector.run(small, 0, 0.0)
+        faces = [dlib.rectangle(int(face.left() * scale), int(face.top() * scale),
+                                int(face.right() * scale), int(face.bottom() * scale))
+                 for face in faces]
+        return faces, list(scores)
+
+    def detect(self, frame, reason="frame"):
+        """Runs the face detector on the whole frame and starts following
+        the first face found
+
+        Arguments:
+            frame (numpy.ndarray): Grayscale frame
+            reason (str): Why the detection runs ("frame", "startup", "lost" or "interval")
+
+        Returns:
+            The face region (dlib.rectangle) or None
+        """
+        faces, scores = self.detect_faces(frame)
+
+        self.detections += 1
+        if reason == "lost":
+            self.detections_on_loss += 1
+        elif reason == "interval":
+            self.detections_on_interval += 1
+        elif reason == "startup":
+            self.detections_on_startup += 1
+
+        self._frames_since_detection = 0
+        self._lost_frames = 0
+        self.face = faces[0] if faces else None
+        self.confidence = scores[0] if scores else None
+
+        if self.face is not None and self.mode == "track" and self.tracker == "correlation":
+            self._correlation_tracker = dlib.correlation_tracker()
+            self._correlation_tracker.start_track(frame, self.face)
+
+        return self.face
+
+    def _track(self, frame):
+        """Follows the face from the previous frame without running the detector
+
+        Argument:
+            frame (numpy.ndarray): Grayscale frame
+
+        Returns:
+            The face region (dlib.rectangle) or None if tracking is lost
+        """
+        if self.tracker == "correlation":
+            confidence = self._correlation_tracker.update(frame)
+            if confidence < self.min_tracker_confidence:
+                return None
+            self.face = self._correlation_tracker.get_position()
+            self.face = dlib.rectangle(int(self.face.left()), int(self.face.top()),
+                                       int(self.face.right()), int(self.face.bottom()))
+        return self.face
+
+    def locate(self, frame):
+        """Returns the face region to analyze in the given frame
+
+        Argument:
+            frame (numpy.ndarray): Grayscale frame
+
+        Returns:
+            The face region (dlib.rectangle) or None if no face is found
+        """
+        self.frames += 1
+
+        if self.mode == "detect":
+            return self.detect(frame)
+
+        if self.face is None:
+            reason = "startup" if self.detections == 0 else "lost"
+            return self.detect(frame, reason)
+
+        if self._frames_since_detection >= self.detect_interval:
+            return self.detect(frame, "interval")
+
+        face = self._track(frame)
+        if face is None:
+            return self.detect(frame, "lost")
+
+        self.tracked_frames += 1
+        self._frames_since_detection += 1
+        return face
+
+    def confirm(self, frame, landmarks, pupils_located):
+        """Checks the result of the analysis of the followed face and
+        decides whether the tracking is still valid.
+
+        Arguments:
+            frame (numpy.ndarray): Grayscale frame
+            landmarks (numpy.ndarray): (68, 2) array of facial landmarks for the face region
+            pupils_located (bool): Whether both pupils were found
+
+        Returns:
+            False if the face is considered lost
+        """
+        if self.mode == "detect" or self.face is None:
+            return True
+
+        left, top, right, bottom = bounding_box(landmarks)
+
+        # Landmarks collapsing inside the region means the face isn't there anymore
+        face_area = max(self.face.width() * self.face.height(), 1)
+        landmark_area = (right - left) * (bottom - top)
+        if landmark_area / face_area < self.min_landmark_fill:
+            self.reset()
+            return False
+
+        self._lost_frames = 0 if pupils_located else self._lost_frames + 1
+        if self._lost_frames >= self.max_lost_frames:
+            self.reset()
+            return False
+
+        if self.tracker == "landmarks":
+            height, width = frame.shape[:2]
+            margin_x = int((right - left) * self.margin)
+            margin_y = int((bottom - top) * self.margin)
+            self.face = dlib.rectangle(max(left - margin_x, 0), max(top - margin_y, 0),
+                                       min(right + margin_x, width - 1), min(bottom + margin_y, height - 1))
+
+        return True
+
+    def stats(self):
+        """Returns the counters of the face localization"""
+        return {
+            'mode': self.mode,
+            'tracker': self.tracker,
+            'detect_interval': self.detect_interval,
+            'detection_scale': self.detection_scale,
+            'frames': self.frames,
+            'tracked_frames': self.tracked_frames,
+            'detections': self.detections,
+            'detections_on_startup': self.detections_on_startup,
+            'detections_on_loss': self.detections_on_loss,
+            'detections_on_interval': self.detections_on_interval,
+            'tracking': self.face is not None,
+        }
@@ -0,0 +1,129 @@
+from __future__ import division
+
+
+class GazeSample(object):
+    """
+    This class holds the result of the analysis of one frame. Every value
+    is computed once when the frame is analyzed, then the sample can't be
+    modified anymore and can be passed around cheaply.
+    """
+
+    __slots__ = (
+        "timestamp", "processing_time", "frame_index", "face_detected", "confidence",
+        "pupils_located", "pupil_left", "pupil_right", "pupil_center",
+        "horizontal_ratio", "vertical_ratio", "blinking_ratio",
+    )
+
+    BLINKING_THRESHOLD = 3.8
+
+    def __init__(self, timestamp, processing_time=0.0, frame_index=0, face_detected=False, confidence=None,
+                 pupil_left=None, pupil_right=None, horizontal_ratio=None, vertical_ratio=None,
+                 blinking_ratio=None):
+        located = pupil_left is not None and pupil_right is not None
+        if located:
+            pupil_center = (int((pupil_left[0] + pupil_right[0]) / 2), int((pupil_left[1] + pupil_right[1]) / 2))
+        else:
+            pupil_center = None
+
+        values = {
+            "timestamp": timestamp,
+            "processing_time": processing_time,
+            "frame_index": frame_index,
+            "face_detected": face_detected,
+            "confidence": confidence,
+            "pupils_located": located,
+            "pupil_left": pupil_left,
+            "pupil_right": pupil_right,
+            "pupil_center": pupil_center,
+            "horizontal_ratio": horizontal_ratio,
+            "vertical_ratio": vertical_ratio,
+            "blinking_ratio": blinking_ratio,
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("GazeSample is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("GazeSample is immutable")
+
+    def __repr__(self):
+        return "GazeSample(frame_index={}, pupils_located={}, horizontal_ratio={}, vertical_ratio={})".format(
+            self.frame_index, self.pupils_located, self.horizontal_ratio, self.vertical_ratio)
+
+    @classmethod
+    def from_eyes(cls, eye_left, eye_right, timestamp, processing_time=0.0, frame_index=0, confidence=None):
+        """Computes a sample from the Eye objects of a frame
+
+        Arguments:
+            eye_left (eye.Eye): Left eye, or None if no face was found
+            eye_right (eye.Eye): Right eye, or None if no face was found
+            timestamp (float): Time of the frame (seconds)
+            processing_time (float): Time spent analyzing the frame (seconds)
+            frame_index (int): Number of the frame since the tracker started
+            confidence (float): Score of the face detection
+        """
+        face_detected = eye_left is not None and eye_right is not None
+        if not face_detected or not (cls._located(eye_left) and cls._located(eye_right)):
+            return cls(timestamp, processing_time, frame_index, face_detected, confidence)
+
+        pupil_left = (eye_left.origin[0] + eye_left.pupil.x, eye_left.origin[1] + eye_left.pupil.y)
+        pupil_right = (eye_right.origin[0] + eye_right.pupil.x, eye_right.origin[1] + eye_right.pupil.y)
+
+        try:
+            horizontal_ratio = (eye_left.pupil.x / (eye_left.center[0] * 2 - 10) +
+                                eye_right.pupil.x / (eye_right.center[0] * 2 - 10)) / 2
+            vertical_ratio = (eye_left.pupil.y / (eye_left.center[1] * 2 - 10) +
+                              eye_right.pupil.y / (eye_right.center[1] * 2 - 10)) / 2
+        except ZeroDivisionError:
+            horizontal_ratio = None
+            vertical_ratio = None
+
+        if eye_left.blinking is not None and eye_right.blinking is not None:
+            blinking_ratio = (eye_left.blinking + eye_right.blinking) / 2
+        else:
+            blinking_ratio = None
+
+        return cls(timestamp, processing_time, frame_index, face_detected, confidence,
+                   pupil_left, pupil_right, horizontal_ratio, vertical_ratio, blinking_ratio)
+
+    @staticmethod
+    def _located(eye):
+        """Check that the pupil of the eye has been located"""
+        try:
+            int(eye.pupil.x)
+            int(eye.pupil.y)
+            return True
+        except Exception:
+            return False
+
+    @property
+    def is_blinking(self):
+        """Returns true if the eyes are closed, None if the pupils aren't located"""
+        if self.pupils_located and self.blinking_ratio is not None:
+            return self.blinking_ratio > self.BLINKING_THRESHOLD
+
+    def to_dict(self):
+        """Returns the sample as a JSON serializable dictionary"""
+        return {
+            'timestamp': self.timestamp,
+            'processing_time': self.processing_time,
+            'frame_index': self.frame_index,
+            'face_detected': self.face_detected,
+            'confidence': self.confidence,
+            'pupils_located': self.pupils_located,
+            'pupil_left': _to_int_pair(self.pupil_left),
+            'pupil_right': _to_int_pair(self.pupil_right),
+            'pupil_center': _to_int_pair(self.pupil_center),
+            'horizontal_ratio': self.horizontal_ratio,
+            'vertical_ratio': self.vertical_ratio,
+            'blinking_ratio': self.blinking_ratio,
+        }
+
+
+def _to_int_pair(point):
+    """Converts numpy coordinates to plain integers"""
+    if point is None:
+        return None
+    return (int(point[0]), int(point[1]))
@@ -1,9 +1,13 @@
 from __future__ import division
-import os
+import time
 import cv2
-import dlib
+from . import models
+from . import landmarks as landmarks_utils
 from .eye import Eye
 from .calibration import Calibration
+from .face_locator import FaceLocator
+from .gaze_sample import GazeSample
+from .preprocessing import Preprocessor
 
 
 class GazeTracking(object):
@@ -13,77 +17,131 @@ class GazeTracking(object):
     and pupils and allows to know if the eyes are open or closed
     """
 
-    def __init__(self):
+    def __init__(self, tracking_mode="detect", detect_interval=10, detection_scale=1, iris_locator="contours",
+                 preprocessing="bilateral", preprocessing_downscale=1, face_tracker="landmarks",
+                 max_lost_frames=3, min_tracker_confidence=7.0, min_landmark_fill=0.3):
+        """
+        Arguments:
+            tracking_mode (str): "detect" runs the face detector on every frame,
+                "track" follows the face between detections (see FaceLocator)
+            detect_interval (int): In "track" mode, number of frames between two detections
+            face_tracker (str): In "track" mode, "landmarks" or "correlation" follows the face
+            max_lost_frames (int): In "track" mode, consecutive frames without pupils
+                after which the face is detected again
+            min_tracker_confidence (float): Correlation tracker confidence under which
+                the face is detected again
+            min_landmark_fill (float): Share of the face region the landmarks must cover,
+                under it the face is detected again
+            detection_scale (int): The face detector runs on the frame downscaled by this
+                factor, landmarks and pupils are still computed in full resolution
+            iris_locator (str): "contours", "components" or "moments" (see Pupil)
+            preprocessing (str): Backend filtering the eye frames (see preprocessing.BACKENDS)
+            preprocessing_downscale (int): The eye frames are filtered downscaled by this factor
+        """
         self.frame = None
         self.eye_left = None
         self.eye_right = None
-        self.calibration = Calibration()
+        # landmarks is the (68, 2) array of facial landmarks of the last frame
+        self.landmarks = None
+        self.calibration = Calibration(preprocessor=Preprocessor(preprocessing, preprocessing_downscale))
+        self.iris_locator = iris_locator
+
+        # sample holds the results of the last analyzed frame
+        self.sample = None
+        self.frame_index = 0
 
-        # _face_detector is used to detect faces
-        self._face_detector = dlib.get_frontal_face_detector()
+        # stage_times holds the seconds spent in each stage of the last analysis
+        self.stage_times = {}
 
-        # _predictor is used to get facial landmarks of a given face
-        cwd = os.path.abspath(os.path.dirname(__file__))
-        model_path = os.path.abspath(os.path.join(cwd, "trained_models/shape_predictor_68_face_landmarks.dat"))
-        self._predictor = dlib.shape_predictor(model_path)
+        # face_locator decides when the face detector has to run
+        self.face_locator = FaceLocator(None, tracking_mode, detect_interval, tracker=face_tracker,
+                                        max_lost_frames=max_lost_frames,
+                                        min_tracker_confidence=min_tracker_confidence,
+                                        min_landmark_fill=min_landmark_fill,
+                                        detection_scale=detection_scale)
+
+    @property
+    def _face_detector(self):
+        """Face detector, shared by every instance and loaded on first use"""
+        return models.registry.get("face_detector")
+
+    @property
+    def _predictor(self):
+        """Facial landmarks predictor, shared by every instance and loaded on first use"""
+        return models.registry.get("shape_predictor")
 
     @property
     def pupils_located(self):
         """Check that the pupils have been located"""
-        try:
-            int(self.eye_left.pupil.x)
-            int(self.eye_left.pupil.y)
-            int(self.eye_right.pupil.x)
-            int(self.eye_right.pupil.y)
-            return True
-        except Exception:
-            return False
+        return self.sample is not None and self.sample.pupils_located
 
     def _analyze(self):
-        """Detects the face and initialize Eye objects"""
+        """Detects the face and initialize Eye objects, timing each stage"""
+        started = time.perf_counter()
         frame = cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY)
-        faces = self._face_detector(frame)
-
-        try:
-            landmarks = self._predictor(frame, faces[0])
-            self.eye_left = Eye(frame, landmarks, 0, self.calibration)
-            self.eye_right = Eye(frame, landmarks, 1, self.calibration)
+        self.calibration.observe(frame)
+        face = self.face_locator.locate(frame)
+        located = time.perf_counter()
+        self.stage_times = {"detection": located - started, "landmarks": 0.0, "pupils": 0.0}
 
-        except IndexError:
+        if face is None:
             self.eye_left = None
             self.eye_right = None
-
-    def refresh(self, frame):
+            self.landmarks = None
+            return None
+
+        self.landmarks = landmarks_utils.to_array(self._predictor(frame, face))
+        predicted = time.perf_counter()
+        self.eye_left = Eye(frame, self.landmarks, 0, self.calibration, self.iris_locator)
+        self.eye_right = Eye(frame, self.landmarks, 1, self.calibration, self.iris_locator)
+        self.stage_times["landmarks"] = predicted - located
+        self.stage_times["pupils"] = time.perf_counter() - predicted
+        return self.landmarks
+
+    def refresh(self, frame, timestamp=None):
         """Refreshes the frame and analyzes it.
 
         Arguments:
             frame (numpy.ndarray): The frame to analyze
+            timestamp (float): Capture time of the frame, defaults to now
+
+        Returns:
+            The GazeSample of the frame
         """
+        start = time.time()
         self.frame = frame
-        self._analyze()
+        self.frame_index += 1
+        face_landmarks = self._analyze()
+
+        self.sample = GazeSample.from_eyes(
+            self.eye_left, self.eye_right,
+            timestamp=start if timestamp is None else timestamp,
+            processing_time=time.time() - start,
+            frame_index=self.frame_index,
+            confidence=self.face_locator.confidence,
+        )
+        if face_landmarks is not None:
+            self.face_locator.confirm(self.frame, face_landmarks, self.sample.pupils_located)
+        return self.sample
+
+    def close(self):
+        """Stops the background threshold adaptation of the calibration"""
+        self.calibration.close()
 
     def pupil_left_coords(self):
         """Returns the coordinates of the left pupil"""
         if self.pupils_located:
-            x = self.eye_left.origin[0] + self.eye_left.pupil.x
-            y = self.eye_left.origin[1] + self.eye_left.pupil.y
-            return (x, y)
+            return self.sample.pupil_left
 
     def pupil_right_coords(self):
         """Returns the coordinates of the right pupil"""
         if self.pupils_located:
-            x = self.eye_right.origin[0] + self.eye_right.pupil.x
-            y = self.eye_right.origin[1] + self.eye_right.pupil.y
-            return (x, y)
+            return self.sample.pupil_right
     
     def pupil_center_coords(self):
         """Returns the coordinates of the center point between both pupils"""
         if self.pupils_located:
-            left = self.pupil_left_coords()
-            right = self.pupil_right_coords()
-            center_x = int((left[0] + right[0]) / 2)
-            center_y = int((left[1] + right[1]) / 2)
-            return (center_x, center_y)
+            return self.sample.pupil_center
 
     def horizontal_ratio(self):
         """Returns a number between 0.0 and 1.0 that indicates the
@@ -91,9 +149,7 @@ class GazeTracking(object):
         the center is 0.5 and the extreme left is 1.0
         """
         if self.pupils_located:
-            pupil_left = self.eye_left.pupil.x / (self.eye_left.center[0] * 2 - 10)
-            pupil_right = self.eye_right.pupil.x / (self.eye_right.center[0] * 2 - 10)
-            return (pupil_left + pupil_right) / 2
+            return self.sample.horizontal_ratio
 
     def vertical_ratio(self):
         """Returns a number between 0.0 and 1.0 that indicates the
@@ -101,19 +157,17 @@ class GazeTracking(object):
         the center is 0.5 and the extreme bottom is 1.0
         """
         if self.pupils_located:
-            pupil_left = self.eye_left.pupil.y / (self.eye_left.center[1] * 2 - 10)
-            pupil_right = self.eye_right.pupil.y / (self.eye_right.center[1] * 2 - 10)
-            return (pupil_left + pupil_right) / 2
+            return self.sample.vertical_ratio
 
     def is_right(self):
         """Returns true if the user is looking to the right"""
-        if self.pupils_located:
-            return self.horizontal_ratio() <= 0.35
+        if self.pupils_located and self.sample.horizontal_ratio is not None:
+            return self.sample.horizontal_ratio <= 0.35
 
     def is_left(self):
         """Returns true if the user is looking to the left"""
-        if self.pupils_located:
-            return self.horizontal_ratio() >= 0.65
+        if self.pupils_located and self.sample.horizontal_ratio is not None:
+            return self.sample.horizontal_ratio >= 0.65
 
     def is_center(self):
         """Returns true if the user is looking to the center"""
@@ -123,8 +177,7 @@ class GazeTracking(object):
     def is_blinking(self):
         """Returns true if the user closes his eyes"""
         if self.pupils_located:
-            blinking_ratio = (self.eye_left.blinking + self.eye_right.blinking) / 2
-            return blinking_ratio > 3.8
+            return self.sample.is_blinking
 
     def annotated_frame(self):
         """Returns the main frame with pupils highlighted"""
@@ -0,0 +1,25 @@
+import numpy as np
+
+
+def to_array(shape):
+    """Converts the facial landmarks found by dlib to a NumPy array, so that
+    the rest of the pipeline doesn't have to call shape.part() point by point
+
+    Argument:
+        shape (dlib.full_object_detection): Facial landmarks for the face region
+
+    Returns:
+        A (68, 2) int32 array of (x, y) coordinates
+    """
+    return np.array([(point.x, point.y) for point in shape.parts()], np.int32).reshape(-1, 2)
+
+
+def bounding_box(points):
+    """Returns the bounding box (left, top, right, bottom) of landmark points
+
+    Argument:
+        points (numpy.ndarray): (n, 2) array of landmark coordinates
+    """
+    left, top = points.min(axis=0)
+    right, bottom = points.max(axis=0)
+    return int(left), int(top), int(right), int(bottom)
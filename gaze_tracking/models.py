@@ -0,0 +1,104 @@
+from __future__ import division
+import os
+import sys
+import threading
+import time
+import dlib
+
+MODELS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "trained_models"))
+SHAPE_PREDICTOR_PATH = os.path.join(MODELS_DIR, "shape_predictor_68_face_landmarks.dat")
+
+
+def _resident_memory():
+    """Returns the resident memory of the process in bytes, or None if unknown"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Peak resident memory: kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class ModelRegistry(object):
+    """
+    This class loads each model once per process, on first use, and shares
+    it between every GazeTracking instance. Preloading the models in a
+    parent process lets fork-based workers share their memory pages.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader):
+        """Declares a model without loading it
+
+        Arguments:
+            name (str): Name of the model
+            loader (function): Returns the loaded model
+        """
+        self._loaders[name] = loader
+
+    def get(self, name):
+        """Returns the model, loading it if it's the first use
+
+        Argument:
+            name (str): Name of the model
+        """
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            if name not in self._models:
+                if name not in self._loaders:
+                    raise KeyError("Unknown model: {}".format(name))
+
+                memory_before = _resident_memory()
+                start = time.time()
+                self._models[name] = self._loaders[name]()
+                memory_after = _resident_memory()
+
+                self._stats[name] = {
+                    'load_time': time.time() - start,
+                    'resident_memory': (memory_after - memory_before
+                                        if memory_before is not None and memory_after is not None else None),
+                    'pid': os.getpid(),
+                }
+            return self._models[name]
+
+    def preload(self, *names):
+        """Loads the given models now, or every registered model
+
+        Arguments:
+            names (str): Names of the models
+        """
+        for name in names or list(self._loaders):
+            self.get(name)
+
+    def is_loaded(self, name):
+        """Returns true if the model is already loaded"""
+        return name in self._models
+
+    def stats(self):
+        """Returns the load time (seconds) and the resident memory taken
+        by the loading (bytes) of each model"""
+        return {
+            name: dict(self._stats.get(name, {}), loaded=name in self._models)
+            for name in self._loaders
+        }
+
+
+# Registry shared by the whole process
+registry = ModelRegistry()
+registry.register("face_detector", dlib.get_frontal_face_detector)
+registry.register("shape_predictor", lambda: dlib.shape_predictor(SHAPE_PREDICTOR_PATH))
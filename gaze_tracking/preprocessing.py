@@ -0,0 +1,98 @@
+from __future__ import division
+import numpy as np
+import cv2
+
+# Preprocessing backends, by name. Each backend takes a grayscale eye frame
+# and returns a smoothed frame of the same size. The erosion that follows is
+# common to every backend.
+BACKENDS = {}
+
+_KERNEL = np.ones((3, 3), np.uint8)
+
+
+def register_backend(name):
+    """Decorator adding a function to the preprocessing backends
+
+    Argument:
+        name (str): Name used to select the backend
+    """
+    def decorator(function):
+        BACKENDS[name] = function
+        return function
+    return decorator
+
+
+@register_backend("bilateral")
+def bilateral(eye_frame):
+    """Edge preserving smoothing, the original and most expensive backend"""
+    return cv2.bilateralFilter(eye_frame, 10, 15, 15)
+
+
+@register_backend("gaussian")
+def gaussian(eye_frame):
+    """Gaussian smoothing"""
+    return cv2.GaussianBlur(eye_frame, (5, 5), 0)
+
+
+@register_backend("median")
+def median(eye_frame):
+    """Median smoothing, removes reflections on the iris"""
+    return cv2.medianBlur(eye_frame, 5)
+
+
+@register_backend("box")
+def box(eye_frame):
+    """Box smoothing, then a morphological opening removing the small bright spots"""
+    new_frame = cv2.blur(eye_frame, (3, 3))
+    return cv2.morphologyEx(new_frame, cv2.MORPH_OPEN, _KERNEL)
+
+
+class Preprocessor(object):
+    """
+    This class smooths an eye frame with a preprocessing backend, optionally
+    on a copy downscaled by an integer factor, then erodes it. The erosion
+    always runs at full size so that the result has the size of the given
+    frame and the pupil coordinates don't change.
+    """
+
+    def __init__(self, backend="bilateral", downscale=1):
+        if backend not in BACKENDS:
+            raise ValueError("Unknown preprocessing backend: {} (available: {})".format(
+                backend, ", ".join(sorted(BACKENDS))))
+        if int(downscale) != downscale or downscale < 1:
+            raise ValueError("Downscale factor must be a positive integer, got {}".format(downscale))
+
+        self.backend = backend
+        self.downscale = int(downscale)
+        self._function = BACKENDS[backend]
+
+    def __call__(self, eye_frame):
+        """Returns the preprocessed eye frame
+
+        Argument:
+            eye_frame (numpy.ndarray): Frame containing an eye and nothing else
+        """
+        if self.downscale == 1:
+            new_frame = self._function(eye_frame)
+        else:
+            height, width = eye_frame.shape[:2]
+            small_size = (max(width // self.downscale, 1), max(height // self.downscale, 1))
+            small = cv2.resize(eye_frame, small_size, interpolation=cv2.INTER_AREA)
+            new_frame = cv2.resize(self._function(small), (width, height), interpolation=cv2.INTER_LINEAR)
+
+        return cv2.erode(new_frame, _KERNEL, iterations=3)
+
+    @property
+    def name(self):
+        """Returns a name identifying the backend and its downscale factor"""
+        if self.downscale == 1:
+            return self.backend
+        return "{}/{}".format(self.backend, self.downscale)
+
+    def to_dict(self):
+        """Returns the settings of the preprocessor"""
+        return {'backend': self.backend, 'downscale': self.downscale}
+
+
+# Preprocessor used when none is given
+DEFAULT = Preprocessor()
@@ -1,48 +1,67 @@
 import numpy as np
 import cv2
+from . import preprocessing
 
 
 class Pupil(object):
     """
     This class detects the iris of an eye and estimates
     the position of the pupil
+
+    The iris can be located with:
+        "contours": second largest contour of the contour tree
+        "components": largest dark connected component, from its statistics
+        "moments": centroid of all the dark pixels
     """
 
-    def __init__(self, eye_frame, threshold):
+    LOCATORS = ("contours", "components", "moments")
+
+    def __init__(self, eye_frame, threshold, locator="contours", preprocessor=None):
+        if locator not in self.LOCATORS:
+            raise ValueError("Unknown iris locator: {}".format(locator))
+
         self.iris_frame = None
         self.threshold = threshold
+        self.locator = locator
+        self.preprocessor = preprocessor
         self.x = None
         self.y = None
 
         self.detect_iris(eye_frame)
 
     @staticmethod
-    def image_processing(eye_frame, threshold):
+    def preprocess(eye_frame, preprocessor=None):
+        """Smooths and erodes the eye frame. This step doesn't depend
+        on the threshold, so its result can be shared between thresholds.
+
+        Arguments:
+            eye_frame (numpy.ndarray): Frame containing an eye and nothing else
+            preprocessor (preprocessing.Preprocessor): Backend to use, bilateral filter by default
+
+        Returns:
+            The filtered frame, not binarized yet
+        """
+        return (preprocessor or preprocessing.DEFAULT)(eye_frame)
+
+    @staticmethod
+    def image_processing(eye_frame, threshold, preprocessor=None):
         """Performs operations on the eye frame to isolate the iris
 
         Arguments:
             eye_frame (numpy.ndarray): Frame containing an eye and nothing else
             threshold (int): Threshold value used to binarize the eye frame
+            preprocessor (preprocessing.Preprocessor): Backend to use, bilateral filter by default
 
         Returns:
             A frame with a single element representing the iris
         """
-        kernel = np.ones((3, 3), np.uint8)
-        new_frame = cv2.bilateralFilter(eye_frame, 10, 15, 15)
-        new_frame = cv2.erode(new_frame, kernel, iterations=3)
+        new_frame = Pupil.preprocess(eye_frame, preprocessor)
         new_frame = cv2.threshold(new_frame, threshold, 255, cv2.THRESH_BINARY)[1]
 
         return new_frame
 
-    def detect_iris(self, eye_frame):
-        """Detects the iris and estimates the position of the iris by
-        calculating the centroid.
-
-        Arguments:
-            eye_frame (numpy.ndarray): Frame containing an eye and nothing else
-        """
-        self.iris_frame = self.image_processing(eye_frame, self.threshold)
-
+    def _locate_contours(self):
+        """Takes the centroid of the second largest contour of the binarized frame"""
         contours, _ = cv2.findContours(self.iris_frame, cv2.RETR_TREE, cv2.CHAIN_APPROX_NONE)[-2:]
         contours = sorted(contours, key=cv2.contourArea)
 
@@ -52,3 +71,41 @@ class Pupil(object):
             self.y = int(moments['m01'] / moments['m00'])
         except (IndexError, ZeroDivisionError):
             pass
+
+    def _locate_components(self):
+        """Takes the centroid of the largest dark blob, picked from the
+        component statistics without building any contour"""
+        dark = cv2.bitwise_not(self.iris_frame)
+        # Holes found by findContours are 4-connected
+        count, _, stats, centroids = cv2.connectedComponentsWithStats(dark, connectivity=4)
+
+        if count > 1:
+            best = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))
+            self.x = int(centroids[best][0])
+            self.y = int(centroids[best][1])
+
+    def _locate_moments(self):
+        """Takes the centroid of all the dark pixels of the binarized frame"""
+        moments = cv2.moments(cv2.bitwise_not(self.iris_frame), binaryImage=True)
+
+        try:
+            self.x = int(moments['m10'] / moments['m00'])
+            self.y = int(moments['m01'] / moments['m00'])
+        except ZeroDivisionError:
+            pass
+
+    def detect_iris(self, eye_frame):
+        """Detects the iris and estimates the position of the iris by
+        calculating the centroid.
+
+        Arguments:
+            eye_frame (numpy.ndarray): Frame containing an eye and nothing else
+        """
+        self.iris_frame = self.image_processing(eye_frame, self.threshold, self.preprocessor)
+
+        if self.locator == "components":
+            self._locate_components()
+        elif self.locator == "moments":
+            self._locate_moments()
+        else:
+            self._locate_contours()
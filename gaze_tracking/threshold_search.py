@@ -0,0 +1,120 @@
+from __future__ import division
+import numpy as np
+from .pupil import Pupil
+
+
+class ThresholdSearch(object):
+    """
+    This class finds the binarization threshold that gives the expected
+    iris size for an eye frame. The eye frame is filtered and eroded only
+    once, then every candidate threshold is scored from that single frame.
+    """
+
+    MODES = ("histogram", "binary")
+
+    def __init__(self, thresholds=range(5, 100, 5), average_iris_size=0.48, mode="histogram", preprocessor=None):
+        if mode not in self.MODES:
+            raise ValueError("Unknown threshold search mode: {}".format(mode))
+
+        self.thresholds = sorted(thresholds)
+        self.average_iris_size = average_iris_size
+        self.mode = mode
+        self.preprocessor = preprocessor
+
+    def _inner_pixels(self, eye_frame):
+        """Filters the eye frame once and returns the pixels that
+        Calibration.iris_size takes into account
+
+        Argument:
+            eye_frame (numpy.ndarray): Frame of the eye to be analyzed
+        """
+        processed = Pupil.preprocess(eye_frame, self.preprocessor)
+        return processed[5:-5, 5:-5]
+
+    def _histogram_sizes(self, pixels, nb_pixels):
+        """Returns the iris size of every candidate threshold, computed
+        from one cumulative histogram of the pixels
+
+        Arguments:
+            pixels (numpy.ndarray): Filtered pixels of the eye
+            nb_pixels (int): Number of pixels
+        """
+        histogram = np.bincount(pixels.ravel(), minlength=256)
+        cumulative = np.cumsum(histogram)
+        # A pixel is black after binarization when its value is <= threshold
+        return [int(cumulative[threshold]) / nb_pixels for threshold in self.thresholds]
+
+    def _best_from_sizes(self, sizes):
+        """Returns the first threshold whose iris size is the closest to the average
+
+        Argument:
+            sizes (list): Iris size of each candidate threshold
+        """
+        best_index = min(range(len(sizes)), key=lambda i: abs(sizes[i] - self.average_iris_size))
+        return self.thresholds[best_index]
+
+    def _lower_bound(self, size_at, value):
+        """Returns the index of the first candidate whose iris size is >= value.
+        The iris size grows with the threshold, so a binary search is enough.
+
+        Arguments:
+            size_at (function): Returns the iris size of a candidate index
+            value (float): Searched iris size
+        """
+        low, high = 0, len(self.thresholds)
+        while low < high:
+            middle = (low + high) // 2
+            if size_at(middle) < value:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _binary_search(self, pixels, nb_pixels):
+        """Finds the best threshold by probing O(log n) candidates only
+
+        Arguments:
+            pixels (numpy.ndarray): Filtered pixels of the eye
+            nb_pixels (int): Number of pixels
+        """
+        cache = {}
+
+        def size_at(index):
+            if index not in cache:
+                nb_blacks = int(np.count_nonzero(pixels <= self.thresholds[index]))
+                cache[index] = nb_blacks / nb_pixels
+            return cache[index]
+
+        above = self._lower_bound(size_at, self.average_iris_size)
+        if above == len(self.thresholds):
+            best = above - 1
+        elif above == 0:
+            best = 0
+        else:
+            below = above - 1
+            distance_below = self.average_iris_size - size_at(below)
+            distance_above = size_at(above) - self.average_iris_size
+            # On a tie the lower threshold wins, like min() over the sorted candidates
+            best = below if distance_below <= distance_above else above
+
+        # Several thresholds can give the same size: keep the first one
+        best = self._lower_bound(size_at, size_at(best))
+        return self.thresholds[best]
+
+    def find_best_threshold(self, eye_frame):
+        """Calculates the optimal threshold to binarize the
+        frame for the given eye.
+
+        Argument:
+            eye_frame (numpy.ndarray): Frame of the eye to be analyzed
+        """
+        pixels = self._inner_pixels(eye_frame)
+        height, width = pixels.shape[:2]
+        nb_pixels = height * width
+        if nb_pixels == 0:
+            raise ZeroDivisionError("Eye frame is too small to be calibrated")
+
+        if self.mode == "binary":
+            return self._binary_search(pixels, nb_pixels)
+
+        return self._best_from_sizes(self._histogram_sizes(pixels, nb_pixels))